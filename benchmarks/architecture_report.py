@@ -0,0 +1,94 @@
+def architecture_report(
+    architectures    : list = ['cnn', 'cnn_gap', 'mobilenet_v2', 'efficientnet_b0'],
+    weights_files    : dict = {},
+    images_per_class : int = 100,
+    epochs           : int = 2,
+    latency_runs     : int = 50,
+    batch_size       : int = 32,
+    output_file      : str = 'architecture_report.json'
+) -> dict:
+    """
+    Compares the create_model architectures by parameter count, OpenVINO IR size and CPU latency.
+
+    Every architecture runs through cats_and_dogs_benchmark, i.e. trained, evaluated and converted as in the pipeline
+    on the same synthetic dataset, so the best validation accuracy is reported next to the size and latency.
+
+    Parameters:
+        - architectures    (list) : The create_model architectures to compare.
+        - weights_files    (dict) : The local weights file of each pretrained architecture, by architecture.
+        - images_per_class (int)  : The number of training images per class. Validation and test get half as many.
+        - epochs           (int)  : The maximum number of training epochs.
+        - latency_runs     (int)  : The number of timed inference runs per latency measurement.
+        - batch_size       (int)  : The batch size of the batched inference.
+        - output_file      (str)  : The file where the report is written as json.
+
+    Returns:
+        - report (dict) : The benchmark results of every architecture, by architecture.
+    """
+
+    import json
+    import os
+    import sys
+    import tempfile
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    from cats_and_dogs_benchmark import cats_and_dogs_benchmark
+
+    report = {}
+
+    with tempfile.TemporaryDirectory() as report_directory:
+
+        for architecture in architectures:
+
+            report[architecture] = cats_and_dogs_benchmark(
+                images_per_class = images_per_class,
+                epochs           = epochs,
+                latency_runs     = latency_runs,
+                batch_size       = batch_size,
+                architecture     = architecture,
+                weights_file     = weights_files.get(architecture, ''),
+                output_file      = os.path.join(report_directory, f'{ architecture }.json')
+            )
+
+    print(f'{ "architecture":<16} { "parameters":>11} { "IR MiB":>8} { "TF ms":>8} { "OV ms":>8} { "OV batch ms/img":>16} { "val acc":>8}')
+
+    for architecture, results in report.items():
+
+        print(f'{ architecture:<16} { results["model"]["parameters"]:>11,} '
+              f'{ results["convert"]["file_bytes"] / 2**20:>8.2f} '
+              f'{ results["latency"]["tensorflow_single"]["median_ms"]:>8.2f} '
+              f'{ results["latency"]["openvino_single"]["median_ms"]:>8.2f} '
+              f'{ results["latency"]["openvino_batched"]["per_image_ms"]:>16.2f} '
+              f'{ results["model"]["best_val_accuracy"]:>8.2f}')
+
+    with open(output_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(report, file, ensure_ascii = False, indent = 4)
+
+    return report
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Compare the create_model architectures by size and CPU latency')
+    parser.add_argument('--architectures',    default = 'cnn,cnn_gap,mobilenet_v2,efficientnet_b0', help = 'Comma separated create_model architectures')
+    parser.add_argument('--weights',          default = [], action = 'append',                      help = 'Local weights file of a pretrained architecture as architecture=path, repeatable')
+    parser.add_argument('--images_per_class', default = 100, type = int,                             help = 'Training images per class, validation and test get half as many')
+    parser.add_argument('--epochs',           default = 2, type = int,                               help = 'Maximum number of training epochs')
+    parser.add_argument('--latency_runs',     default = 50, type = int,                              help = 'Timed inference runs per latency measurement')
+    parser.add_argument('--batch_size',       default = 32, type = int,                              help = 'Batch size of the batched inference')
+    parser.add_argument('--output_file',      default = 'architecture_report.json',                  help = 'Output file for the report')
+    args = parser.parse_args()
+
+    architecture_report(
+        architectures    = [architecture.strip() for architecture in args.architectures.split(',') if architecture.strip()],
+        weights_files    = dict(weights.split('=', 1) for weights in args.weights),
+        images_per_class = args.images_per_class,
+        epochs           = args.epochs,
+        latency_runs     = args.latency_runs,
+        batch_size       = args.batch_size,
+        output_file      = args.output_file
+    )
@@ -0,0 +1,240 @@
+def cats_and_dogs_benchmark(
+    images_per_class    : int = 100,
+    epochs              : int = 2,
+    latency_runs        : int = 50,
+    batch_size          : int = 32,
+    performance_profile : str = 'default',
+    architecture        : str = 'cnn',
+    weights_file        : str = '',
+    output_file         : str = 'cats_and_dogs_benchmark.json'
+) -> dict:
+    """
+    Benchmarks the cats_and_dogs train, export and inference path end to end in a temporary artifacts directory.
+
+    The dataset is synthetic: random crops, flips and brightness changes of the bundled cat and dog images, laid out
+    as the prepared cats_and_dogs dataset. The create_model, train_model and evaluate_model components run on it,
+    train_model in a process of its own so the threads of the performance profile apply. The model is converted to
+    OpenVINO as upload_model does, and the latency of single and batched inference is measured with TensorFlow and
+    OpenVINO.
+
+    Parameters:
+        - images_per_class    (int) : The number of training images per class. Validation and test get half as many.
+        - epochs              (int) : The number of training epochs.
+        - latency_runs        (int) : The number of timed inference runs per latency measurement.
+        - batch_size          (int) : The batch size of the batched inference.
+        - performance_profile (str) : The TensorFlow performance profile of the training, 'default' or 'cpu'.
+        - architecture        (str) : The create_model architecture.
+        - weights_file        (str) : The local weights file of a pretrained architecture, if any.
+        - output_file         (str) : The file where the benchmark results are written as json.
+
+    Returns:
+        - results (dict) : The timings of every stage and the inference latencies.
+    """
+
+    import concurrent.futures
+    import json
+    import multiprocessing
+    import os
+    import statistics
+    import sys
+    import tempfile
+    import time
+
+    import numpy as np
+    import openvino as ov
+    import tensorflow as tf
+
+    repository_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    sys.path.insert(0, repository_directory)
+
+    from components.create_model   import create_model
+    from components.evaluate_model import evaluate_model
+    from components.train_model    import train_model
+
+    image_size = (160, 160)
+
+    def create_dataset(dataset_directory):
+
+        images = {
+            'cats' : tf.io.decode_jpeg(tf.io.read_file(os.path.join(repository_directory, 'images', 'cat.jpg')), channels = 3),
+            'dogs' : tf.io.decode_jpeg(tf.io.read_file(os.path.join(repository_directory, 'images', 'dog.jpg')), channels = 3)
+        }
+
+        splits = { 'train' : images_per_class, 'validation' : max(images_per_class // 2, 1), 'test' : max(images_per_class // 2, 1) }
+
+        for split, number_of_images in splits.items():
+
+            for label, image in images.items():
+
+                label_directory = os.path.join(dataset_directory, split, label)
+                os.makedirs(label_directory)
+
+                for index in range(number_of_images):
+
+                    variant = tf.image.resize(image, (200, 200))
+                    variant = tf.image.random_crop(variant, (*image_size, 3))
+                    variant = tf.image.random_flip_left_right(variant)
+                    variant = tf.image.random_brightness(variant, 40)
+                    variant = tf.cast(tf.clip_by_value(variant, 0, 255), tf.uint8)
+
+                    tf.io.write_file(os.path.join(label_directory, f'{ label }.{ index }.jpg'), tf.io.encode_jpeg(variant))
+
+        return splits
+
+    def latency(predict, inputs):
+
+        # The first runs build the graph and warm the caches.
+        for _ in range(3):
+            predict(inputs)
+
+        timings = []
+
+        for _ in range(latency_runs):
+
+            start = time.perf_counter()
+            predict(inputs)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        timings.sort()
+
+        return {
+            'median_ms'    : statistics.median(timings),
+            'p90_ms'       : timings[int(0.9 * (len(timings) - 1))],
+            'per_image_ms' : statistics.median(timings) / len(inputs)
+        }
+
+    with tempfile.TemporaryDirectory() as artifacts_directory:
+
+        splits = create_dataset(os.path.join(artifacts_directory, 'dataset', 'cats_and_dogs'))
+
+        start = time.perf_counter()
+        create_model(artifacts_directory = artifacts_directory, architecture = architecture, weights_file = weights_file)
+        create_seconds = time.perf_counter() - start
+
+        # tensorflow is already running in this process, so the training gets a fresh one where the threads of the
+        # performance profile can still be set.
+        start = time.perf_counter()
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers = 1, mp_context = multiprocessing.get_context('spawn')) as executor:
+
+            executor.submit(train_model, artifacts_directory = artifacts_directory, epochs = epochs, performance_profile = performance_profile).result()
+
+        train_seconds = time.perf_counter() - start
+
+        with open(os.path.join(artifacts_directory, 'train_model_metrics.json'), 'r', encoding = 'utf-8') as file:
+
+            train_metrics = json.load(file)
+
+        epoch_seconds = statistics.mean(epoch['seconds'] for epoch in train_metrics['epochs'])
+
+        start = time.perf_counter()
+        evaluate_model(artifacts_directory = artifacts_directory)
+        evaluate_seconds = time.perf_counter() - start
+
+        # Same conversion as upload_model.
+        model_directory = os.path.join(artifacts_directory, 'model', 'cats_and_dogs')
+        ov_model_file   = os.path.join(artifacts_directory, 'ov_model', 'model.xml')
+
+        start = time.perf_counter()
+        ov_model = ov.convert_model(model_directory, input = ('layer_0_input', [1, *image_size, 3], ov.Type.f32))
+        ov.save_model(ov_model, ov_model_file)
+        convert_seconds = time.perf_counter() - start
+
+        single  = np.random.default_rng(0).uniform(0, 255, (1, *image_size, 3)).astype(np.float32)
+        batched = np.random.default_rng(1).uniform(0, 255, (batch_size, *image_size, 3)).astype(np.float32)
+
+        tf_model = tf.keras.models.load_model(model_directory)
+        best     = max(train_metrics['epochs'], key = lambda epoch : epoch['val_accuracy'])
+
+        core            = ov.Core()
+        ov_single_model = core.compile_model(core.read_model(ov_model_file), 'CPU')
+        ov_batched      = core.read_model(ov_model_file)
+
+        ov_batched.reshape({ ov_batched.input(0) : [batch_size, *image_size, 3] })
+        ov_batched_model = core.compile_model(ov_batched, 'CPU')
+
+        tf_single_prediction = float(tf_model(single, training = False).numpy().squeeze())
+        ov_single_prediction = float(ov_single_model(single)[0].squeeze())
+
+        results = {
+            'images'     : { split : 2 * number_of_images for split, number_of_images in splits.items() },
+            'epochs'     : epochs,
+            'batch_size' : batch_size,
+            'model'      : {
+                'architecture'      : architecture,
+                'weights_file'      : weights_file,
+                'parameters'        : tf_model.count_params(),
+                'best_val_accuracy' : best['val_accuracy']
+            },
+            'create'     : {
+                'seconds' : create_seconds
+            },
+            'train'      : {
+                # Includes starting the training process, the epochs alone are timed by train_model.
+                'seconds'             : train_seconds,
+                # Early stopping may end the training before the requested number of epochs.
+                'epochs_run'          : train_metrics['epochs_run'],
+                'epoch_seconds'       : epoch_seconds,
+                'images_per_second'   : 2 * splits['train'] / epoch_seconds,
+                'performance_profile' : train_metrics['performance_profile'],
+                'epochs'              : train_metrics['epochs']
+            },
+            'evaluate'   : {
+                'seconds'           : evaluate_seconds,
+                'images_per_second' : 2 * splits['test'] / evaluate_seconds
+            },
+            'convert'    : {
+                'seconds'    : convert_seconds,
+                'file_bytes' : os.path.getsize(ov_model_file) + os.path.getsize(ov_model_file.replace('.xml', '.bin'))
+            },
+            'latency'    : {
+                'tensorflow_single'  : latency(lambda inputs : tf_model(inputs, training = False), single),
+                'tensorflow_batched' : latency(lambda inputs : tf_model(inputs, training = False), batched),
+                'openvino_single'    : latency(ov_single_model, single),
+                'openvino_batched'   : latency(ov_batched_model, batched)
+            },
+            # OpenVINO must predict what TensorFlow predicts for the latencies to be comparable.
+            'prediction_difference' : abs(tf_single_prediction - ov_single_prediction)
+        }
+
+    print(f'train    : { results["train"]["epoch_seconds"]:.2f}s per epoch ({ results["train"]["images_per_second"]:.1f} images/s)')
+    print(f'evaluate : { results["evaluate"]["seconds"]:.2f}s ({ results["evaluate"]["images_per_second"]:.1f} images/s)')
+    print(f'convert  : { results["convert"]["seconds"]:.2f}s')
+
+    for name, measurement in results['latency'].items():
+
+        print(f'{ name:<18} : { measurement["median_ms"]:.2f} ms median, { measurement["p90_ms"]:.2f} ms p90, { measurement["per_image_ms"]:.2f} ms per image')
+
+    with open(output_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(results, file, ensure_ascii = False, indent = 4)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the cats_and_dogs train, export and inference path')
+    parser.add_argument('--images_per_class',    default = 100, type = int,                help = 'Training images per class, validation and test get half as many')
+    parser.add_argument('--epochs',              default = 2, type = int,                  help = 'Number of training epochs')
+    parser.add_argument('--latency_runs',        default = 50, type = int,                 help = 'Timed inference runs per latency measurement')
+    parser.add_argument('--batch_size',          default = 32, type = int,                 help = 'Batch size of the batched inference')
+    parser.add_argument('--performance_profile', default = 'default',                      help = 'TensorFlow performance profile of the training, default or cpu')
+    parser.add_argument('--architecture',        default = 'cnn',                          help = 'Architecture of create_model')
+    parser.add_argument('--weights_file',        default = '',                             help = 'Local weights file of a pretrained architecture')
+    parser.add_argument('--output_file',         default = 'cats_and_dogs_benchmark.json', help = 'Output file for the benchmark results')
+    args = parser.parse_args()
+
+    cats_and_dogs_benchmark(
+        images_per_class    = args.images_per_class,
+        epochs              = args.epochs,
+        latency_runs        = args.latency_runs,
+        batch_size          = args.batch_size,
+        performance_profile = args.performance_profile,
+        architecture        = args.architecture,
+        weights_file        = args.weights_file,
+        output_file         = args.output_file
+    )
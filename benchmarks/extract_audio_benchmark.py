@@ -0,0 +1,128 @@
+def extract_audio_benchmark(video_file : str = '', duration : int = 3600, output_file : str = 'extract_audio_benchmark.json') -> dict:
+    """
+    Benchmarks the mp3 audio extraction path against the direct 16 kHz mono extraction path of extract_audio.
+
+    Both paths are measured until the audio is ready for Whisper: the mp3 path includes the second decode and
+    resample done by the speech recognition pipeline, the f32 path includes memory mapping and reading the samples.
+
+    Parameters:
+        - video_file  (str) : The video to benchmark. A synthetic video of the given duration is created when empty.
+        - duration    (int) : The duration in seconds of the synthetic video.
+        - output_file (str) : The file where the benchmark results are written as json.
+
+    Returns:
+        - results (dict) : The timings and file sizes of both paths.
+    """
+
+    import json
+    import os
+    import subprocess
+    import tempfile
+    import time
+
+    import numpy as np
+
+    from moviepy.config import get_setting
+    from moviepy.editor import VideoFileClip
+
+    ffmpeg_binary = get_setting('FFMPEG_BINARY')
+
+    with tempfile.TemporaryDirectory() as benchmark_directory:
+
+        if not video_file:
+
+            video_file = os.path.join(benchmark_directory, 'video.mp4')
+
+            subprocess.check_call([
+                ffmpeg_binary, '-y', '-loglevel', 'error',
+                '-f', 'lavfi', '-i', f'testsrc=size=320x240:rate=10:duration={ duration }',
+                '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=44100:duration={ duration }',
+                '-c:v', 'libx264', '-preset', 'ultrafast', '-c:a', 'aac', '-shortest',
+                video_file
+            ])
+
+        video_audio_mp3_file = os.path.join(benchmark_directory, 'video_audio.mp3')
+        video_audio_f32_file = os.path.join(benchmark_directory, 'video_audio.f32')
+
+        start = time.perf_counter()
+
+        VideoFileClip(video_file).audio.write_audiofile(video_audio_mp3_file, logger = None)
+
+        mp3_extract_seconds = time.perf_counter() - start
+        start               = time.perf_counter()
+
+        # Same decode and resample the speech recognition pipeline runs on an mp3 input.
+        mp3_samples = np.frombuffer(subprocess.check_output([
+            ffmpeg_binary, '-loglevel', 'error',
+            '-i', video_audio_mp3_file,
+            '-ac', '1', '-ar', '16000', '-f', 'f32le', 'pipe:1'
+        ]), dtype = '<f4')
+
+        mp3_decode_seconds = time.perf_counter() - start
+        start              = time.perf_counter()
+
+        subprocess.check_call([
+            ffmpeg_binary, '-y', '-loglevel', 'error',
+            '-i', video_file,
+            '-vn', '-ac', '1', '-ar', '16000', '-acodec', 'pcm_f32le', '-f', 'f32le',
+            video_audio_f32_file
+        ])
+
+        f32_extract_seconds = time.perf_counter() - start
+        start               = time.perf_counter()
+
+        f32_samples = np.memmap(video_audio_f32_file, dtype = '<f4', mode = 'r')
+        f32_samples.sum()
+
+        f32_load_seconds = time.perf_counter() - start
+
+        results = {
+            'video_file'    : video_file,
+            'audio_seconds' : len(f32_samples) / 16000,
+            'mp3'           : {
+                'extract_seconds' : mp3_extract_seconds,
+                'decode_seconds'  : mp3_decode_seconds,
+                'total_seconds'   : mp3_extract_seconds + mp3_decode_seconds,
+                'file_bytes'      : os.path.getsize(video_audio_mp3_file),
+                'samples'         : len(mp3_samples)
+            },
+            'f32'           : {
+                'extract_seconds' : f32_extract_seconds,
+                'decode_seconds'  : f32_load_seconds,
+                'total_seconds'   : f32_extract_seconds + f32_load_seconds,
+                'file_bytes'      : os.path.getsize(video_audio_f32_file),
+                'samples'         : len(f32_samples)
+            }
+        }
+
+        del f32_samples
+
+    results['speedup'] = results['mp3']['total_seconds'] / results['f32']['total_seconds']
+
+    print(f'audio seconds : { results["audio_seconds"]:.0f}')
+    print(f'mp3 path      : { results["mp3"]["total_seconds"]:.2f}s ({ results["mp3"]["file_bytes"] } bytes)')
+    print(f'f32 path      : { results["f32"]["total_seconds"]:.2f}s ({ results["f32"]["file_bytes"] } bytes)')
+    print(f'speedup       : { results["speedup"]:.2f}x')
+
+    with open(output_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(results, file, ensure_ascii = False, indent = 4)
+
+    return results
+
+
+if __name__ == '__main__':
+
+    import argparse
+
+    parser = argparse.ArgumentParser(description = 'Benchmark the extract_audio mp3 and 16 kHz mono paths')
+    parser.add_argument('--video_file',  default = '',                            help = 'Video to benchmark, a synthetic video is created when empty')
+    parser.add_argument('--duration',    default = 3600, type = int,              help = 'Duration in seconds of the synthetic video')
+    parser.add_argument('--output_file', default = 'extract_audio_benchmark.json', help = 'Output file for the benchmark results')
+    args = parser.parse_args()
+
+    extract_audio_benchmark(
+        video_file  = args.video_file,
+        duration    = args.duration,
+        output_file = args.output_file
+    )
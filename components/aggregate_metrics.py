@@ -0,0 +1,91 @@
+def aggregate_metrics(
+    metrics_directory : str = '/pipeline/metrics',
+    timeline_file     : str = ''
+) -> dict:
+    """
+    Aggregates the metrics.json files of the pipeline steps into a single timeline of the run.
+
+    The phases of every step are placed on a common clock, starting at the first step, and printed as a table
+    sorted by start time. The totals of the run sum the CPU time and bytes of the steps and keep the largest peak
+    resident memory.
+
+    Parameters:
+        - metrics_directory (str) : The directory where the steps wrote their metrics.
+        - timeline_file     (str) : The file where the timeline is written as json. Empty writes timeline.json to the metrics directory.
+
+    Returns:
+        - timeline (dict) : The steps and phases of the run on a common clock, and the totals of the run.
+    """
+
+    import glob
+    import json
+    import os
+
+    steps = []
+
+    for metrics_file in sorted(glob.glob(os.path.join(metrics_directory, '*', 'metrics.json'))):
+
+        with open(metrics_file, 'r', encoding = 'utf-8') as file:
+
+            steps.append(json.load(file))
+
+    steps.sort(key = lambda metrics : metrics['started'])
+
+    run_start = steps[0]['started'] if steps else 0.0
+    run_end   = max((metrics['started'] + metrics['wall_seconds'] for metrics in steps), default = run_start)
+    phases    = []
+
+    for metrics in steps:
+
+        metrics['started_seconds'] = metrics['started'] - run_start
+
+        for phase in metrics['phases']:
+
+            phases.append({
+                'step'            : metrics['step'],
+                **phase,
+                'started_seconds' : metrics['started_seconds'] + phase['started_seconds']
+            })
+
+    phases.sort(key = lambda phase : phase['started_seconds'])
+
+    timeline = {
+        'wall_seconds'   : run_end - run_start,
+        'cpu_seconds'    : sum(metrics['cpu_seconds'] + metrics['children_cpu_seconds'] for metrics in steps),
+        'peak_rss_bytes' : max((metrics['peak_rss_bytes'] for metrics in steps), default = 0),
+        'read_bytes'     : sum(metrics['read_bytes'] for metrics in steps),
+        'write_bytes'    : sum(metrics['write_bytes'] for metrics in steps),
+        'failed_steps'   : [metrics['step'] for metrics in steps if metrics['status'] != 'succeeded'],
+        'steps'          : steps,
+        'phases'         : phases
+    }
+
+    print(f'{ "step":<32} { "phase":<28} { "start":>9} { "wall":>9} { "cpu":>9} { "rss MiB":>9} { "read MiB":>9} { "write MiB":>9}')
+
+    for phase in phases:
+
+        print(f'{ phase["step"]:<32} { phase["phase"]:<28} '
+              f'{ phase["started_seconds"]:>8.1f}s { phase["wall_seconds"]:>8.1f}s { phase["cpu_seconds"] + phase["children_cpu_seconds"]:>8.1f}s '
+              f'{ phase["peak_rss_bytes"] / 2**20:>9.0f} { phase["read_bytes"] / 2**20:>9.1f} { phase["write_bytes"] / 2**20:>9.1f}')
+
+    print(f'{ len(steps) } steps in { timeline["wall_seconds"]:.1f}s, { timeline["cpu_seconds"]:.1f}s cpu, '
+          f'{ timeline["peak_rss_bytes"] / 2**20:.0f} MiB peak rss')
+
+    with open(timeline_file or os.path.join(metrics_directory, 'timeline.json'), 'w', encoding = 'utf-8') as file:
+
+        json.dump(timeline, file, indent = 4)
+
+    return timeline
+
+
+if __name__ == '__main__':
+    """
+    Elyra Pipelines
+    """
+
+    import os
+
+    aggregate_metrics(
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        timeline_file     = os.getenv('timeline_file', '')
+    )
@@ -32,17 +32,27 @@ if __name__ == '__main__':
     import os
     import json
 
-    name = os.getenv('name')
+    from step_metrics import step_metrics
 
-    hello_world_message = create_hello_world_message(
-        name = name
-    )
+    with step_metrics(
+        step              = 'create_hello_world_message',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
 
-    output = {
-        'name'                : name,
-        'hello_world_message' : hello_world_message
-    }
+        with phase('create_hello_world_message'):
 
-    with open('create_hello_world_message.json', 'w', encoding = 'utf-8') as output_file:
+            name = os.getenv('name')
 
-        json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
+            hello_world_message = create_hello_world_message(
+                name = name
+            )
+
+            output = {
+                'name'                : name,
+                'hello_world_message' : hello_world_message
+            }
+
+            with open('create_hello_world_message.json', 'w', encoding = 'utf-8') as output_file:
+
+                json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
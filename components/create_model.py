@@ -1,61 +1,142 @@
-def create_model():
+def create_model(
+    artifacts_directory : str = '/pipeline/artifacts',
+    architecture        : str = 'cnn',
+    weights_file        : str = ''
+):
     """
     Creates the Convolutional Neural Network model for binary image classification.
+
+    Architectures:
+        - cnn             : Three convolution blocks, flattened into a dense layer. Most of its parameters are in the
+                            dense layer after the flatten.
+        - cnn_gap         : The same convolution blocks, global average pooled instead of flattened. Far fewer
+                            parameters, a smaller IR and a lower latency.
+        - mobilenet_v2    : A MobileNetV2 feature extractor with a global average pooled classification head.
+        - efficientnet_b0 : An EfficientNetB0 feature extractor with a global average pooled classification head.
+
+    The pretrained architectures load the ImageNet weights of their feature extractor, without top, from a local
+    weights file, since the pipeline nodes do not download them, and freeze it to train only the head. Without a
+    weights file the feature extractor starts from random weights and is trained too. Every architecture takes
+    160x160x3 images in [0, 255] through its first layer, layer_0, so the serving input stays layer_0_input.
+
+    Parameters:
+        - artifacts_directory (str) : The directory where the pipeline artifacts are stored.
+        - architecture        (str) : The model architecture, 'cnn', 'cnn_gap', 'mobilenet_v2' or 'efficientnet_b0'.
+        - weights_file        (str) : The local weights file of the pretrained feature extractor, if any.
     """
 
     import os
     import tensorflow as tf
 
-    model_directory = os.path.join('/', 'pipeline', 'artifacts', 'model', 'cats_and_dogs')
+    model_directory = os.path.join(artifacts_directory, 'model', 'cats_and_dogs')
     os.makedirs(model_directory)
 
-    model = tf.keras.models.Sequential([
-        tf.keras.layers.Rescaling(
-            name        = 'layer_0',
-            scale       = 1. / 255.,
-            input_shape = (160, 160, 3)
-        ),
-        tf.keras.layers.Conv2D(
-            name        = 'layer_1',
-            filters     = 16,
-            kernel_size = 3,
-            activation  = 'relu'
-        ),
-        tf.keras.layers.MaxPooling2D(
-            name = 'layer_2'
-        ),
-        tf.keras.layers.Conv2D(
-            name        = 'layer_3',
-            filters     = 32,
-            kernel_size = 3,
-            activation  = 'relu'
-        ),
-        tf.keras.layers.MaxPooling2D(
-            name = 'layer_4'
-        ),
-        tf.keras.layers.Conv2D(
-            name        = 'layer_5',
-            filters     = 64,
-            kernel_size = 3,
-            activation  = 'relu'
-        ),
-        tf.keras.layers.MaxPooling2D(
-            name = 'layer_6'
-        ),
-        tf.keras.layers.Flatten(
-            name = 'layer_7'
-        ),
-        tf.keras.layers.Dense(
-            name       = 'layer_8',
-            units      = 128,
-            activation = 'relu'
-        ),
-        tf.keras.layers.Dense(
-            name       = 'layer_9',
-            units      = 1,
-            activation = 'sigmoid'
+    image_shape = (160, 160, 3)
+
+    def convolution_blocks():
+
+        return [
+            tf.keras.layers.Rescaling(
+                name        = 'layer_0',
+                scale       = 1. / 255.,
+                input_shape = image_shape
+            ),
+            tf.keras.layers.Conv2D(
+                name        = 'layer_1',
+                filters     = 16,
+                kernel_size = 3,
+                activation  = 'relu'
+            ),
+            tf.keras.layers.MaxPooling2D(
+                name = 'layer_2'
+            ),
+            tf.keras.layers.Conv2D(
+                name        = 'layer_3',
+                filters     = 32,
+                kernel_size = 3,
+                activation  = 'relu'
+            ),
+            tf.keras.layers.MaxPooling2D(
+                name = 'layer_4'
+            ),
+            tf.keras.layers.Conv2D(
+                name        = 'layer_5',
+                filters     = 64,
+                kernel_size = 3,
+                activation  = 'relu'
+            ),
+            tf.keras.layers.MaxPooling2D(
+                name = 'layer_6'
+            )
+        ]
+
+    def pretrained(application, scale, offset):
+
+        # The applications keep their own layer name, e.g. mobilenetv2_1.00_160.
+        feature_extractor = application(
+            input_shape = image_shape,
+            include_top = False,
+            weights     = weights_file or None
         )
-    ])
+        feature_extractor.trainable = not weights_file
+
+        return [
+            # The preprocessing the feature extractor was trained with.
+            tf.keras.layers.Rescaling(
+                name        = 'layer_0',
+                scale       = scale,
+                offset      = offset,
+                input_shape = image_shape
+            ),
+            feature_extractor,
+            tf.keras.layers.GlobalAveragePooling2D(
+                name = 'layer_2'
+            ),
+            tf.keras.layers.Dropout(
+                name = 'layer_3',
+                rate = 0.2
+            ),
+            tf.keras.layers.Dense(
+                name       = 'layer_4',
+                units      = 1,
+                activation = 'sigmoid'
+            )
+        ]
+
+    if architecture in ('cnn', 'cnn_gap'):
+
+        layers = convolution_blocks() + [
+            tf.keras.layers.Flatten(
+                name = 'layer_7'
+            ) if architecture == 'cnn' else tf.keras.layers.GlobalAveragePooling2D(
+                name = 'layer_7'
+            ),
+            tf.keras.layers.Dense(
+                name       = 'layer_8',
+                units      = 128,
+                activation = 'relu'
+            ),
+            tf.keras.layers.Dense(
+                name       = 'layer_9',
+                units      = 1,
+                activation = 'sigmoid'
+            )
+        ]
+
+    elif architecture == 'mobilenet_v2':
+
+        layers = pretrained(tf.keras.applications.MobileNetV2, scale = 1. / 127.5, offset = -1.)
+
+    elif architecture == 'efficientnet_b0':
+
+        # EfficientNet rescales and normalizes its [0, 255] inputs itself.
+        layers = pretrained(tf.keras.applications.EfficientNetB0, scale = 1., offset = 0.)
+
+    else:
+
+        raise ValueError(f'Unknown architecture: { architecture }')
+
+    model = tf.keras.models.Sequential(layers)
 
     model.compile(
         loss      = 'binary_crossentropy',
@@ -72,9 +153,30 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'create_model',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['tensorflow==2.15.0'],
+                step                 = 'create_model',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'tensorflow==2.15.0'])
+        with phase('create_model'):
 
-    create_model()
\ No newline at end of file
+            create_model(
+                artifacts_directory = os.getenv('artifacts_directory', '/pipeline/artifacts'),
+                architecture        = os.getenv('architecture', 'cnn'),
+                weights_file        = os.getenv('weights_file', '')
+            )
\ No newline at end of file
@@ -38,25 +38,36 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
+    import os
     import json
 
-    create_hello_world_message_output = json.load(open('create_hello_world_message.json', 'r', encoding = 'utf-8'))
-    create_random_number_output       = json.load(open('create_random_number.json',       'r', encoding = 'utf-8'))
+    from step_metrics import step_metrics
 
-    hello_world_message = create_hello_world_message_output['hello_world_message']
-    random_number       = create_random_number_output['random_number']
+    with step_metrics(
+        step              = 'create_odds_or_evens_message',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
 
-    odds_or_evens_message = create_odds_or_evens_message(
-        hello_world_message = hello_world_message,
-        random_number       = random_number
-    )
+        with phase('create_odds_or_evens_message'):
 
-    output = {
-        'hello_world_message'   : hello_world_message,
-        'random_number'         : random_number,
-        'odds_or_evens_message' : odds_or_evens_message
-    }
+            create_hello_world_message_output = json.load(open('create_hello_world_message.json', 'r', encoding = 'utf-8'))
+            create_random_number_output       = json.load(open('create_random_number.json',       'r', encoding = 'utf-8'))
 
-    with open('create_odds_or_evens_message.json', 'w', encoding = 'utf-8') as output_file:
+            hello_world_message = create_hello_world_message_output['hello_world_message']
+            random_number       = create_random_number_output['random_number']
 
-        json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
+            odds_or_evens_message = create_odds_or_evens_message(
+                hello_world_message = hello_world_message,
+                random_number       = random_number
+            )
+
+            output = {
+                'hello_world_message'   : hello_world_message,
+                'random_number'         : random_number,
+                'odds_or_evens_message' : odds_or_evens_message
+            }
+
+            with open('create_odds_or_evens_message.json', 'w', encoding = 'utf-8') as output_file:
+
+                json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
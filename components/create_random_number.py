@@ -29,20 +29,30 @@ if __name__ == '__main__':
     import os
     import json
 
-    minimum = int(os.getenv('minimum'))
-    maximum = int(os.getenv('maximum'))
+    from step_metrics import step_metrics
 
-    random_number = create_random_number(
-        minimum = minimum,
-        maximum = maximum
-    )
+    with step_metrics(
+        step              = 'create_random_number',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
 
-    output = {
-        'minimum'       : minimum,
-        'maximum'       : maximum,
-        'random_number' : random_number
-    }
+        with phase('create_random_number'):
 
-    with open('create_random_number.json', 'w', encoding = 'utf-8') as output_file:
+            minimum = int(os.getenv('minimum'))
+            maximum = int(os.getenv('maximum'))
 
-        json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
+            random_number = create_random_number(
+                minimum = minimum,
+                maximum = maximum
+            )
+
+            output = {
+                'minimum'       : minimum,
+                'maximum'       : maximum,
+                'random_number' : random_number
+            }
+
+            with open('create_random_number.json', 'w', encoding = 'utf-8') as output_file:
+
+                json.dump(output, output_file, ensure_ascii = False, indent = 4)
\ No newline at end of file
@@ -14,4 +14,16 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    delete_artifacts()
\ No newline at end of file
+    import os
+
+    from step_metrics import step_metrics
+
+    with step_metrics(
+        step              = 'delete_artifacts',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('delete_artifacts'):
+
+            delete_artifacts()
\ No newline at end of file
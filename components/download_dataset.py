@@ -27,4 +27,16 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    download_dataset()
\ No newline at end of file
+    import os
+
+    from step_metrics import step_metrics
+
+    with step_metrics(
+        step              = 'download_dataset',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('download_dataset'):
+
+            download_dataset()
\ No newline at end of file
@@ -1,29 +1,36 @@
 def download_document(
-    s3_service_name      : str,
-    s3_endpoint_url      : str,
-    s3_access_key_id     : str,
-    s3_secret_access_key : str,
-    s3_region            : str,
-    s3_bucket            : str,
-    pipeline_name        : str,
-    document_name        : str
+    s3_service_name          : str,
+    s3_endpoint_url          : str,
+    s3_access_key_id         : str,
+    s3_secret_access_key     : str,
+    s3_region                : str,
+    s3_bucket                : str,
+    pipeline_name            : str,
+    document_name            : str,
+    document_cache_directory : str = '/pipeline/cache/documents'
 ):
     """
     Downloads the document from the s3 bucket.
 
+    Documents are cached by their s3 ETag, a document that did not change since the last run is copied from the
+    cache instead of downloaded again.
+
     Parameters:
-        - s3_service_name      (str) : The name of the s3 service. It should be 's3'.
-        - s3_endpoint_url      (str) : The url of the s3 endpoint.
-        - s3_access_key_id     (str) : The access key id for authentication.
-        - s3_secret_access_key (str) : The secret access key for authentication.
-        - s3_region            (str) : The region where the s3 bucket is located.
-        - s3_bucket            (str) : The s3 bucket where the video will be downloaded.
-        - pipeline_name        (str) : The name of the pipeline.
-        - document_name        (str) : The document to download.
+        - s3_service_name          (str) : The name of the s3 service. It should be 's3'.
+        - s3_endpoint_url          (str) : The url of the s3 endpoint.
+        - s3_access_key_id         (str) : The access key id for authentication.
+        - s3_secret_access_key     (str) : The secret access key for authentication.
+        - s3_region                (str) : The region where the s3 bucket is located.
+        - s3_bucket                (str) : The s3 bucket where the video will be downloaded.
+        - pipeline_name            (str) : The name of the pipeline.
+        - document_name            (str) : The document to download.
+        - document_cache_directory (str) : The directory where documents are cached across runs, on a volume that outlives the run. Empty disables the cache.
     """
 
     import boto3
+    import hashlib
     import os
+    import shutil
 
     artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
     os.makedirs(artifacts_directory, exist_ok = True)
@@ -39,8 +46,30 @@ def download_document(
         region_name           = s3_region
     )
 
+    if not document_cache_directory:
+        s3_client.download_file(s3_bucket, s3_document_file, document_file)
+        return
+
+    etag       = s3_client.head_object(Bucket = s3_bucket, Key = s3_document_file)['ETag'].strip('"')
+    cache_key  = hashlib.sha256('{}\0{}\0{}'.format(s3_bucket, s3_document_file, etag).encode('utf-8')).hexdigest()
+    cache_file = os.path.join(document_cache_directory, cache_key + os.path.splitext(document_file)[1])
+
+    os.makedirs(document_cache_directory, exist_ok = True)
+
+    if os.path.isfile(cache_file):
+        shutil.copyfile(cache_file, document_file)
+        print('Document cache hit: {}'.format(s3_document_file))
+        return
+
     s3_client.download_file(s3_bucket, s3_document_file, document_file)
 
+    partial_file = '{}.{}.partial'.format(cache_file, os.getpid())
+
+    shutil.copyfile(document_file, partial_file)
+    os.replace(partial_file, cache_file)
+
+    print('Document cache miss: {}'.format(s3_document_file))
+
 
 if __name__ == '__main__':
     """
@@ -48,18 +77,35 @@ if __name__ == '__main__':
     """
 
     import os
-    import subprocess
-    import sys
-
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'boto3==1.34.28'])
-
-    download_document(
-        s3_service_name      = os.getenv('s3_service_name'),
-        s3_endpoint_url      = os.getenv('s3_endpoint_url'),
-        s3_access_key_id     = os.getenv('s3_access_key_id'),
-        s3_secret_access_key = os.getenv('s3_secret_access_key'),
-        s3_region            = os.getenv('s3_region'),
-        s3_bucket            = os.getenv('s3_bucket'),
-        pipeline_name        = os.getenv('pipeline_name'),
-        document_name        = os.getenv('document_name')
-    )
\ No newline at end of file
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'download_document',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['boto3==1.34.28'],
+                step                 = 'download_document',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
+
+        with phase('download_document'):
+
+            download_document(
+                s3_service_name          = os.getenv('s3_service_name'),
+                s3_endpoint_url          = os.getenv('s3_endpoint_url'),
+                s3_access_key_id         = os.getenv('s3_access_key_id'),
+                s3_secret_access_key     = os.getenv('s3_secret_access_key'),
+                s3_region                = os.getenv('s3_region'),
+                s3_bucket                = os.getenv('s3_bucket'),
+                pipeline_name            = os.getenv('pipeline_name'),
+                document_name            = os.getenv('document_name'),
+                document_cache_directory = os.getenv('document_cache_directory', '/pipeline/cache/documents')
+            )
\ No newline at end of file
@@ -1,24 +1,189 @@
-def evaluate_document_names(document_cnh : str, document_escritura : str) -> int:
+def evaluate_document_names(
+    document_cnh       : str   = '',
+    document_escritura : str   = '',
+    manifest_file      : str   = '',
+    max_distance_ratio : float = 0.2
+) -> int:
+    """
+    Verifies the name of the CNH document appears in the ESCRITURA document.
 
+    In batch mode the CNH/ESCRITURA pairs are read from a CSV manifest with 'cnh' and 'escritura' columns. Each deed
+    is indexed once as normalized tokens, with accents stripped and whitespace collapsed, and a trigram index over the
+    tokens. The name is looked up exactly first and then fuzzily, tolerating OCR errors up to the maximum edit
+    distance. The outcome and timing of each pair are written next to the manifest as .results.csv.
+
+    Parameters:
+        - document_cnh       (str)   : The CNH document in the artifacts directory.
+        - document_escritura (str)   : The ESCRITURA document in the artifacts directory.
+        - manifest_file      (str)   : The CSV manifest of pairs in the artifacts directory. Empty verifies the single pair.
+        - max_distance_ratio (float) : The edit distance allowed in batch mode, relative to the length of the name.
+
+    Returns 0 when the name, or every name in batch mode, is found and -1 otherwise.
+    """
+
+    import collections
+    import csv
     import os
+    import re
+    import time
+    import unicodedata
 
     artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
-    document_cnh        = os.path.join(artifacts_directory, document_cnh)
-    document_escritura  = os.path.join(artifacts_directory, document_escritura)
 
-    with open(document_cnh + '.ocr.txt', 'r') as file:
-        cnh_name = file.read()
+    if not manifest_file:
+        document_cnh       = os.path.join(artifacts_directory, document_cnh)
+        document_escritura = os.path.join(artifacts_directory, document_escritura)
+
+        with open(document_cnh + '.ocr.txt', 'r') as file:
+            cnh_name = file.read()
+
+        with open(document_escritura + '.ocr.txt', 'r') as file:
+            escritura = file.read()
+
+        if not cnh_name:
+            return -1
+
+        if not escritura:
+            return -1
+
+        if cnh_name.lower() not in escritura.lower():
+            return -1
+
+        return 0
+
+    def normalize(text):
+
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(char for char in text if not unicodedata.combining(char))
+
+        return re.sub(r'[^a-z0-9]+', ' ', text.lower()).split()
+
+    def trigrams(token):
+
+        token = ' {} '.format(token)
+
+        return {token[i:i + 3] for i in range(len(token) - 2)}
+
+    def distance(a, b, limit):
+
+        # Levenshtein distance, giving up as soon as a whole row is above the limit.
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+
+        previous = list(range(len(b) + 1))
+
+        for i, char_a in enumerate(a, 1):
+            current = [i]
+
+            for j, char_b in enumerate(b, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+
+            if min(current) > limit:
+                return limit + 1
+
+            previous = current
+
+        return previous[-1]
+
+    deeds = {}
+
+    def load_deed(document):
+
+        if document not in deeds:
+            with open(os.path.join(artifacts_directory, document) + '.ocr.txt', 'r') as file:
+                tokens = normalize(file.read())
+
+            index = collections.defaultdict(list)
+
+            for position, token in enumerate(tokens):
+                for trigram in trigrams(token):
+                    index[trigram].append(position)
+
+            deeds[document] = (tokens, ' {} '.format(' '.join(tokens)), index)
+
+        return deeds[document]
+
+    def match(name_tokens, deed):
+
+        tokens, text, index = deed
+        name                = ' '.join(name_tokens)
+
+        if ' {} '.format(name) in text:
+            return 0, name
+
+        limit  = int(len(name) * max_distance_ratio)
+        starts = collections.Counter()
+
+        # Deed positions sharing most trigrams with a name token vote for where the name would start.
+        for offset, token in enumerate(name_tokens):
+            token_trigrams = trigrams(token)
+            positions      = collections.Counter(position for trigram in token_trigrams for position in index.get(trigram, ()))
+
+            for position, shared in positions.items():
+                if shared * 2 >= len(token_trigrams) and position >= offset:
+                    starts[position - offset] += 1
+
+        best = (limit + 1, '')
+
+        for start, _ in starts.most_common(32):
+            # Windows one token shorter and longer absorb names split or merged by the OCR.
+            for length in {len(name_tokens) - 1, len(name_tokens), len(name_tokens) + 1} - {0}:
+                window = ' '.join(tokens[start:start + length])
+                best   = min(best, (distance(name, window, min(limit, best[0])), window))
+
+        # Names rejected by the trigram votes or over the limit have no exact distance, none is reported for them.
+        if best[0] > limit:
+            return None, ''
+
+        return best
+
+    manifest_file = os.path.join(artifacts_directory, manifest_file)
+    results_file  = os.path.splitext(manifest_file)[0] + '.results.csv'
+
+    with open(manifest_file, 'r', newline = '') as file:
+        pairs = list(csv.DictReader(file))
+
+    start    = time.perf_counter()
+    verified = 0
+
+    with open(results_file, 'w', newline = '') as file:
+        writer = csv.writer(file)
+        writer.writerow(['cnh', 'escritura', 'name', 'verified', 'distance', 'match', 'seconds'])
+
+        for pair in pairs:
+            pair_start = time.perf_counter()
+
+            try:
+                with open(os.path.join(artifacts_directory, pair['cnh']) + '.ocr.txt', 'r') as cnh:
+                    name_tokens = normalize(cnh.read())
+
+                deed = load_deed(pair['escritura'])
+            except FileNotFoundError as error:
+                print('Missing OCR output: {}'.format(error.filename))
+                name_tokens, deed = [], None
+
+            if name_tokens and deed and deed[0]:
+                pair_distance, pair_match = match(name_tokens, deed)
+            else:
+                pair_distance, pair_match = None, ''
 
-    with open(document_escritura + '.ocr.txt', 'r') as file:
-        escritura = file.read()
+            is_verified = pair_distance is not None and pair_distance <= int(len(' '.join(name_tokens)) * max_distance_ratio)
+            verified   += is_verified
 
-    if not cnh_name:
-        return -1
+            writer.writerow([
+                pair['cnh'],
+                pair['escritura'],
+                ' '.join(name_tokens),
+                int(is_verified),
+                '' if pair_distance is None else pair_distance,
+                pair_match if is_verified else '',
+                '{:.6f}'.format(time.perf_counter() - pair_start)
+            ])
 
-    if not escritura:
-        return -1
+    seconds = time.perf_counter() - start
 
-    if cnh_name.lower() not in escritura.lower():
-        return -1
+    print('Pairs: {}, verified: {}, deeds: {}, total: {:.2f}s ({:.1f} pairs/s)'.format(
+        len(pairs), verified, len(deeds), seconds, len(pairs) / seconds if seconds else 0.0
+    ))
 
-    return 0
\ No newline at end of file
+    return 0 if pairs and verified == len(pairs) else -1
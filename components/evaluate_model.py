@@ -1,12 +1,14 @@
-def evaluate_model():
+def evaluate_model(artifacts_directory : str = '/pipeline/artifacts'):
     """
     Evaluates the model using the cats_and_dogs test dataset.
+
+    Parameters:
+        - artifacts_directory (str) : The directory where the pipeline artifacts are stored.
     """
 
     import os
     import tensorflow as tf
 
-    artifacts_directory    = os.path.join('/', 'pipeline', 'artifacts')
     dataset_test_directory = os.path.join(artifacts_directory, 'dataset', 'cats_and_dogs', 'test')
 
     image_size = (160, 160)
@@ -27,9 +29,28 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'evaluate_model',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['tensorflow==2.15.0'],
+                step                 = 'evaluate_model',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'tensorflow==2.15.0'])
+        with phase('evaluate_model'):
 
-    evaluate_model()
\ No newline at end of file
+            evaluate_model(
+                artifacts_directory = os.getenv('artifacts_directory', '/pipeline/artifacts')
+            )
\ No newline at end of file
@@ -1,17 +1,56 @@
-def extract_audio():
+def extract_audio(audio_format : str = 'mp3'):
     """
     Extracts the audio from the video.
+
+    The 'wav' and 'f32' formats demux and resample the audio straight to 16 kHz mono, the input expected by Whisper,
+    so extract_speeches can consume it without decoding it again. The 'f32' format is a raw little endian float32
+    file that can be memory mapped. The audio of the other formats left by an earlier run is removed.
+
+    Parameters:
+        - audio_format (str) : The format of the extracted audio. It should be 'mp3', 'wav' or 'f32'.
     """
 
     import os
-    from moviepy.editor import VideoFileClip
+    import subprocess
 
     artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
     video_file          = os.path.join(artifacts_directory, 'video.mp4')
-    video_audio_file    = os.path.join(artifacts_directory, 'video_audio.mp3')
+    video_audio_file    = os.path.join(artifacts_directory, f'video_audio.{ audio_format }')
+
+    if audio_format not in ['mp3', 'wav', 'f32']:
+
+        raise ValueError(f'Unsupported audio format: { audio_format }')
+
+    for other_format in ['mp3', 'wav', 'f32']:
+
+        other_audio_file = os.path.join(artifacts_directory, f'video_audio.{ other_format }')
+
+        if other_format != audio_format and os.path.isfile(other_audio_file):
+            os.remove(other_audio_file)
+
+    if audio_format == 'mp3':
+
+        from moviepy.editor import VideoFileClip
 
-    video_file_clip = VideoFileClip(video_file)
-    video_file_clip.audio.write_audiofile(video_audio_file)
+        video_file_clip = VideoFileClip(video_file)
+        video_file_clip.audio.write_audiofile(video_audio_file)
+
+        return
+
+    from moviepy.config import get_setting
+
+    codec_arguments = {
+        'wav' : ['-acodec', 'pcm_s16le'],
+        'f32' : ['-acodec', 'pcm_f32le', '-f', 'f32le']
+    }
+
+    subprocess.check_call([
+        get_setting('FFMPEG_BINARY'), '-y', '-loglevel', 'error',
+        '-i', video_file,
+        '-vn', '-ac', '1', '-ar', '16000',
+        *codec_arguments[audio_format],
+        video_audio_file
+    ])
 
 
 if __name__ == '__main__':
@@ -19,9 +58,28 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'extract_audio',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['moviepy==1.0.3'],
+                step                 = 'extract_audio',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'moviepy==1.0.3'])
+        with phase('extract_audio'):
 
-    extract_audio()
\ No newline at end of file
+            extract_audio(
+                audio_format = os.getenv('audio_format', 'mp3')
+            )
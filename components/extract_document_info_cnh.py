@@ -1,15 +1,53 @@
-def extract_document_info_cnh(document_file : str, tesseract_config : str):
+# Shared with the other extraction steps, the KFP components get it through extra_code.
+from ocr_cache import ocr_cache
+
+
+def extract_document_info_cnh(
+    document_file       : str,
+    tesseract_config    : str,
+    workers             : int = 0,
+    ocr_cache_directory : str = '/pipeline/cache/ocr'
+):
     """
     Extracts the 'Nome' information from the CNH document.
+
+    Candidate boxes are pre-filtered by geometry, relative to the image size, and text-likeness. The name is read
+    from the last box in contour order labelled 'nome': the labels are OCRed by parallel tesseract processes from
+    the last box backwards, one box per process in flight, and the extraction stops at the first match.
+    The timing of the document is written next to the .ocr.txt output as .timing.json.
+
+    Results are cached by document content and tesseract configuration, a cached result is returned immediately.
+    The cache hits and misses are counted in counters.json in the OCR cache directory.
+
+    Parameters:
+        - document_file       (str) : The CNH document in the artifacts directory.
+        - tesseract_config    (str) : The tesseract configuration, e.g. '--oem 3 --psm 4 -l por'.
+        - workers             (int) : The number of parallel tesseract processes. Zero uses one per CPU.
+        - ocr_cache_directory (str) : The directory where OCR results are cached across runs. Empty disables the cache.
     """
 
+    import collections
+    import concurrent.futures
     import cv2
+    import itertools
+    import json
     import os
     import pytesseract
+    import time
+
+    # Each tesseract process runs single threaded, the parallelism comes from the workers.
+    os.environ['OMP_THREAD_LIMIT'] = '1'
 
     artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
     document_file       = os.path.join(artifacts_directory, document_file)
 
+    cache = ocr_cache('extract_document_info_cnh', document_file, tesseract_config, 'nome', ocr_cache_directory)
+
+    if cache.lookup():
+        return
+
+    start = time.perf_counter()
+
     image        = cv2.imread(document_file)
     gray         = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     _, threshold = cv2.threshold(gray, 127, 255, 0)
@@ -18,7 +56,11 @@ def extract_document_info_cnh(document_file : str, tesseract_config : str):
     height, width, _ = image.shape
     image_area       = width * height
 
-    nome = ''
+    # The size thresholds are in pixels of a scan 1000 pixels wide.
+    scale = width / 1000
+
+    candidates = []
+    boxes      = set()
 
     for contour in contours:
 
@@ -27,27 +69,98 @@ def extract_document_info_cnh(document_file : str, tesseract_config : str):
         if area > image_area * 0.8 or area < image_area * 0.003:
             continue
 
-        x, y, w, h     = cv2.boundingRect(contour)
-        x0, x1, y0, y1 = x, x + w, y - 8, y + h
+        x, y, w, h = cv2.boundingRect(contour)
 
-        if y0 < 0:
-            y0 = 0
+        # CNH fields are wide, short boxes holding a label above a value.
+        if w < h * 1.5 or h < 12 * scale or w < 40 * scale:
+            continue
 
-        img = image[y0:y1, x0:x1]
-        img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        ocr = pytesseract.image_to_string(img, config = tesseract_config)
-        ocr = ocr.lower()
+        # The inner and outer contours of the same box are OCRed once.
+        box = (x // 4, y // 4, w // 4, h // 4)
 
-        if not any(word in ocr for word in ['nome', 'ome', 'nom']):
+        if box in boxes:
             continue
 
-        img  = image[y + 3:y + h - 4, x + 4: x + w - 6]
-        img  = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        ocr  = pytesseract.image_to_string(img, config = tesseract_config)
-        ocr  = list(filter(None, ocr.splitlines()))
-        nome = ocr[-1]
+        boxes.add(box)
+
+        y0  = max(y - 8, 0)
+        roi = gray[y0:y + h, x:x + w]
+
+        # Blank or solid boxes hold no text.
+        _, ink = cv2.threshold(roi, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        ink    = cv2.countNonZero(ink) / roi.size
+
+        if roi.std() < 10 or ink < 0.01 or ink > 0.5:
+            continue
+
+        candidates.append((y, x, w, h, roi))
+
+    preprocess_seconds = time.perf_counter() - start
+
+    def ocr(img):
+
+        return pytesseract.image_to_string(img, config = tesseract_config)
+
+    nome        = ''
+    name_calls  = 0
+    max_workers = workers or os.cpu_count()
+    remaining   = reversed(candidates)
+    futures     = []
+    in_flight   = collections.deque()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max_workers) as executor:
+
+        def submit(count):
+
+            for candidate in itertools.islice(remaining, count):
+
+                futures.append(executor.submit(ocr, candidate[4]))
+                in_flight.append((candidate, futures[-1]))
+
+        # One box per worker is in flight, taken from the last box backwards as those are the most likely to be
+        # the result, so at most one box per worker past the result is OCRed.
+        submit(max_workers)
+
+        # The results are read in box order rather than completion order, the result does not depend on timing.
+        while in_flight:
+
+            (y, x, w, h, _), future = in_flight.popleft()
+
+            label = future.result().lower()
+
+            if not any(word in label for word in ['nome', 'ome', 'nom']):
+
+                submit(1)
+                continue
+
+            for _, pending in in_flight:
+                pending.cancel()
+
+            img        = gray[y + 3:y + h - 4, x + 4: x + w - 6]
+            text       = list(filter(None, ocr(img).splitlines()))
+            name_calls = 1
+
+            if text:
+                nome = text[-1]
+
+            break
+
+    timing = {
+        'contours'           : len(contours),
+        'candidates'         : len(candidates),
+        'ocr_calls'          : sum(not future.cancelled() for future in futures) + name_calls,
+        'preprocess_seconds' : preprocess_seconds,
+        'ocr_seconds'        : time.perf_counter() - start - preprocess_seconds,
+        'total_seconds'      : time.perf_counter() - start
+    }
 
     print('Nome: {}'.format(nome))
+    print('Timing: {}'.format(timing))
 
     with open(document_file + '.ocr.txt', 'w') as doc:
-        doc.write(nome)
\ No newline at end of file
+        doc.write(nome)
+
+    with open(document_file + '.timing.json', 'w') as doc:
+        json.dump(timing, doc, indent = 4)
+
+    cache.store()
@@ -1,20 +1,138 @@
-def extract_document_info_escritura(document_file : str, tesseract_config : str):
+# Shared with the other extraction steps, the KFP components get it through extra_code.
+from ocr_cache import ocr_cache
+
+
+def extract_document_info_escritura(
+    document_file       : str,
+    tesseract_config    : str,
+    paged               : bool = False,
+    workers             : int  = 0,
+    ocr_cache_directory : str  = '/pipeline/cache/ocr'
+):
     """
     Extracts the information from the ESCRITURA document.
+
+    In paged mode multi-page TIFF and PDF deeds are split into pages, each page is deskewed and binarized, and the
+    pages are OCRed in parallel. The text of each page is streamed to the .ocr.txt output in page order, separated
+    by form feeds, as soon as the preceding pages are done. PDF deeds are rasterized with pdf2image, which needs the
+    poppler-utils binaries in the image; without pdf2image the document is read with OpenCV, which reads TIFF but not
+    PDF deeds.
+
+    Results are cached by document content, tesseract configuration and mode, a cached result is returned
+    immediately. The cache hits and misses are counted in counters.json in the OCR cache directory.
+
+    Parameters:
+        - document_file       (str)  : The ESCRITURA document in the artifacts directory.
+        - tesseract_config    (str)  : The tesseract configuration, e.g. '--oem 3 --psm 4 -l por'.
+        - paged               (bool) : Whether to preprocess and OCR the document page by page in parallel.
+        - workers             (int)  : The number of pages OCRed in parallel. Zero uses one per CPU.
+        - ocr_cache_directory (str)  : The directory where OCR results are cached across runs. Empty disables the cache.
     """
 
+    import concurrent.futures
     import cv2
+    import numpy as np
     import os
     import pytesseract
+    import time
 
     artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
     document_file       = os.path.join(artifacts_directory, document_file)
 
-    image = cv2.imread(document_file)
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    cache = ocr_cache('extract_document_info_escritura', document_file, tesseract_config, 'paged' if paged else 'single', ocr_cache_directory)
+
+    if cache.lookup():
+        return
+
+    if not paged:
+
+        image = cv2.imread(document_file)
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+
+        ocr  = pytesseract.image_to_string(image, config = tesseract_config)
+        print(ocr)
+
+        with open(document_file + '.ocr.txt', 'w') as doc:
+            doc.write(ocr)
+
+        cache.store()
+        return
+
+    is_pdf = document_file.lower().endswith('.pdf')
+
+    if is_pdf:
+
+        try:
+            import pdf2image
+        except ImportError:
+            print('pdf2image is not installed, reading the document with OpenCV')
+            is_pdf = False
+
+    if is_pdf:
+        pages = pdf2image.pdfinfo_from_path(document_file)['Pages']
+    else:
+        ok, images = cv2.imreadmulti(document_file, flags = cv2.IMREAD_GRAYSCALE)
+        images     = images if ok else [cv2.imread(document_file, cv2.IMREAD_GRAYSCALE)]
+        pages      = len(images)
+
+        if images[0] is None:
+            raise ValueError('Cannot read {}, PDF deeds need pdf2image and poppler-utils'.format(document_file))
+
+    workers = max(1, min(workers or os.cpu_count(), pages))
+
+    # Tesseract threads are split between the parallel pages instead of oversubscribing the cores.
+    os.environ['OMP_THREAD_LIMIT'] = str(max(1, os.cpu_count() // workers))
+
+    def load_page(page):
+
+        if is_pdf:
+            # Pages are rasterized one at a time so a large deed never sits in memory as a whole.
+            image = pdf2image.convert_from_path(document_file, dpi = 300, first_page = page + 1, last_page = page + 1)[0]
+            return cv2.cvtColor(np.array(image), cv2.COLOR_RGB2GRAY)
+
+        return images[page]
+
+    def preprocess(image):
+
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+        points    = cv2.findNonZero(binary)
+
+        if points is not None:
+            angle = cv2.minAreaRect(points)[-1]
+            angle = angle - 90 if angle > 45 else angle
+
+            # Larger angles come from borders or images rather than skewed text lines.
+            if 0.1 < abs(angle) <= 10:
+                height, width = image.shape
+                rotation      = cv2.getRotationMatrix2D((width // 2, height // 2), angle, 1.0)
+                image         = cv2.warpAffine(image, rotation, (width, height), flags = cv2.INTER_CUBIC, borderMode = cv2.BORDER_REPLICATE)
+
+        image     = cv2.medianBlur(image, 3)
+        _, binary = cv2.threshold(image, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+
+        return binary
+
+    def ocr_page(page):
+
+        start = time.perf_counter()
+        text  = pytesseract.image_to_string(preprocess(load_page(page)), config = tesseract_config)
+
+        return text, time.perf_counter() - start
+
+    start = time.perf_counter()
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as executor, open(document_file + '.ocr.txt', 'w') as doc:
+
+        futures = [executor.submit(ocr_page, page) for page in range(pages)]
+
+        for page, future in enumerate(futures):
+            text, seconds = future.result()
+
+            doc.write(('\f' if page else '') + text)
+            doc.flush()
+
+            print('Page {}/{}: {:.1f}s'.format(page + 1, pages, seconds))
 
-    ocr  = pytesseract.image_to_string(image, config = tesseract_config)
-    print(ocr)
+    print('Pages: {}, workers: {}, total: {:.1f}s'.format(pages, workers, time.perf_counter() - start))
 
-    with open(document_file + '.ocr.txt', 'w') as doc:
-        doc.write(ocr)
\ No newline at end of file
+    cache.store()
@@ -1,42 +1,400 @@
-def extract_speeches():
+# Shared with the other model steps, kfp_component ships it with the KFP components.
+from hf_models import hf_models
+
+
+def extract_speeches(
+    audio_format              : str  = 'mp3',
+    toolchain_cache_directory : str  = '/pipeline/cache/toolchain',
+    ffmpeg_url                : str  = 'https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz',
+    ffmpeg_sha256             : str  = '',
+    long_form                 : bool = False,
+    chunk_length_s            : int  = 30,
+    stride_length_s           : int  = 5,
+    batch_size                : int  = 4,
+    num_threads               : int  = 0,
+    model_cache_directory     : str  = '/pipeline/cache/huggingface',
+    backend                   : str  = 'pytorch',
+    quantize                  : bool = False,
+    compare_reference         : bool = False
+):
     """
     Extracts the speeches from the video.
+
+    The audio is read in the format extract_audio wrote it in. The 16 kHz mono audio of the 'f32' and 'wav' formats
+    is used as is, the 'mp3' audio is decoded with ffmpeg.
+
+    The static ffmpeg archive is verified against the pinned ffmpeg_sha256 digest before it is extracted and cached
+    in the toolchain cache directory, which should be on a volume that outlives the run. The cache is reused while
+    the pin is unchanged. Without a pin the archive is used for the run but never cached, and when the download or
+    its verification fails the system ffmpeg is used instead.
+
+    In long form mode the audio is split into overlapping chunks, the chunks are transcribed in batches and the
+    timestamped segments are stitched back together, streaming the partial transcript to the output as it goes.
+
+    The model runs on the selected backend, converted once and cached in the model cache directory. The backend,
+    conversion and latency are reported in extract_speeches_backend_report.json, together with the latency and the
+    similarity of the output against the eager PyTorch model when compare_reference is set.
+
+    Parameters:
+        - audio_format              (str)  : The format of the audio written by extract_audio. It should be 'mp3', 'wav' or 'f32'.
+        - toolchain_cache_directory (str)  : The directory where the verified ffmpeg toolchain is cached across runs.
+        - ffmpeg_url                (str)  : The url of the static ffmpeg archive, preferably of a fixed release.
+        - ffmpeg_sha256             (str)  : The expected sha256 digest of the ffmpeg archive. Empty disables the cache.
+        - long_form                 (bool) : Whether to transcribe the audio in overlapping chunks.
+        - chunk_length_s            (int)  : The length in seconds of each chunk, including both strides.
+        - stride_length_s           (int)  : The overlap in seconds on each side of a chunk.
+        - batch_size                (int)  : The number of chunks transcribed per batch.
+        - num_threads               (int)  : The number of CPU threads used by torch. Zero keeps the torch default.
+        - model_cache_directory     (str)  : The directory where the Hugging Face models are cached across runs.
+        - backend                   (str)  : The inference backend. It should be 'pytorch', 'openvino' or 'onnxruntime'.
+        - quantize                  (bool) : Whether to apply dynamic INT8 quantization to the model.
+        - compare_reference         (bool) : Whether to compare the output and latency against the eager PyTorch model.
     """
 
+    import hashlib
+    import json
     import os
+    import shutil
+    import subprocess
     import tarfile
+    import tempfile
+    import time
     import urllib.request
+    import wave
+
+    import numpy as np
+    import torch
+
+    model_name = 'openai/whisper-tiny'
+
+    # Sets up the Hugging Face cache, and the offline mode for prefetched models, before transformers is imported.
+    models_helper = hf_models('extract_speeches', [model_name], model_cache_directory, backend, quantize)
 
     from transformers import pipeline
 
-    ffmpeg_url  = 'https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz'
-    ffmpeg_file = os.path.basename(ffmpeg_url)
+    ffmpeg_file   = os.path.basename(ffmpeg_url)
+    ffmpeg_sha256 = ffmpeg_sha256.strip().lower()
+
+    ffmpeg_cache_directory = os.path.join(toolchain_cache_directory, 'ffmpeg')
+    ffmpeg_cache_checksum  = os.path.join(ffmpeg_cache_directory, 'ffmpeg.sha256')
+    ffmpeg_cache_archive   = os.path.join(ffmpeg_cache_directory, 'archive.sha256')
+
+    def sha256(file):
+
+        digest = hashlib.sha256()
+
+        with open(file, 'rb') as binary:
+
+            for block in iter(lambda: binary.read(1024 * 1024), b''):
+
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def is_runnable(ffmpeg_binary):
+
+        try:
+            subprocess.run([ffmpeg_binary, '-version'], stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL, check = True)
+        except (OSError, subprocess.CalledProcessError):
+            return False
+
+        return True
+
+    def load_cached_ffmpeg():
+
+        ffmpeg_binary = os.path.join(ffmpeg_cache_directory, 'ffmpeg')
+
+        if not ffmpeg_sha256 or not all(os.path.isfile(file) for file in [ffmpeg_binary, ffmpeg_cache_checksum, ffmpeg_cache_archive]):
+            return None
+
+        with open(ffmpeg_cache_archive, 'r') as file:
+
+            archive_checksum = file.read().strip()
+
+        # A toolchain cached from another archive is stale once the pin changes.
+        if archive_checksum != ffmpeg_sha256:
+            return None
+
+        with open(ffmpeg_cache_checksum, 'r') as file:
+
+            checksum = file.read().strip()
+
+        # The binary checksum detects partial or corrupted writes of the cache itself.
+        if sha256(ffmpeg_binary) != checksum or not is_runnable(ffmpeg_binary):
+            return None
+
+        return ffmpeg_cache_directory
+
+    def download_ffmpeg():
+
+        download_directory = tempfile.mkdtemp()
+        download_file      = os.path.join(download_directory, ffmpeg_file)
+
+        urllib.request.urlretrieve(ffmpeg_url, download_file)
+
+        archive_checksum = sha256(download_file)
+
+        if ffmpeg_sha256 and archive_checksum != ffmpeg_sha256:
+            shutil.rmtree(download_directory, ignore_errors = True)
+            raise RuntimeError(f'ffmpeg archive digest { archive_checksum } does not match the pinned { ffmpeg_sha256 }')
+
+        with tarfile.open(download_file) as ffmpeg_tarfile:
+
+            ffmpeg_tarfile.extractall(download_directory)
+
+        for directory in next(os.walk(download_directory))[1]:
+
+            if directory.startswith('ffmpeg'):
+
+                ffmpeg_directory = os.path.join(download_directory, directory)
+                break
+
+        ffmpeg_binary = os.path.join(ffmpeg_directory, 'ffmpeg')
+
+        if not is_runnable(ffmpeg_binary):
+            raise RuntimeError(f'Downloaded ffmpeg is not runnable: { ffmpeg_binary }')
+
+        if not ffmpeg_sha256:
+            print(f'ffmpeg archive digest { archive_checksum } is not pinned, set ffmpeg_sha256 to cache the toolchain')
+            return ffmpeg_directory, 'not cached (unpinned)'
+
+        try:
+            os.makedirs(toolchain_cache_directory, exist_ok = True)
+            staging_directory = tempfile.mkdtemp(dir = toolchain_cache_directory)
+
+            for binary in ['ffmpeg', 'ffprobe']:
+
+                shutil.copy2(os.path.join(ffmpeg_directory, binary), staging_directory)
+
+            with open(os.path.join(staging_directory, 'ffmpeg.sha256'), 'w') as file:
+
+                file.write(sha256(os.path.join(staging_directory, 'ffmpeg')))
+
+            with open(os.path.join(staging_directory, 'archive.sha256'), 'w') as file:
+
+                file.write(archive_checksum)
+
+            shutil.rmtree(ffmpeg_cache_directory, ignore_errors = True)
+            os.rename(staging_directory, ffmpeg_cache_directory)
+
+        except OSError as error:
+
+            # The cache is an optimization only, a concurrent run may have populated it already.
+            print(f'ffmpeg cache not updated : { error }')
+
+            if load_cached_ffmpeg() is None:
+                return ffmpeg_directory, 'cache write failed'
+
+        shutil.rmtree(download_directory, ignore_errors = True)
+
+        return ffmpeg_cache_directory, 'cache miss'
+
+    artifacts_directory          = os.path.join('/', 'pipeline', 'artifacts')
+    video_audio_file             = os.path.join(artifacts_directory, f'video_audio.{ audio_format }')
+    video_speeches_file          = os.path.join(artifacts_directory, 'video_speeches.txt')
+    video_speeches_segments_file = os.path.join(artifacts_directory, 'video_speeches_segments.jsonl')
+    video_speeches_backend_file  = os.path.join(artifacts_directory, 'extract_speeches_backend_report.json')
+
+    sampling_rate = 16000
+
+    def load_decoded_audio():
+
+        # 16 kHz mono audio written by extract_audio needs no ffmpeg and no second decode.
+        if audio_format == 'f32':
+
+            print(f'audio input : { video_audio_file } (memory mapped)')
+
+            return np.memmap(video_audio_file, dtype = '<f4', mode = 'r')
+
+        if audio_format == 'wav':
+
+            with wave.open(video_audio_file, 'rb') as file:
+
+                if file.getframerate() != sampling_rate or file.getnchannels() != 1 or file.getsampwidth() != 2:
+                    raise ValueError(f'Expected 16 kHz mono 16 bit audio: { video_audio_file }')
+
+                frames = file.readframes(file.getnframes())
+
+            print(f'audio input : { video_audio_file }')
+
+            return np.frombuffer(frames, dtype = '<i2').astype(np.float32) / 32768.0
+
+        if audio_format != 'mp3':
 
-    urllib.request.urlretrieve(ffmpeg_url, ffmpeg_file)
+            raise ValueError(f'Unsupported audio format: { audio_format }')
 
-    with tarfile.open(ffmpeg_file) as ffmpeg_tarfile:
+        print(f'audio input : { video_audio_file }')
 
-        ffmpeg_tarfile.extractall()
+        return None
 
-    for directory in next(os.walk('.'))[1]:
+    def setup_ffmpeg():
 
-        if directory.startswith('ffmpeg'):
+        setup_start = time.perf_counter()
 
-            ffmpeg_directory = os.path.join(os.getcwd(), directory)
-            break
+        ffmpeg_directory = load_cached_ffmpeg()
+        ffmpeg_source    = 'cache hit'
 
-    os.environ['PATH'] += os.pathsep + ffmpeg_directory
+        if ffmpeg_directory is None:
 
-    artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
-    video_audio_file    = os.path.join(artifacts_directory, 'video_audio.mp3')
-    video_speeches_file = os.path.join(artifacts_directory, 'video_speeches.txt')
+            try:
+                ffmpeg_directory, ffmpeg_source = download_ffmpeg()
+            except Exception as error:
+                print(f'ffmpeg download failed : { error }')
 
-    pipe     = pipeline(task = 'automatic-speech-recognition', model = 'openai/whisper-tiny')
-    speeches = pipe(video_audio_file)
+                system_ffmpeg = shutil.which('ffmpeg')
 
-    with open(video_speeches_file, 'w') as file:
+                if system_ffmpeg is None:
+                    raise
 
-        file.write(speeches['text'])
+                ffmpeg_directory = os.path.dirname(system_ffmpeg)
+                ffmpeg_source    = 'system fallback'
+
+        os.environ['PATH'] = ffmpeg_directory + os.pathsep + os.environ['PATH']
+
+        print(f'ffmpeg toolchain : { ffmpeg_source } ({ ffmpeg_directory })')
+        print(f'ffmpeg setup     : { time.perf_counter() - setup_start:.2f}s')
+
+    audio = load_decoded_audio()
+
+    if audio is None:
+
+        setup_ffmpeg()
+
+    if num_threads > 0:
+
+        torch.set_num_threads(num_threads)
+
+    model_load_start   = time.perf_counter()
+    model, conversion  = models_helper.load_model(model_name, 'SpeechSeq2Seq')
+    pipe               = pipeline(task = 'automatic-speech-recognition', model = model, tokenizer = model_name, feature_extractor = model_name)
+    model_load_seconds = time.perf_counter() - model_load_start
+
+    models_helper.record_load(model_name, conversion, model_load_seconds)
+
+    print(f'model load : { model_name } on { backend }, { conversion } ({ model_load_seconds:.1f}s)')
+
+    def decode_audio():
+
+        from transformers.pipelines.audio_utils import ffmpeg_read
+
+        with open(video_audio_file, 'rb') as file:
+
+            return ffmpeg_read(file.read(), sampling_rate)
+
+    def transcribe_long_form(audio):
+
+        chunk_length  = int(chunk_length_s * sampling_rate)
+        stride_length = int(stride_length_s * sampling_rate)
+        step_length   = chunk_length - 2 * stride_length
+
+        if step_length <= 0:
+
+            raise ValueError('chunk_length_s must be greater than twice stride_length_s')
+
+        # Each chunk owns the audio between its strides, segments are kept by the chunk owning their midpoint.
+        chunks = []
+
+        for owned_start in range(0, len(audio), step_length):
+
+            owned_end = owned_start + step_length
+
+            chunks.append({
+                'start'       : max(owned_start - stride_length, 0),
+                'end'         : min(owned_end + stride_length, len(audio)),
+                'owned_start' : owned_start / sampling_rate,
+                'owned_end'   : owned_end / sampling_rate if owned_end < len(audio) else float('inf')
+            })
+
+        print(f'audio duration : { len(audio) / sampling_rate:.1f}s')
+        print(f'chunks         : { len(chunks) }')
+
+        with open(video_speeches_file, 'w') as speeches_file, open(video_speeches_segments_file, 'w') as segments_file:
+
+            separator = ''
+
+            for batch_start in range(0, len(chunks), batch_size):
+
+                batch   = chunks[batch_start:batch_start + batch_size]
+                inputs  = [{ 'raw' : audio[chunk['start']:chunk['end']], 'sampling_rate' : sampling_rate } for chunk in batch]
+                outputs = pipe(inputs, batch_size = batch_size, return_timestamps = True)
+
+                for chunk, output in zip(batch, outputs):
+
+                    offset   = chunk['start'] / sampling_rate
+                    duration = (chunk['end'] - chunk['start']) / sampling_rate
+
+                    for segment in output['chunks']:
+
+                        segment_start, segment_end = segment['timestamp']
+
+                        if segment_end is None:
+                            segment_end = duration
+
+                        segment_start += offset
+                        segment_end   += offset
+                        midpoint       = (segment_start + segment_end) / 2
+
+                        if not chunk['owned_start'] <= midpoint < chunk['owned_end']:
+                            continue
+
+                        text = segment['text'].strip()
+
+                        if not text:
+                            continue
+
+                        speeches_file.write(separator + text)
+                        separator = ' '
+
+                        segments_file.write(json.dumps({ 'start' : round(segment_start, 2), 'end' : round(segment_end, 2), 'text' : text }) + '\n')
+
+                speeches_file.flush()
+                segments_file.flush()
+
+                print(f'transcribed chunks : { min(batch_start + batch_size, len(chunks)) }/{ len(chunks) } ({ time.perf_counter() - transcribe_start:.1f}s)')
+
+    transcribe_start = time.perf_counter()
+
+    if not long_form:
+
+        speeches = pipe(video_audio_file if audio is None else { 'raw' : audio, 'sampling_rate' : sampling_rate })
+
+        with open(video_speeches_file, 'w') as file:
+
+            file.write(speeches['text'])
+
+    else:
+
+        audio = decode_audio() if audio is None else audio
+
+        transcribe_long_form(audio)
+
+    transcribe_seconds = time.perf_counter() - transcribe_start
+
+    print(f'transcription : { transcribe_seconds:.1f}s')
+
+    backend_report = models_helper.backend_report(model_name, conversion, model_load_seconds, inference_seconds = transcribe_seconds)
+
+    if compare_reference:
+
+        # The comparison runs on the first Whisper window, long enough to compare and short enough to stay cheap.
+        audio          = decode_audio() if audio is None else audio
+        sample         = np.asarray(audio[:30 * sampling_rate])
+        reference_pipe = pipeline(task = 'automatic-speech-recognition', model = model_name)
+        outputs        = {}
+
+        for name, comparison_pipe in [('reference', reference_pipe), ('backend', pipe)]:
+
+            comparison_start = time.perf_counter()
+            output           = comparison_pipe({ 'raw' : sample, 'sampling_rate' : sampling_rate })['text']
+            outputs[name]    = (output, time.perf_counter() - comparison_start)
+
+        backend_report['reference'] = models_helper.compare_reference(*outputs['reference'], *outputs['backend'])
+
+        print(f'reference : { backend_report["reference"]["speedup"]:.2f}x speedup, { backend_report["reference"]["similarity"]:.3f} similarity')
+
+    with open(video_speeches_backend_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(backend_report, file, ensure_ascii = False, indent = 4)
 
 
 if __name__ == '__main__':
@@ -44,10 +402,50 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'extract_speeches',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            requirements = ['torch==2.1.2', 'transformers==4.37.1']
+
+            if os.getenv('backend') == 'openvino':
+
+                requirements.append('optimum-intel[openvino]==1.15.2')
+
+            if os.getenv('backend') == 'onnxruntime':
+
+                requirements.append('optimum[onnxruntime]==1.16.2')
+
+            install_requirements(
+                requirements         = requirements,
+                step                 = 'extract_speeches',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'torch==2.1.2'])
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'transformers==4.37.1'])
+        with phase('extract_speeches'):
 
-    extract_speeches()
\ No newline at end of file
+            extract_speeches(
+                audio_format              = os.getenv('audio_format', 'mp3'),
+                toolchain_cache_directory = os.getenv('toolchain_cache_directory', '/pipeline/cache/toolchain'),
+                ffmpeg_url                = os.getenv('ffmpeg_url', 'https://johnvansickle.com/ffmpeg/releases/ffmpeg-release-amd64-static.tar.xz'),
+                ffmpeg_sha256             = os.getenv('ffmpeg_sha256', ''),
+                long_form                 = os.getenv('long_form', 'false').lower() == 'true',
+                chunk_length_s            = int(os.getenv('chunk_length_s', '30')),
+                stride_length_s           = int(os.getenv('stride_length_s', '5')),
+                batch_size                = int(os.getenv('batch_size', '4')),
+                num_threads               = int(os.getenv('num_threads', '0')),
+                model_cache_directory     = os.getenv('model_cache_directory', '/pipeline/cache/huggingface'),
+                backend                   = os.getenv('backend', 'pytorch'),
+                quantize                  = os.getenv('quantize', 'false').lower() == 'true',
+                compare_reference         = os.getenv('compare_reference', 'false').lower() == 'true'
+            )
@@ -1,36 +1,221 @@
-def extract_summary():
+# Shared with the other model steps, kfp_component ships it with the KFP components.
+from hf_models import hf_models
+
+
+def extract_summary(
+    hierarchical          : bool = False,
+    chunk_tokens          : int  = 900,
+    batch_size            : int  = 4,
+    num_threads           : int  = 0,
+    model_cache_directory : str  = '/pipeline/cache/huggingface',
+    backend               : str  = 'pytorch',
+    quantize              : bool = False,
+    compare_reference     : bool = False
+):
     """
     Extracts the summary from the video.
+
+    In hierarchical mode the speeches are split on sentence boundaries into chunks within the token budget of the
+    model, the chunks are summarized in batches and the summaries are summarized again until a single chunk remains.
+
+    The model runs on the selected backend, converted once and cached in the model cache directory. The backend,
+    conversion and latency are reported in extract_summary_backend_report.json, together with the latency and the
+    similarity of the output against the eager PyTorch model when compare_reference is set.
+
+    Parameters:
+        - hierarchical          (bool) : Whether to summarize long speeches by map reduce instead of truncating them.
+        - chunk_tokens          (int)  : The token budget of each chunk. It should be below the model context of 1024 tokens.
+        - batch_size            (int)  : The number of chunks summarized per batch.
+        - num_threads           (int)  : The number of CPU threads used by torch. Zero keeps the torch default.
+        - model_cache_directory (str)  : The directory where the Hugging Face models are cached across runs.
+        - backend               (str)  : The inference backend. It should be 'pytorch', 'openvino' or 'onnxruntime'.
+        - quantize              (bool) : Whether to apply dynamic INT8 quantization to the model.
+        - compare_reference     (bool) : Whether to compare the output and latency against the eager PyTorch model.
     """
 
+    import json
     import os
+    import re
+    import time
+
+    import torch
+
+    model_name = 'sshleifer/distilbart-cnn-12-6'
+
+    # Sets up the Hugging Face cache, and the offline mode for prefetched models, before transformers is imported.
+    models_helper = hf_models('extract_summary', [model_name], model_cache_directory, backend, quantize)
+
     from transformers import pipeline
 
-    artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
-    video_speeches_file = os.path.join(artifacts_directory, 'video_speeches.txt')
-    video_summary_file  = os.path.join(artifacts_directory, 'video_summary.txt')
+    artifacts_directory        = os.path.join('/', 'pipeline', 'artifacts')
+    video_speeches_file        = os.path.join(artifacts_directory, 'video_speeches.txt')
+    video_summary_file         = os.path.join(artifacts_directory, 'video_summary.txt')
+    video_summary_backend_file = os.path.join(artifacts_directory, 'extract_summary_backend_report.json')
 
     with open(video_speeches_file, 'r') as file:
 
         speeches = file.read()
 
-    pipe    = pipeline(task = 'summarization', model = 'sshleifer/distilbart-cnn-12-6')
-    summary = pipe(speeches)
+    if num_threads > 0:
+
+        torch.set_num_threads(num_threads)
+
+    model_load_start   = time.perf_counter()
+    model, conversion  = models_helper.load_model(model_name, 'Seq2SeqLM')
+    pipe               = pipeline(task = 'summarization', model = model, tokenizer = model_name)
+    model_load_seconds = time.perf_counter() - model_load_start
+
+    models_helper.record_load(model_name, conversion, model_load_seconds)
+
+    print(f'model load : { model_name } on { backend }, { conversion } ({ model_load_seconds:.1f}s)')
+
+    def count_tokens(text):
+
+        return len(pipe.tokenizer.encode(text, add_special_tokens = False))
+
+    def split_chunks(text):
+
+        chunks, chunk = [], []
+
+        for sentence in re.split(r'(?<=[.!?])\s+', text.strip()):
+
+            token_ids = pipe.tokenizer.encode(sentence, add_special_tokens = False)
+
+            # A sentence longer than the budget is split on token boundaries.
+            if len(token_ids) > chunk_tokens:
+
+                pieces = [pipe.tokenizer.decode(token_ids[i:i + chunk_tokens]) for i in range(0, len(token_ids), chunk_tokens)]
+
+            else:
+
+                pieces = [sentence]
+
+            for piece in pieces:
+
+                # The joined chunk is counted, as decoded pieces and the joining spaces may not add up token by token.
+                if chunk and count_tokens(' '.join(chunk + [piece])) > chunk_tokens:
+
+                    chunks.append(' '.join(chunk))
+                    chunk = []
+
+                chunk.append(piece)
+
+        if chunk:
+
+            chunks.append(' '.join(chunk))
+
+        for chunk in chunks:
+
+            assert count_tokens(chunk) <= chunk_tokens, f'Chunk of { count_tokens(chunk) } tokens over the budget of { chunk_tokens }'
+
+        return chunks
+
+    summarize_start = time.perf_counter()
+
+    if not hierarchical:
+
+        summary = pipe(speeches)
+
+    else:
+
+        chunks = split_chunks(speeches)
+        level  = 0
+
+        while len(chunks) > 1:
+
+            level_start = time.perf_counter()
+            summaries   = pipe(chunks, batch_size = batch_size, truncation = True)
+
+            print(f'level { level } : { len(chunks) } chunks summarized in { time.perf_counter() - level_start:.1f}s')
+
+            summaries = split_chunks(' '.join(summary['summary_text'] for summary in summaries))
+            level    += 1
+
+            # Summaries longer than their chunks would never converge, the last level is truncated instead.
+            if len(summaries) >= len(chunks):
+
+                summaries = [' '.join(summaries)]
+
+            chunks = summaries
+
+        summary = pipe(chunks[0], truncation = True) if chunks else [{ 'summary_text' : '' }]
+
+        print(f'summary levels : { level + 1 }')
+
+    summarize_seconds = time.perf_counter() - summarize_start
+
+    print(f'summary time   : { summarize_seconds:.1f}s')
 
     with open(video_summary_file, 'w') as file:
 
         file.write(summary[0]['summary_text'])
 
+    backend_report = models_helper.backend_report(model_name, conversion, model_load_seconds, inference_seconds = summarize_seconds)
+
+    if compare_reference:
+
+        reference_pipe = pipeline(task = 'summarization', model = model_name)
+        outputs        = {}
+
+        for name, comparison_pipe in [('reference', reference_pipe), ('backend', pipe)]:
+
+            comparison_start = time.perf_counter()
+            output           = comparison_pipe(speeches, truncation = True)[0]['summary_text']
+            outputs[name]    = (output, time.perf_counter() - comparison_start)
+
+        backend_report['reference'] = models_helper.compare_reference(*outputs['reference'], *outputs['backend'])
+
+        print(f'reference : { backend_report["reference"]["speedup"]:.2f}x speedup, { backend_report["reference"]["similarity"]:.3f} similarity')
+
+    with open(video_summary_backend_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(backend_report, file, ensure_ascii = False, indent = 4)
+
 
 if __name__ == '__main__':
     """
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'extract_summary',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            requirements = ['torch==2.1.2', 'transformers==4.37.1']
+
+            if os.getenv('backend') == 'openvino':
+
+                requirements.append('optimum-intel[openvino]==1.15.2')
+
+            if os.getenv('backend') == 'onnxruntime':
+
+                requirements.append('optimum[onnxruntime]==1.16.2')
+
+            install_requirements(
+                requirements         = requirements,
+                step                 = 'extract_summary',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'torch==2.1.2'])
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'transformers==4.37.1'])
+        with phase('extract_summary'):
 
-    extract_summary()
\ No newline at end of file
+            extract_summary(
+                hierarchical          = os.getenv('hierarchical', 'false').lower() == 'true',
+                chunk_tokens          = int(os.getenv('chunk_tokens', '900')),
+                batch_size            = int(os.getenv('batch_size', '4')),
+                num_threads           = int(os.getenv('num_threads', '0')),
+                model_cache_directory = os.getenv('model_cache_directory', '/pipeline/cache/huggingface'),
+                backend               = os.getenv('backend', 'pytorch'),
+                quantize              = os.getenv('quantize', 'false').lower() == 'true',
+                compare_reference     = os.getenv('compare_reference', 'false').lower() == 'true'
+            )
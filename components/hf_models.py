@@ -0,0 +1,156 @@
+def hf_models(
+    step                  : str,
+    model_names           : list,
+    model_cache_directory : str  = '/pipeline/cache/huggingface',
+    backend               : str  = 'pytorch',
+    quantize              : bool = False,
+    artifacts_directory   : str  = '/pipeline/artifacts'
+):
+    """
+    Loads the Hugging Face models of a step on the selected backend and reports how they were loaded.
+
+    The Hugging Face cache is set to the model cache directory. When every model of the step was verified by
+    prefetch_models, the models load offline from the cache without querying the hub. It must therefore be called
+    before transformers is imported. load_model() converts a model to the backend once and caches the conversion in
+    the model cache directory, record_load() appends the load to model_load_metrics.jsonl in the artifacts directory,
+    backend_report() and compare_reference() build the backend report of the step.
+
+    Parameters:
+        - step                  (str)  : The name of the pipeline step, recorded with every model load.
+        - model_names           (list) : The Hugging Face models used by the step.
+        - model_cache_directory (str)  : The directory where the Hugging Face models are cached across runs.
+        - backend               (str)  : The inference backend. It should be 'pytorch', 'openvino' or 'onnxruntime'.
+        - quantize              (bool) : Whether to apply dynamic INT8 quantization to the models.
+        - artifacts_directory   (str)  : The directory where the pipeline artifacts are stored.
+
+    Returns:
+        - hf_models (SimpleNamespace) : The load_model, record_load, backend_report and compare_reference functions.
+    """
+
+    import difflib
+    import json
+    import os
+    import shutil
+    import types
+
+    prefetched_models_file = os.path.join(model_cache_directory, 'prefetched_models.json')
+    prefetched_models      = {}
+
+    if os.path.isfile(prefetched_models_file):
+
+        with open(prefetched_models_file, 'r') as file:
+
+            prefetched_models = json.load(file)
+
+    os.environ['HF_HOME'] = model_cache_directory
+
+    # Models verified by prefetch_models load offline from the cache, without querying the hub.
+    if all(model_name in prefetched_models for model_name in model_names):
+
+        os.environ['HF_HUB_OFFLINE'] = '1'
+
+    def load_model(model_name, model_class_name):
+
+        if backend == 'pytorch':
+
+            import torch
+            import transformers
+
+            model = getattr(transformers, f'AutoModelFor{ model_class_name }').from_pretrained(model_name)
+
+            if quantize:
+
+                model = torch.quantization.quantize_dynamic(model, { torch.nn.Linear }, dtype = torch.qint8)
+
+            return model, 'eager'
+
+        if backend == 'openvino':
+
+            import optimum.intel as backend_module
+
+            model_class = getattr(backend_module, f'OVModelFor{ model_class_name }')
+
+        elif backend == 'onnxruntime':
+
+            import optimum.onnxruntime as backend_module
+
+            model_class = getattr(backend_module, f'ORTModelFor{ model_class_name }')
+
+        else:
+
+            raise ValueError(f'Unsupported backend: { backend }')
+
+        # Conversions are cached next to the Hugging Face models, so only the first run pays for the export.
+        converted_directory = os.path.join(
+            model_cache_directory, 'converted', backend + ('-int8' if quantize else ''), model_name.replace('/', '--')
+        )
+
+        if os.path.isfile(os.path.join(converted_directory, 'config.json')):
+
+            return model_class.from_pretrained(converted_directory), 'cache hit'
+
+        export_arguments  = { 'load_in_8bit' : quantize } if backend == 'openvino' else {}
+        model             = model_class.from_pretrained(model_name, export = True, **export_arguments)
+        staging_directory = converted_directory + '.partial'
+
+        shutil.rmtree(staging_directory, ignore_errors = True)
+        model.save_pretrained(staging_directory)
+
+        if backend == 'onnxruntime' and quantize:
+
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+
+            for file in os.listdir(staging_directory):
+
+                if not file.endswith('.onnx'):
+                    continue
+
+                onnx_file = os.path.join(staging_directory, file)
+
+                quantize_dynamic(onnx_file, onnx_file + '.int8', weight_type = QuantType.QInt8)
+                os.replace(onnx_file + '.int8', onnx_file)
+
+        shutil.rmtree(converted_directory, ignore_errors = True)
+        os.rename(staging_directory, converted_directory)
+
+        return model_class.from_pretrained(converted_directory), 'cache miss'
+
+    def record_load(model_name, conversion, load_seconds):
+
+        with open(os.path.join(artifacts_directory, 'model_load_metrics.jsonl'), 'a') as file:
+
+            file.write(json.dumps({
+                'step'         : step,
+                'model'        : model_name,
+                'backend'      : backend,
+                'conversion'   : conversion,
+                'offline'      : os.environ.get('HF_HUB_OFFLINE') == '1',
+                'load_seconds' : load_seconds
+            }) + '\n')
+
+    def backend_report(model_name, conversion, load_seconds, **timings):
+
+        return {
+            'model'        : model_name,
+            'backend'      : backend,
+            'quantize'     : quantize,
+            'conversion'   : conversion,
+            'load_seconds' : load_seconds,
+            **timings
+        }
+
+    def compare_reference(reference_output, reference_seconds, backend_output, backend_seconds):
+
+        return {
+            'reference_seconds' : reference_seconds,
+            'backend_seconds'   : backend_seconds,
+            'speedup'           : reference_seconds / backend_seconds if backend_seconds else 0.0,
+            'similarity'        : difflib.SequenceMatcher(None, reference_output.split(), backend_output.split()).ratio()
+        }
+
+    return types.SimpleNamespace(
+        load_model        = load_model,
+        record_load       = record_load,
+        backend_report    = backend_report,
+        compare_reference = compare_reference
+    )
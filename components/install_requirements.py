@@ -0,0 +1,106 @@
+def install_requirements(
+    requirements         : list,
+    step                 : str,
+    wheelhouse_directory : str = '/pipeline/cache/wheelhouse',
+    metrics_file         : str = '/pipeline/artifacts/startup_metrics.jsonl'
+):
+    """
+    Installs the requirements of a pipeline step, skipping pip when every requirement is already satisfied.
+
+    Missing requirements are installed offline from the wheelhouse directory on the PVC. When the wheelhouse does
+    not hold them yet, they are downloaded into it first, so only the first run of a step pays for the index. The
+    startup time of the step is appended to the metrics file, unless its directory is not writable.
+
+    Parameters:
+        - requirements         (list) : The requirement specifiers, e.g. ['tensorflow==2.15.0'].
+        - step                 (str)  : The name of the pipeline step, used in the startup metrics.
+        - wheelhouse_directory (str)  : The directory where wheels are cached across runs. Empty installs from the index.
+        - metrics_file         (str)  : The JSON-lines file the startup time is appended to. Empty disables the metrics.
+    """
+
+    import json
+    import os
+    import subprocess
+    import sys
+    import time
+
+    from importlib import metadata
+
+    try:
+        from packaging.requirements import Requirement
+    except ImportError:
+        from pip._vendor.packaging.requirements import Requirement
+
+    start = time.perf_counter()
+
+    def is_satisfied(requirement, extra = None):
+
+        requirement = Requirement(requirement)
+
+        if requirement.marker and not requirement.marker.evaluate({ 'extra' : extra or '' }):
+            return True
+
+        try:
+            version = metadata.version(requirement.name)
+        except metadata.PackageNotFoundError:
+            return False
+
+        if not requirement.specifier.contains(version, prereleases = True):
+            return False
+
+        # Extras are satisfied when the requirements they add are.
+        for requirement_extra in requirement.extras:
+            for extra_requirement in metadata.requires(requirement.name) or []:
+                if 'extra' in extra_requirement and not is_satisfied(extra_requirement, requirement_extra):
+                    return False
+
+        return True
+
+    missing = [requirement for requirement in requirements if not is_satisfied(requirement)]
+    pip     = [sys.executable, '-m', 'pip', '--disable-pip-version-check']
+    source  = 'satisfied'
+
+    if missing and not wheelhouse_directory:
+        subprocess.check_call(pip + ['install'] + missing)
+        source = 'index'
+
+    elif missing:
+        os.makedirs(wheelhouse_directory, exist_ok = True)
+
+        offline_install = pip + ['install', '--no-index', '--find-links', wheelhouse_directory] + missing
+        source          = 'wheelhouse'
+
+        if subprocess.call(offline_install) != 0:
+            subprocess.check_call(pip + ['download', '--dest', wheelhouse_directory] + missing)
+            subprocess.check_call(offline_install)
+            source = 'index'
+
+    startup_seconds = time.perf_counter() - start
+
+    print(f'{ step } startup : { len(requirements) - len(missing) }/{ len(requirements) } satisfied, { source } ({ startup_seconds:.1f}s)')
+
+    if not metrics_file:
+        return
+
+    metrics_directory = os.path.dirname(os.path.abspath(metrics_file))
+
+    try:
+        os.makedirs(metrics_directory, exist_ok = True)
+    except OSError:
+        pass
+
+    # Steps run outside the pipeline, e.g. locally, have no writable artifacts directory.
+    if not os.access(metrics_directory, os.W_OK):
+
+        print(f'{ step } startup : { metrics_directory } is not writable, the startup metrics are not recorded')
+        return
+
+    with open(metrics_file, 'a') as file:
+
+        file.write(json.dumps({
+            'step'            : step,
+            'requirements'    : requirements,
+            'missing'         : missing,
+            'source'          : source,
+            'startup_seconds' : startup_seconds
+        }) + '\n')
@@ -0,0 +1,65 @@
+def kfp_component(
+    func,
+    helpers           : list = (),
+    metrics_directory : str  = '/pipeline/metrics'
+):
+    """
+    Returns a copy of a component function whose body runs under step_metrics, for the KFP notebooks.
+
+    KFP ships the source of the component function alone, so the copy is generated from it: the helper functions
+    are defined at the start of its body, followed by the original body wrapped in step_metrics, with the name of
+    the function as the step and phase. The signature, docstring and name are unchanged. step_metrics itself must
+    be shipped either as a helper or, with kfp 1.x, through extra_code. The copy is written to a temporary module,
+    as KFP reads the source of the function from its file.
+
+    Parameters:
+        - func              (function) : The component function.
+        - helpers           (list)     : The helper functions used by the component, e.g. step_metrics.
+        - metrics_directory (str)      : The directory where the metrics of every step are written.
+
+    Returns:
+        - component (function) : The copy of the component function recording its metrics.
+    """
+
+    import ast
+    import importlib.util
+    import inspect
+    import os
+    import tempfile
+    import textwrap
+
+    def indent(source, spaces):
+
+        return textwrap.indent(source, ' ' * spaces, lambda line : line.strip() != '')
+
+    source     = textwrap.dedent(inspect.getsource(func))
+    lines      = source.split('\n')
+    definition = ast.parse(source).body[0]
+    statements = definition.body
+
+    # The docstring stays where it is, the helpers and the wrapped body follow it.
+    if isinstance(statements[0], ast.Expr) and isinstance(statements[0].value, ast.Constant) and len(statements) > 1:
+        statements = statements[1:]
+
+    header = '\n'.join(lines[:statements[0].lineno - 1])
+    body   = textwrap.dedent('\n'.join(lines[statements[0].lineno - 1:]))
+
+    component_source = '\n'.join([
+        header,
+        *[indent(textwrap.dedent(inspect.getsource(helper)), 4) for helper in helpers],
+        indent(f"with step_metrics(step = '{ func.__name__ }', metrics_directory = '{ metrics_directory }') as phase:\n", 4),
+        indent(f"with phase('{ func.__name__ }'):\n", 8),
+        indent(body, 12)
+    ])
+
+    module_file = os.path.join(tempfile.mkdtemp(prefix = 'kfp_component_'), f'{ func.__name__ }.py')
+
+    with open(module_file, 'w', encoding = 'utf-8') as file:
+
+        file.write(component_source)
+
+    spec   = importlib.util.spec_from_file_location(func.__name__, module_file)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return getattr(module, func.__name__)
@@ -0,0 +1,86 @@
+def ocr_cache(
+    step                : str,
+    document_file       : str,
+    tesseract_config    : str,
+    variant             : str,
+    ocr_cache_directory : str = '/pipeline/cache/ocr'
+):
+    """
+    Caches the .ocr.txt output of a document extraction step across runs.
+
+    Results are keyed by the document content, the tesseract configuration and the variant of the extraction, e.g.
+    the field or the mode. lookup() copies a cached result to the .ocr.txt output and returns True, the step then
+    skips the extraction. store() caches the .ocr.txt output written by the extraction after a miss. Hits and misses
+    are counted by step in counters.json in the OCR cache directory, under a file lock shared by concurrent steps.
+
+    The OCR cache directory must be on a volume that outlives the pipeline run, e.g. the pipeline-cache-pvc PVC.
+
+    Parameters:
+        - step                (str) : The name of the extraction step, the results of each step are cached apart.
+        - document_file       (str) : The path of the document, its result is written to <document_file>.ocr.txt.
+        - tesseract_config    (str) : The tesseract configuration, e.g. '--oem 3 --psm 4 -l por'.
+        - variant             (str) : Everything else changing the result of the extraction, e.g. 'nome' or 'paged'.
+        - ocr_cache_directory (str) : The directory where OCR results are cached across runs. Empty disables the cache.
+
+    Returns:
+        - ocr_cache (SimpleNamespace) : The lookup and store functions of the document.
+    """
+
+    import fcntl
+    import hashlib
+    import json
+    import os
+    import shutil
+    import types
+
+    ocr_file   = document_file + '.ocr.txt'
+    cache_file = ''
+
+    if ocr_cache_directory:
+        with open(document_file, 'rb') as doc:
+            cache_key = hashlib.sha256(doc.read())
+
+        cache_key.update('\0{}\0{}'.format(tesseract_config, variant).encode('utf-8'))
+
+        cache_file = os.path.join(ocr_cache_directory, step, cache_key.hexdigest() + '.ocr.txt')
+        os.makedirs(os.path.dirname(cache_file), exist_ok = True)
+
+    def count(event):
+
+        counters_file = os.path.join(ocr_cache_directory, 'counters.json')
+
+        with open(os.open(counters_file, os.O_RDWR | os.O_CREAT), 'r+') as counters:
+            fcntl.flock(counters, fcntl.LOCK_EX)
+
+            content = counters.read()
+            counts  = json.loads(content) if content else {}
+
+            counts.setdefault(step, { 'hits' : 0, 'misses' : 0 })
+            counts[step][event] += 1
+
+            counters.seek(0)
+            counters.truncate()
+            json.dump(counts, counters, indent = 4)
+
+        print('OCR cache {}: {}'.format(event, counts[step]))
+
+    def lookup():
+
+        if not cache_file or not os.path.isfile(cache_file):
+            return False
+
+        shutil.copyfile(cache_file, ocr_file)
+        count('hits')
+
+        return True
+
+    def store():
+
+        if cache_file:
+            partial_file = '{}.{}.partial'.format(cache_file, os.getpid())
+
+            shutil.copyfile(ocr_file, partial_file)
+            os.replace(partial_file, cache_file)
+            count('misses')
+
+    return types.SimpleNamespace(lookup = lookup, store = store)
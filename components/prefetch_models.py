@@ -0,0 +1,111 @@
+def prefetch_models(
+    models                : str = 'openai/whisper-tiny,sshleifer/distilbart-cnn-12-6,Helsinki-NLP/opus-mt-en-es,unicamp-dl/translation-en-pt-t5',
+    model_cache_directory : str = '/pipeline/cache/huggingface'
+):
+    """
+    Downloads the Hugging Face models to the model cache directory and verifies they load from it.
+
+    The model cache directory should be on a persistent volume, so the models are downloaded once and not on every
+    run. Only one format of the PyTorch weights is downloaded: safetensors when the model has them, else the .bin files.
+
+    The verified models are recorded in prefetched_models.json in the model cache directory, together with their
+    download and load times. The components using these models run in offline mode once they are recorded.
+
+    Parameters:
+        - models                (str) : Comma separated Hugging Face model ids.
+        - model_cache_directory (str) : The directory where the Hugging Face models are cached across runs.
+    """
+
+    import json
+    import os
+    import time
+
+    os.environ['HF_HOME'] = model_cache_directory
+
+    from huggingface_hub import list_repo_files, snapshot_download
+    from transformers import AutoModel
+
+    prefetched_models_file = os.path.join(model_cache_directory, 'prefetched_models.json')
+    prefetched_models      = {}
+
+    if os.path.isfile(prefetched_models_file):
+
+        with open(prefetched_models_file, 'r') as file:
+
+            prefetched_models = json.load(file)
+
+    for model in [model.strip() for model in models.split(',') if model.strip()]:
+
+        download_start = time.perf_counter()
+
+        # Only the PyTorch weights are used, the TensorFlow, Flax and ONNX exports are skipped.
+        ignore_patterns = ['*.h5', '*.msgpack', '*.ot', '*.onnx', '*.tflite', 'coreml/*']
+
+        # Of the PyTorch weights only one format is fetched, safetensors when the model has them.
+        if any(file.endswith('.safetensors') for file in list_repo_files(model)):
+
+            ignore_patterns.append('pytorch_model*.bin')
+
+        snapshot_directory = snapshot_download(
+            repo_id         = model,
+            ignore_patterns = ignore_patterns
+        )
+
+        download_seconds = time.perf_counter() - download_start
+        load_start       = time.perf_counter()
+
+        AutoModel.from_pretrained(snapshot_directory, local_files_only = True)
+
+        load_seconds = time.perf_counter() - load_start
+
+        snapshot_bytes = sum(
+            os.path.getsize(os.path.join(directory, file))
+            for directory, _, files in os.walk(snapshot_directory)
+            for file in files
+        )
+
+        prefetched_models[model] = {
+            'revision'         : os.path.basename(snapshot_directory),
+            'bytes'            : snapshot_bytes,
+            'download_seconds' : download_seconds,
+            'load_seconds'     : load_seconds
+        }
+
+        print(f'{ model } : { snapshot_bytes } bytes, download { download_seconds:.1f}s, load { load_seconds:.1f}s')
+
+    with open(prefetched_models_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(prefetched_models, file, ensure_ascii = False, indent = 4)
+
+
+if __name__ == '__main__':
+    """
+    Elyra Pipelines
+    """
+
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'prefetch_models',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['torch==2.1.2', 'sentencepiece==0.1.99', 'transformers==4.37.1'],
+                step                 = 'prefetch_models',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
+
+        with phase('prefetch_models'):
+
+            prefetch_models(
+                models                = os.getenv('models', 'openai/whisper-tiny,sshleifer/distilbart-cnn-12-6,Helsinki-NLP/opus-mt-en-es,unicamp-dl/translation-en-pt-t5'),
+                model_cache_directory = os.getenv('model_cache_directory', '/pipeline/cache/huggingface')
+            )
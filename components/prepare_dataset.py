@@ -34,4 +34,16 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    prepare_dataset()
\ No newline at end of file
+    import os
+
+    from step_metrics import step_metrics
+
+    with step_metrics(
+        step              = 'prepare_dataset',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('prepare_dataset'):
+
+            prepare_dataset()
\ No newline at end of file
@@ -9,4 +9,16 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    prepare_video()
\ No newline at end of file
+    import os
+
+    from step_metrics import step_metrics
+
+    with step_metrics(
+        step              = 'prepare_video',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('prepare_video'):
+
+            prepare_video()
\ No newline at end of file
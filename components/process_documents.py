@@ -0,0 +1,244 @@
+# The extraction steps run in the OCR workers, the KFP component gets them through extra_code.
+from extract_document_info_cnh       import extract_document_info_cnh
+from extract_document_info_escritura import extract_document_info_escritura
+
+
+def process_documents(
+    s3_service_name          : str,
+    s3_endpoint_url          : str,
+    s3_access_key_id         : str,
+    s3_secret_access_key     : str,
+    s3_region                : str,
+    s3_bucket                : str,
+    pipeline_name            : str,
+    tesseract_config         : str,
+    s3_prefix                : str = '',
+    manifest_file            : str = '',
+    download_workers         : int = 8,
+    workers                  : int = 0,
+    document_cache_directory : str = '/pipeline/cache/documents',
+    ocr_cache_directory      : str = '/pipeline/cache/ocr'
+):
+    """
+    Downloads and extracts the information from many documents in a single step.
+
+    The documents are listed under an s3 prefix or read from a CSV manifest with 'document' and 'type' columns, the
+    type being 'cnh' or 'escritura'. Without a type, documents with 'cnh' in their name are CNH documents and the
+    others ESCRITURA documents. The documents are downloaded concurrently and handed to a pool of OCR worker
+    processes as soon as each download completes. The workers run the extract_document_info_cnh and
+    extract_document_info_escritura steps, so the .ocr.txt outputs and the OCR cache are the same as theirs.
+
+    Each document is downloaded to its s3 key below the pipeline name, relative to the artifacts directory, so
+    documents with the same name under different prefixes are kept apart.
+
+    The outcome and timing of each document, including failures, are written to process_documents_summary.json.
+
+    Parameters:
+        - s3_service_name          (str) : The name of the s3 service. It should be 's3'.
+        - s3_endpoint_url          (str) : The url of the s3 endpoint.
+        - s3_access_key_id         (str) : The access key id for authentication.
+        - s3_secret_access_key     (str) : The secret access key for authentication.
+        - s3_region                (str) : The region where the s3 bucket is located.
+        - s3_bucket                (str) : The s3 bucket where the documents will be downloaded.
+        - pipeline_name            (str) : The name of the pipeline.
+        - tesseract_config         (str) : The tesseract configuration, e.g. '--oem 3 --psm 4 -l por'.
+        - s3_prefix                (str) : The prefix of the documents in the s3 bucket, below the pipeline name.
+        - manifest_file            (str) : The CSV manifest of documents in the artifacts directory. It takes precedence over the prefix.
+        - download_workers         (int) : The number of concurrent downloads.
+        - workers                  (int) : The number of OCR worker processes. Zero uses one per CPU.
+        - document_cache_directory (str) : The directory where documents are cached across runs. Empty disables the cache.
+        - ocr_cache_directory      (str) : The directory where OCR results are cached across runs. Empty disables the cache.
+    """
+
+    import boto3
+    import concurrent.futures
+    import csv
+    import hashlib
+    import json
+    import multiprocessing
+    import os
+    import queue
+    import shutil
+    import threading
+    import time
+
+    artifacts_directory = os.path.join('/', 'pipeline', 'artifacts')
+    summary_file        = os.path.join(artifacts_directory, 'process_documents_summary.json')
+    os.makedirs(artifacts_directory, exist_ok = True)
+
+    # Each tesseract process runs single threaded, the parallelism comes from the workers.
+    os.environ['OMP_THREAD_LIMIT'] = '1'
+
+    def ocr_worker(tasks, results):
+
+        # Forked workers inherit this function, only the documents and results cross the queues.
+        for document, document_type in iter(tasks.get, None):
+
+            start  = time.perf_counter()
+            result = { 'document' : document, 'type' : document_type }
+
+            try:
+                if document_type == 'cnh':
+                    extract_document_info_cnh(document, tesseract_config, workers = 1, ocr_cache_directory = ocr_cache_directory)
+                else:
+                    extract_document_info_escritura(document, tesseract_config, workers = 1, ocr_cache_directory = ocr_cache_directory)
+
+                result['status'] = 'succeeded'
+            except Exception as error:
+                result['status'] = 'failed'
+                result['error']  = '{}: {}'.format(type(error).__name__, error)
+
+            result['ocr_seconds'] = time.perf_counter() - start
+            results.put(result)
+
+    start = time.perf_counter()
+
+    # The workers are forked before any download thread starts.
+    context = multiprocessing.get_context('fork')
+    tasks   = context.Queue()
+    results = context.Queue()
+    workers = workers or os.cpu_count()
+    pool    = [context.Process(target = ocr_worker, args = (tasks, results), daemon = True) for _ in range(workers)]
+
+    for process in pool:
+        process.start()
+
+    s3_client = boto3.client(
+        service_name          = s3_service_name,
+        endpoint_url          = s3_endpoint_url,
+        aws_access_key_id     = s3_access_key_id,
+        aws_secret_access_key = s3_secret_access_key,
+        region_name           = s3_region
+    )
+
+    if manifest_file:
+        with open(os.path.join(artifacts_directory, manifest_file), 'r', newline = '') as file:
+            documents = [(row['document'], row.get('type') or '') for row in csv.DictReader(file)]
+    else:
+        documents  = []
+        s3_listing = s3_client.get_paginator('list_objects_v2').paginate(Bucket = s3_bucket, Prefix = os.path.join(pipeline_name, s3_prefix))
+
+        for page in s3_listing:
+            for s3_object in page.get('Contents', []):
+                if not s3_object['Key'].endswith('/'):
+                    documents.append((os.path.relpath(s3_object['Key'], pipeline_name), ''))
+
+    documents = [
+        (document, document_type or ('cnh' if 'cnh' in os.path.basename(document).lower() else 'escritura'))
+        for document, document_type in documents
+    ]
+
+    def download(document):
+
+        download_start   = time.perf_counter()
+        s3_document_file = os.path.join(pipeline_name, document)
+        document_file    = os.path.join(artifacts_directory, document)
+
+        # Documents are kept at their s3 key, they must stay below the artifacts directory.
+        if os.path.isabs(document) or os.path.normpath(document).split(os.sep)[0] == '..':
+            raise ValueError('Document outside the pipeline prefix: {}'.format(document))
+
+        os.makedirs(os.path.dirname(document_file), exist_ok = True)
+
+        if not document_cache_directory:
+            s3_client.download_file(s3_bucket, s3_document_file, document_file)
+            return 'disabled', time.perf_counter() - download_start
+
+        # Same cache layout as download_document.
+        etag       = s3_client.head_object(Bucket = s3_bucket, Key = s3_document_file)['ETag'].strip('"')
+        cache_key  = hashlib.sha256('{}\0{}\0{}'.format(s3_bucket, s3_document_file, etag).encode('utf-8')).hexdigest()
+        cache_file = os.path.join(document_cache_directory, cache_key + os.path.splitext(document_file)[1])
+
+        os.makedirs(document_cache_directory, exist_ok = True)
+
+        if os.path.isfile(cache_file):
+            shutil.copyfile(cache_file, document_file)
+            return 'hits', time.perf_counter() - download_start
+
+        s3_client.download_file(s3_bucket, s3_document_file, document_file)
+
+        partial_file = '{}.{}.{}.partial'.format(cache_file, os.getpid(), threading.get_ident())
+
+        shutil.copyfile(document_file, partial_file)
+        os.replace(partial_file, cache_file)
+
+        return 'misses', time.perf_counter() - download_start
+
+    summary = {}
+    pending = 0
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = max(1, download_workers)) as executor:
+
+        futures = { executor.submit(download, document) : (document, document_type) for document, document_type in documents }
+
+        for future in concurrent.futures.as_completed(futures):
+
+            document, document_type = futures[future]
+
+            try:
+                document_cache, document_seconds = future.result()
+            except Exception as error:
+                summary[document] = {
+                    'document' : document,
+                    'type'     : document_type,
+                    'status'   : 'failed',
+                    'error'    : 'download {}: {}'.format(type(error).__name__, error)
+                }
+                continue
+
+            summary[document] = {
+                'document'         : document,
+                'type'             : document_type,
+                'status'           : 'pending',
+                'download_cache'   : document_cache,
+                'download_seconds' : document_seconds
+            }
+
+            tasks.put((document, document_type))
+            pending += 1
+
+    download_seconds = time.perf_counter() - start
+
+    for _ in pool:
+        tasks.put(None)
+
+    while pending:
+        try:
+            result = results.get(timeout = 1)
+        except queue.Empty:
+            if not any(process.is_alive() for process in pool):
+                break
+            continue
+
+        document = result.pop('document')
+        pending -= 1
+
+        summary[document].update(result)
+        print('{} ({}): {} in {:.1f}s'.format(document, result['type'], result['status'], result['ocr_seconds']))
+
+    for process in pool:
+        process.join()
+
+    # Documents a crashed worker never reported on are failures too.
+    for entry in summary.values():
+        if entry['status'] == 'pending':
+            entry['status'] = 'failed'
+            entry['error']  = 'OCR worker exited'
+
+    entries = [summary[document] for document, _ in documents if document in summary]
+    failed  = [entry for entry in entries if entry['status'] == 'failed']
+
+    timing = {
+        'documents'        : len(entries),
+        'succeeded'        : len(entries) - len(failed),
+        'failed'           : len(failed),
+        'download_workers' : download_workers,
+        'workers'          : workers,
+        'download_seconds' : download_seconds,
+        'total_seconds'    : time.perf_counter() - start
+    }
+
+    print('Timing: {}'.format(timing))
+
+    with open(summary_file, 'w') as doc:
+        json.dump(dict(timing, results = entries), doc, indent = 4)
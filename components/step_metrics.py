@@ -0,0 +1,187 @@
+def step_metrics(
+    step              : str,
+    metrics_directory : str = '/pipeline/metrics',
+    profiler          : str = ''
+):
+    """
+    Records the performance of a pipeline step, phase by phase, into a metrics.json file.
+
+    Used as a context manager around the Elyra entry point of a step, it yields a phase context manager. Each phase
+    records its wall and CPU time, the peak resident memory of the step and the bytes it read and wrote. The bytes
+    come from /proc/self/io: the storage bytes, and the bytes of every read and write call, sockets included, so
+    S3 transfers are counted too. Reaped subprocesses, e.g. pip, are included. The metrics are written to
+    <metrics_directory>/<step>/metrics.json when the step exits, also when it fails.
+
+    Parameters:
+        - step              (str) : The name of the pipeline step.
+        - metrics_directory (str) : The directory where the metrics of every step are written.
+        - profiler          (str) : Profiles the step with 'cprofile' or 'pyinstrument' into the metrics directory. Empty disables profiling.
+
+    Returns:
+        - step_metrics (contextmanager) : The context manager of the step, yielding the phase context manager.
+    """
+
+    import contextlib
+    import json
+    import os
+    import pstats
+    import resource
+    import time
+
+    step_directory = os.path.join(metrics_directory, step)
+
+    def io_counters():
+
+        counters = { 'rchar' : 0, 'wchar' : 0, 'read_bytes' : 0, 'write_bytes' : 0 }
+
+        # /proc/self/io is only available on linux, the bytes are reported as zero elsewhere.
+        if os.path.exists('/proc/self/io'):
+
+            with open('/proc/self/io', 'r') as file:
+
+                for line in file:
+
+                    name, _, value = line.partition(':')
+
+                    if name in counters:
+                        counters[name] = int(value)
+
+        return counters
+
+    def sample():
+
+        times = os.times()
+
+        return {
+            'wall'     : time.perf_counter(),
+            'cpu'      : times.user + times.system,
+            'children' : times.children_user + times.children_system,
+            'io'       : io_counters()
+        }
+
+    def peak_rss_bytes(who):
+
+        # ru_maxrss is reported in kilobytes on linux.
+        return resource.getrusage(who).ru_maxrss * 1024
+
+    def difference(start, end):
+
+        return {
+            'wall_seconds'         : end['wall'] - start['wall'],
+            'cpu_seconds'          : end['cpu'] - start['cpu'],
+            'children_cpu_seconds' : end['children'] - start['children'],
+            'read_bytes'           : end['io']['rchar'] - start['io']['rchar'],
+            'write_bytes'          : end['io']['wchar'] - start['io']['wchar'],
+            'storage_read_bytes'   : end['io']['read_bytes'] - start['io']['read_bytes'],
+            'storage_write_bytes'  : end['io']['write_bytes'] - start['io']['write_bytes'],
+            'peak_rss_bytes'       : peak_rss_bytes(resource.RUSAGE_SELF)
+        }
+
+    def start_profiler():
+
+        if profiler == 'pyinstrument':
+
+            try:
+
+                import pyinstrument
+
+                profile = pyinstrument.Profiler()
+                profile.start()
+
+                return profile
+
+            except ImportError:
+
+                print('pyinstrument is not installed, profiling with cprofile')
+
+        import cProfile
+
+        profile = cProfile.Profile()
+        profile.enable()
+
+        return profile
+
+    def stop_profiler(profile):
+
+        if profiler == 'pyinstrument' and not hasattr(profile, 'disable'):
+
+            profile.stop()
+
+            with open(os.path.join(step_directory, 'profile.html'), 'w', encoding = 'utf-8') as file:
+
+                file.write(profile.output_html())
+
+            return
+
+        profile.disable()
+        profile.dump_stats(os.path.join(step_directory, 'profile.prof'))
+
+        with open(os.path.join(step_directory, 'profile.txt'), 'w', encoding = 'utf-8') as file:
+
+            pstats.Stats(profile, stream = file).sort_stats('cumulative').print_stats(40)
+
+    @contextlib.contextmanager
+    def measure_step():
+
+        metrics = {
+            'step'    : step,
+            'pid'     : os.getpid(),
+            'started' : time.time(),
+            'status'  : 'succeeded',
+            'error'   : '',
+            'phases'  : []
+        }
+
+        step_start = sample()
+
+        @contextlib.contextmanager
+        def phase(name):
+
+            phase_start = sample()
+
+            try:
+
+                yield
+
+            finally:
+
+                metrics['phases'].append({
+                    'phase'           : name,
+                    'started_seconds' : phase_start['wall'] - step_start['wall'],
+                    **difference(phase_start, sample())
+                })
+
+        os.makedirs(step_directory, exist_ok = True)
+
+        profile = start_profiler() if profiler else None
+
+        try:
+
+            yield phase
+
+        except BaseException as error:
+
+            if not (isinstance(error, SystemExit) and error.code in (None, 0)):
+
+                metrics['status'] = 'failed'
+                metrics['error']  = f'{ type(error).__name__ }: { error }'
+
+            raise
+
+        finally:
+
+            if profile:
+                stop_profiler(profile)
+
+            metrics.update(difference(step_start, sample()))
+            metrics['children_peak_rss_bytes'] = peak_rss_bytes(resource.RUSAGE_CHILDREN)
+
+            with open(os.path.join(step_directory, 'metrics.json'), 'w', encoding = 'utf-8') as file:
+
+                json.dump(metrics, file, indent = 4)
+
+            print(f'{ step } : { metrics["wall_seconds"]:.1f}s wall, { metrics["cpu_seconds"]:.1f}s cpu, '
+                  f'{ metrics["peak_rss_bytes"] / 2**20:.0f} MiB peak rss, '
+                  f'{ metrics["read_bytes"] / 2**20:.1f} MiB read, { metrics["write_bytes"] / 2**20:.1f} MiB written')
+
+    return measure_step()
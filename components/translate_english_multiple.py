@@ -0,0 +1,195 @@
+# Shared with the other model steps, kfp_component ships it with the KFP components.
+from hf_models import hf_models
+
+
+def translate_english_multiple(
+    languages             : str  = 'spanish,portuguese',
+    batch_size            : int  = 16,
+    num_threads           : int  = 0,
+    model_cache_directory : str  = '/pipeline/cache/huggingface',
+    backend               : str  = 'pytorch',
+    quantize              : bool = False,
+    compare_reference     : bool = False
+):
+    """
+    Translates the summary of the video to multiple languages, loading all models once in a single step.
+
+    The summary is split into sentences, which are sorted by length and translated in padded batches so each batch
+    carries little padding. The throughput per language is reported in video_summary_translation_metrics.json.
+
+    The models run on the selected backend, converted once and cached in the model cache directory. The latency and
+    the similarity of the output against the eager PyTorch models are added to the report when compare_reference is set.
+
+    Parameters:
+        - languages             (str)  : Comma separated target languages. Each one should be 'spanish' or 'portuguese'.
+        - batch_size            (int)  : The number of sentences translated per batch.
+        - num_threads           (int)  : The number of CPU threads used by torch. Zero keeps the torch default.
+        - model_cache_directory (str)  : The directory where the Hugging Face models are cached across runs.
+        - backend               (str)  : The inference backend. It should be 'pytorch', 'openvino' or 'onnxruntime'.
+        - quantize              (bool) : Whether to apply dynamic INT8 quantization to the models.
+        - compare_reference     (bool) : Whether to compare the output and latency against the eager PyTorch models.
+    """
+
+    import json
+    import os
+    import re
+    import time
+
+    import torch
+
+    models = {
+        'spanish'    : 'Helsinki-NLP/opus-mt-en-es',
+        'portuguese' : 'unicamp-dl/translation-en-pt-t5'
+    }
+
+    languages = [language.strip().lower() for language in languages.split(',') if language.strip()]
+
+    for language in languages:
+
+        if language not in models:
+
+            raise ValueError(f'Unsupported language: { language }')
+
+    # Sets up the Hugging Face cache, and the offline mode for prefetched models, before transformers is imported.
+    models_helper = hf_models('translate_english_multiple', [models[language] for language in languages], model_cache_directory, backend, quantize)
+
+    from transformers import AutoModelForSeq2SeqLM, AutoTokenizer
+
+    artifacts_directory                    = os.path.join('/', 'pipeline', 'artifacts')
+    video_summary_file                     = os.path.join(artifacts_directory, 'video_summary.txt')
+    video_summary_translation_metrics_file = os.path.join(artifacts_directory, 'video_summary_translation_metrics.json')
+
+    with open(video_summary_file, 'r') as file:
+
+        summary = file.read()
+
+    if num_threads > 0:
+
+        torch.set_num_threads(num_threads)
+
+    sentences = [sentence for sentence in re.split(r'(?<=[.!?])\s+', summary.strip()) if sentence]
+
+    def translate(tokenizer, model, inputs):
+
+        lengths      = [len(tokenizer.encode(text)) for text in inputs]
+        order        = sorted(range(len(inputs)), key = lambda index: lengths[index])
+        translations = [''] * len(inputs)
+
+        translate_start = time.perf_counter()
+
+        for batch_start in range(0, len(order), batch_size):
+
+            batch   = order[batch_start:batch_start + batch_size]
+            encoded = tokenizer([inputs[index] for index in batch], padding = True, truncation = True, return_tensors = 'pt')
+
+            with torch.inference_mode():
+
+                generated = model.generate(**encoded)
+
+            for index, translation in zip(batch, tokenizer.batch_decode(generated, skip_special_tokens = True)):
+
+                translations[index] = translation
+
+        return translations, sum(lengths), time.perf_counter() - translate_start
+
+    loaded = {}
+
+    for language in languages:
+
+        load_start = time.perf_counter()
+
+        tokenizer         = AutoTokenizer.from_pretrained(models[language])
+        model, conversion = models_helper.load_model(models[language], 'Seq2SeqLM')
+
+        loaded[language] = (tokenizer, model, conversion, time.perf_counter() - load_start)
+
+        models_helper.record_load(models[language], conversion, loaded[language][3])
+
+    metrics = {}
+
+    for language, (tokenizer, model, conversion, load_seconds) in loaded.items():
+
+        # Same prefix the translation pipeline prepends, e.g. for T5 models.
+        prefix = model.config.prefix or ''
+        inputs = [prefix + sentence for sentence in sentences]
+
+        translations, input_tokens, translate_seconds = translate(tokenizer, model, inputs)
+
+        with open(os.path.join(artifacts_directory, f'video_summary_{ language }.txt'), 'w') as file:
+
+            file.write(' '.join(translations))
+
+        metrics[language] = {
+            **models_helper.backend_report(models[language], conversion, load_seconds, translate_seconds = translate_seconds),
+            'sentences'            : len(inputs),
+            'input_tokens'         : input_tokens,
+            'sentences_per_second' : len(inputs) / translate_seconds if translate_seconds else 0.0,
+            'tokens_per_second'    : input_tokens / translate_seconds if translate_seconds else 0.0
+        }
+
+        print(f'{ language } : { len(inputs) } sentences in { translate_seconds:.2f}s ({ metrics[language]["tokens_per_second"]:.1f} tokens/s)')
+
+        if compare_reference:
+
+            reference_model = AutoModelForSeq2SeqLM.from_pretrained(models[language])
+            reference_model.eval()
+
+            reference_translations, _, reference_seconds = translate(tokenizer, reference_model, inputs)
+
+            metrics[language]['reference'] = models_helper.compare_reference(
+                ' '.join(reference_translations), reference_seconds, ' '.join(translations), translate_seconds
+            )
+
+            print(f'{ language } reference : { metrics[language]["reference"]["speedup"]:.2f}x speedup, { metrics[language]["reference"]["similarity"]:.3f} similarity')
+
+    with open(video_summary_translation_metrics_file, 'w', encoding = 'utf-8') as file:
+
+        json.dump(metrics, file, ensure_ascii = False, indent = 4)
+
+
+if __name__ == '__main__':
+    """
+    Elyra Pipelines
+    """
+
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'translate_english_multiple',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            requirements = ['torch==2.1.2', 'sentencepiece==0.1.99', 'transformers==4.37.1']
+
+            if os.getenv('backend') == 'openvino':
+
+                requirements.append('optimum-intel[openvino]==1.15.2')
+
+            if os.getenv('backend') == 'onnxruntime':
+
+                requirements.append('optimum[onnxruntime]==1.16.2')
+
+            install_requirements(
+                requirements         = requirements,
+                step                 = 'translate_english_multiple',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
+
+        with phase('translate_english_multiple'):
+
+            translate_english_multiple(
+                languages             = os.getenv('languages', 'spanish,portuguese'),
+                batch_size            = int(os.getenv('batch_size', '16')),
+                num_threads           = int(os.getenv('num_threads', '0')),
+                model_cache_directory = os.getenv('model_cache_directory', '/pipeline/cache/huggingface'),
+                backend               = os.getenv('backend', 'pytorch'),
+                quantize              = os.getenv('quantize', 'false').lower() == 'true',
+                compare_reference     = os.getenv('compare_reference', 'false').lower() == 'true'
+            )
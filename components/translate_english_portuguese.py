@@ -1,9 +1,23 @@
-def translate_english_portuguese():
+# Shared with the other model steps, kfp_component ships it with the KFP components.
+from hf_models import hf_models
+
+
+def translate_english_portuguese(model_cache_directory : str = '/pipeline/cache/huggingface'):
     """
     Translates the summary of the video to portuguese.
+
+    Parameters:
+        - model_cache_directory (str) : The directory where the Hugging Face models are cached across runs.
     """
 
     import os
+    import time
+
+    model_name = 'unicamp-dl/translation-en-pt-t5'
+
+    # Sets up the Hugging Face cache, and the offline mode for prefetched models, before transformers is imported.
+    models_helper = hf_models('translate_english_portuguese', [model_name], model_cache_directory)
+
     from transformers import pipeline
 
     artifacts_directory           = os.path.join('/', 'pipeline', 'artifacts')
@@ -14,7 +28,14 @@ def translate_english_portuguese():
 
         speeches = file.read()
 
-    pipe        = pipeline(task = 'translation', model = 'unicamp-dl/translation-en-pt-t5')
+    model_load_start   = time.perf_counter()
+    pipe               = pipeline(task = 'translation', model = model_name)
+    model_load_seconds = time.perf_counter() - model_load_start
+
+    models_helper.record_load(model_name, 'eager', model_load_seconds)
+
+    print(f'model load : { model_name } ({ model_load_seconds:.1f}s)')
+
     translation = pipe(speeches)
 
     with open(video_summary_portuguese_file, 'w') as file:
@@ -27,10 +48,28 @@ if __name__ == '__main__':
     Elyra Pipelines
     """
 
-    import subprocess
-    import sys
+    import os
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'translate_english_portuguese',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['torch==2.1.2', 'transformers==4.37.1'],
+                step                 = 'translate_english_portuguese',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
 
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'torch==2.1.2'])
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'transformers==4.37.1'])
+        with phase('translate_english_portuguese'):
 
-    translate_english_portuguese()
\ No newline at end of file
+            translate_english_portuguese(
+                model_cache_directory = os.getenv('model_cache_directory', '/pipeline/cache/huggingface')
+            )
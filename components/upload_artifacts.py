@@ -46,17 +46,33 @@ if __name__ == '__main__':
     """
 
     import os
-    import subprocess
-    import sys
-
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'boto3==1.34.28'])
-
-    upload_artifacts(
-        s3_service_name      = os.getenv('s3_service_name'),
-        s3_endpoint_url      = os.getenv('s3_endpoint_url'),
-        s3_access_key_id     = os.getenv('s3_access_key_id'),
-        s3_secret_access_key = os.getenv('s3_secret_access_key'),
-        s3_region            = os.getenv('s3_region'),
-        s3_bucket            = os.getenv('s3_bucket'),
-        pipeline_name        = os.getenv('pipeline_name')
-    )
\ No newline at end of file
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'upload_artifacts',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['boto3==1.34.28'],
+                step                 = 'upload_artifacts',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
+
+        with phase('upload_artifacts'):
+
+            upload_artifacts(
+                s3_service_name      = os.getenv('s3_service_name'),
+                s3_endpoint_url      = os.getenv('s3_endpoint_url'),
+                s3_access_key_id     = os.getenv('s3_access_key_id'),
+                s3_secret_access_key = os.getenv('s3_secret_access_key'),
+                s3_region            = os.getenv('s3_region'),
+                s3_bucket            = os.getenv('s3_bucket'),
+                pipeline_name        = os.getenv('pipeline_name')
+            )
\ No newline at end of file
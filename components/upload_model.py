@@ -5,7 +5,8 @@ def upload_model(
     s3_secret_access_key : str,
     s3_region            : str,
     s3_bucket            : str,
-    pipeline_name        : str
+    pipeline_name        : str,
+    artifacts_directory  : str = '/pipeline/artifacts'
 ):
     """
     Uploads the model for deployment in the OpenVINO format to the s3 bucket.
@@ -18,13 +19,14 @@ def upload_model(
         - s3_region            (str) : The region where the s3 bucket is located.
         - s3_bucket            (str) : The s3 bucket where the model will be uploaded.
         - pipeline_name        (str) : The name of the pipeline.
+        - artifacts_directory  (str) : The directory where the pipeline artifacts are stored.
     """
 
     import boto3
     import openvino as ov
     import os
 
-    model_directory    = os.path.join('/', 'pipeline', 'artifacts', 'model', 'cats_and_dogs')
+    model_directory    = os.path.join(artifacts_directory, 'model', 'cats_and_dogs')
     s3_model_directory = os.path.join(pipeline_name, 'models', 'cats_and_dogs')
 
     ov_model_directory = os.path.join('/', 'tmp', 'model')
@@ -57,18 +59,34 @@ if __name__ == '__main__':
     """
 
     import os
-    import subprocess
-    import sys
-
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'boto3==1.34.28'])
-    subprocess.check_call([sys.executable, '-m', 'pip', 'install', 'openvino==2023.3.0'])
-
-    upload_model(
-        s3_service_name      = os.getenv('s3_service_name'),
-        s3_endpoint_url      = os.getenv('s3_endpoint_url'),
-        s3_access_key_id     = os.getenv('s3_access_key_id'),
-        s3_secret_access_key = os.getenv('s3_secret_access_key'),
-        s3_region            = os.getenv('s3_region'),
-        s3_bucket            = os.getenv('s3_bucket'),
-        pipeline_name        = os.getenv('pipeline_name')
-    )
\ No newline at end of file
+
+    from install_requirements import install_requirements
+    from step_metrics         import step_metrics
+
+    with step_metrics(
+        step              = 'upload_model',
+        metrics_directory = os.getenv('metrics_directory', '/pipeline/metrics'),
+        profiler          = os.getenv('profiler', '')
+    ) as phase:
+
+        with phase('install_requirements'):
+
+            install_requirements(
+                requirements         = ['boto3==1.34.28', 'openvino==2023.3.0'],
+                step                 = 'upload_model',
+                wheelhouse_directory = os.getenv('wheelhouse_directory', '/pipeline/cache/wheelhouse'),
+                metrics_file         = os.getenv('startup_metrics_file', '/pipeline/artifacts/startup_metrics.jsonl')
+            )
+
+        with phase('upload_model'):
+
+            upload_model(
+                s3_service_name      = os.getenv('s3_service_name'),
+                s3_endpoint_url      = os.getenv('s3_endpoint_url'),
+                s3_access_key_id     = os.getenv('s3_access_key_id'),
+                s3_secret_access_key = os.getenv('s3_secret_access_key'),
+                s3_region            = os.getenv('s3_region'),
+                s3_bucket            = os.getenv('s3_bucket'),
+                pipeline_name        = os.getenv('pipeline_name'),
+                artifacts_directory  = os.getenv('artifacts_directory', '/pipeline/artifacts')
+            )
\ No newline at end of file
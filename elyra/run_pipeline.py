@@ -0,0 +1,321 @@
+# The scripts run by this worker process, a worker that already ran a node has its imports warm.
+worker_scripts = []
+
+
+def run_node(script_file : str, environment : dict, working_directory : str, log_file : str) -> dict:
+    """
+    Runs the Elyra entry point of a pipeline node inside the current worker process.
+
+    The worker keeps the modules imported by previous nodes, so nodes sharing a worker skip their imports. The
+    environment of the node is set for the duration of the run and its output is written to the log file.
+
+    Parameters:
+        - script_file       (str)  : The python script of the node.
+        - environment       (dict) : The environment variables of the node, including the pipeline parameters.
+        - working_directory (str)  : The directory where the node runs and exchanges files with other nodes.
+        - log_file          (str)  : The file where the output of the node is written.
+
+    Returns:
+        - result (dict) : The status, error, timing and worker of the node.
+    """
+
+    import os
+    import runpy
+    import sys
+    import time
+    import traceback
+
+    previous_environment = os.environ.copy()
+    previous_directory   = os.getcwd()
+    previous_argv        = sys.argv
+    script_directory     = os.path.dirname(script_file)
+
+    result = {
+        'worker' : os.getpid(),
+        'warm'   : bool(worker_scripts),
+        'status' : 'succeeded',
+        'error'  : ''
+    }
+
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    saved_stdout = os.dup(1)
+    saved_stderr = os.dup(2)
+
+    start = time.perf_counter()
+
+    # The output of subprocesses started by the node, e.g. pip, goes to the log file too.
+    with open(log_file, 'w') as log:
+
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+
+        try:
+
+            os.environ.update(environment)
+            os.chdir(working_directory)
+
+            sys.argv = [script_file]
+            sys.path.insert(0, script_directory)
+
+            runpy.run_path(script_file, run_name = '__main__')
+
+        except SystemExit as error:
+
+            if error.code not in (None, 0):
+
+                result['status'] = 'failed'
+                result['error']  = f'exit code { error.code }'
+
+        except BaseException as error:
+
+            traceback.print_exc()
+
+            result['status'] = 'failed'
+            result['error']  = f'{ type(error).__name__ }: { error }'
+
+        finally:
+
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+            os.dup2(saved_stdout, 1)
+            os.dup2(saved_stderr, 2)
+            os.close(saved_stdout)
+            os.close(saved_stderr)
+
+            sys.path.remove(script_directory)
+            sys.argv = previous_argv
+
+            os.chdir(previous_directory)
+            os.environ.clear()
+            os.environ.update(previous_environment)
+
+    result['seconds'] = time.perf_counter() - start
+
+    worker_scripts.append(script_file)
+
+    return result
+
+
+def run_pipeline(
+    pipeline_file     : str,
+    parameters        : dict = None,
+    working_directory : str  = '',
+    workers           : int  = 0,
+    report_file       : str  = ''
+) -> dict:
+    """
+    Runs an Elyra pipeline locally, running independent nodes concurrently in a process pool.
+
+    The nodes run in the order of their links, each one as soon as the nodes it depends on succeeded. Nodes with the
+    same dependencies share a pool of warm worker processes, so the imports of a node are paid once per worker. All
+    nodes run in the same working directory, where they exchange their json outputs as in the cluster. The nodes
+    depending on a failed node are skipped.
+
+    Parameters:
+        - pipeline_file     (str)  : The Elyra .pipeline file.
+        - parameters        (dict) : The pipeline parameters overriding their default values.
+        - working_directory (str)  : The directory where the nodes run. A temporary directory is used when empty.
+        - workers           (int)  : The number of worker processes per dependency set. Zero uses one per CPU.
+        - report_file       (str)  : The file where the run report is written as json. Empty skips the report.
+
+    Returns:
+        - report (dict) : The status, timing and worker of each node, the timeline of the step metrics and the total time of the run.
+    """
+
+    import concurrent.futures
+    import json
+    import multiprocessing
+    import os
+    import sys
+    import tempfile
+    import time
+
+    with open(pipeline_file, 'r', encoding = 'utf-8') as file:
+
+        pipeline = json.load(file)['pipelines'][0]
+
+    properties          = pipeline['app_data']['properties']
+    pipeline_directory  = os.path.dirname(os.path.abspath(pipeline_file))
+    working_directory   = os.path.abspath(working_directory or tempfile.mkdtemp(prefix = f'{ properties["name"] }_'))
+    logs_directory      = os.path.join(working_directory, 'logs')
+    metrics_directory   = os.path.join(working_directory, 'metrics')
+    pipeline_parameters = { parameter['name'] : parameter['default_value']['value'] for parameter in properties.get('pipeline_parameters', []) }
+
+    pipeline_parameters.update(parameters or {})
+
+    os.makedirs(logs_directory, exist_ok = True)
+
+    def environment_variables(env_vars):
+
+        # Elyra stores environment variables either as 'NAME=value' strings or as objects.
+        for env_var in env_vars:
+
+            if isinstance(env_var, str):
+
+                name, _, value = env_var.partition('=')
+
+                yield name, value
+
+            else:
+
+                yield env_var['env_var'], env_var.get('value', '')
+
+    default_environment = dict(environment_variables(properties.get('pipeline_defaults', {}).get('env_vars', [])))
+
+    nodes = {}
+
+    for node in pipeline['nodes']:
+
+        if node['type'] != 'execution_node':
+            continue
+
+        component_parameters = node['app_data']['component_parameters']
+        script_file          = os.path.normpath(os.path.join(pipeline_directory, component_parameters['filename']))
+        environment          = dict(default_environment)
+
+        environment.update(environment_variables(component_parameters.get('env_vars', [])))
+        environment.update({ name : str(pipeline_parameters[name]) for name in component_parameters.get('pipeline_parameters', []) })
+
+        # The step metrics of the run are kept with its working directory, not on the PVC.
+        environment['metrics_directory'] = metrics_directory
+
+        nodes[node['id']] = {
+            'name'         : os.path.splitext(os.path.basename(script_file))[0],
+            'script_file'  : script_file,
+            'environment'  : environment,
+            'dependencies' : tuple(sorted(component_parameters.get('dependencies', []))),
+            'parents'      : { link['node_id_ref'] for port in node.get('inputs', []) for link in port.get('links', []) }
+        }
+
+    # Fork keeps the interpreter state of the runner, the workers then stay warm across the nodes they run.
+    context = multiprocessing.get_context('fork')
+    pools   = {
+        dependencies : concurrent.futures.ProcessPoolExecutor(max_workers = workers or os.cpu_count(), mp_context = context)
+        for dependencies in { node['dependencies'] for node in nodes.values() }
+    }
+
+    results = {}
+    running = {}
+    started = {}
+    start   = time.perf_counter()
+
+    def schedule():
+
+        for node_id, node in nodes.items():
+
+            if node_id in results or node_id in started:
+                continue
+
+            if any(results.get(parent, {}).get('status') in ('failed', 'skipped') for parent in node['parents']):
+
+                results[node_id] = { 'status' : 'skipped', 'error' : 'a parent node did not succeed', 'seconds' : 0.0 }
+
+                print(f'{ node["name"] } : skipped')
+
+                # Nodes depending on this one may be skipped in the same pass.
+                return True
+
+            if not all(results.get(parent, {}).get('status') == 'succeeded' for parent in node['parents']):
+                continue
+
+            future = pools[node['dependencies']].submit(
+                run_node,
+                node['script_file'],
+                node['environment'],
+                working_directory,
+                os.path.join(logs_directory, f'{ node["name"] }.log')
+            )
+
+            running[future]  = node_id
+            started[node_id] = time.perf_counter() - start
+
+        return False
+
+    try:
+
+        while len(results) < len(nodes):
+
+            while schedule():
+                pass
+
+            if not running:
+                break
+
+            done, _ = concurrent.futures.wait(running, return_when = concurrent.futures.FIRST_COMPLETED)
+
+            for future in done:
+
+                node_id = running.pop(future)
+
+                try:
+
+                    results[node_id] = future.result()
+
+                except Exception as error:
+
+                    results[node_id] = { 'status' : 'failed', 'error' : f'{ type(error).__name__ }: { error }', 'seconds' : 0.0 }
+
+                results[node_id]['started_seconds'] = started[node_id]
+
+                print(f'{ nodes[node_id]["name"] } : { results[node_id]["status"] } in { results[node_id]["seconds"]:.2f}s'
+                      f'{ " (warm worker)" if results[node_id].get("warm") else "" }'
+                      f'{ " - " + results[node_id]["error"] if results[node_id]["error"] else "" }')
+
+    finally:
+
+        for pool in pools.values():
+
+            pool.shutdown(cancel_futures = True)
+
+    report = {
+        'pipeline'          : properties['name'],
+        'working_directory' : working_directory,
+        'total_seconds'     : time.perf_counter() - start,
+        'nodes'             : { nodes[node_id]['name'] : result for node_id, result in results.items() }
+    }
+
+    if os.path.isdir(metrics_directory):
+
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'components'))
+
+        from aggregate_metrics import aggregate_metrics
+
+        report['timeline'] = aggregate_metrics(metrics_directory = metrics_directory)
+
+    print(f'{ properties["name"] } : { sum(result["status"] == "succeeded" for result in results.values()) }/{ len(nodes) } nodes succeeded in { report["total_seconds"]:.2f}s')
+    print(f'working directory : { working_directory }')
+
+    if report_file:
+
+        with open(report_file, 'w', encoding = 'utf-8') as file:
+
+            json.dump(report, file, ensure_ascii = False, indent = 4)
+
+    return report
+
+
+if __name__ == '__main__':
+
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description = 'Run an Elyra pipeline locally with independent nodes in parallel')
+    parser.add_argument('pipeline_file',                                     help = 'The Elyra .pipeline file')
+    parser.add_argument('--parameter',         default = [], action = 'append', help = 'Pipeline parameter as name=value, repeatable')
+    parser.add_argument('--working_directory', default = '',                 help = 'Directory where the nodes run, a temporary directory when empty')
+    parser.add_argument('--workers',           default = 0, type = int,      help = 'Worker processes per dependency set, one per CPU when zero')
+    parser.add_argument('--report_file',       default = '',                 help = 'Output file for the run report')
+    args = parser.parse_args()
+
+    report = run_pipeline(
+        pipeline_file     = args.pipeline_file,
+        parameters        = dict(parameter.split('=', 1) for parameter in args.parameter),
+        working_directory = args.working_directory,
+        workers           = args.workers,
+        report_file       = args.report_file
+    )
+
+    sys.exit(0 if all(node['status'] == 'succeeded' for node in report['nodes'].values()) else 1)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Offline scaling benchmark of the NYSE pipeline stages on synthetic data.
+
+Synthetic OHLCV CSVs, laid out like a data_download batch, are generated for
+each symbol count and history length. Each stage then runs against them
+(feature_engineering, train_arima, train_lstm, select_best) with the symbols
+split into `workers` shards run as concurrent processes, as the pipeline does
+with shard_size. Every process runs through pipeline/step_metrics.py, so CPU
+time and peak RSS come from the same metrics as the pipeline steps.
+
+Results are written to a JSON baseline; pass --baseline to compare a run with
+an earlier one and exit 1 when throughput or memory regressed.
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEP_METRICS = os.path.join(ROOT, "pipeline", "step_metrics.py")
+STAGES = {
+    "feature_engineering": "components/feature_engineering/feature_engineering.py",
+    "train_arima": "components/training_arima/train_arima.py",
+    "train_lstm": "components/training_lstm/train_lstm.py",
+    "select_best": "components/model_selection/select_best.py",
+}
+
+
+def generate_symbols(out_dir: str, symbols: int, days: int, seed: int = 0) -> list:
+    """Write one geometric random walk OHLCV CSV per synthetic symbol."""
+    os.makedirs(out_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2000-01-03", periods=days)
+    start, end = dates[0].strftime("%Y-%m-%d"), dates[-1].strftime("%Y-%m-%d")
+    paths = []
+    for i in range(symbols):
+        close = 20.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, days))) * rng.uniform(1, 10)
+        spread = np.abs(rng.normal(0, 0.01, (2, days))) * close
+        open_ = close * (1 + rng.normal(0, 0.005, days))
+        df = pd.DataFrame({
+            "Date": dates.strftime("%Y-%m-%d"),
+            "Open": open_,
+            "High": np.maximum(open_, close) + spread[0],
+            "Low": np.minimum(open_, close) - spread[1],
+            "Close": close,
+            "Adj Close": close,
+            "Volume": rng.integers(1e5, 1e7, days),
+        })
+        path = os.path.join(out_dir, f"S{i:05d}_{start}_{end}.csv")
+        df.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+def shard(paths: list, workers: int) -> list:
+    """Split files round-robin into `workers` non-empty shards."""
+    return [s for s in (paths[i::workers] for i in range(workers)) if s]
+
+
+def link_all(paths: list, out_dir: str) -> str:
+    os.makedirs(out_dir, exist_ok=True)
+    for p in paths:
+        os.symlink(p, os.path.join(out_dir, os.path.basename(p)))
+    return out_dir
+
+
+def run_stage(stage: str, commands: list, metrics_dir: str) -> dict:
+    """Run the commands of one stage concurrently and collect their metrics."""
+    start = time.perf_counter()
+    procs = [
+        subprocess.Popen(
+            [sys.executable, STEP_METRICS, "run", "--step", stage, "--shard", f"shard-{i}",
+             "--metrics_dir", metrics_dir, os.path.join(ROOT, STAGES[stage])] + args,
+            stdout=subprocess.DEVNULL,
+        )
+        for i, args in enumerate(commands)
+    ]
+    codes = [p.wait() for p in procs]
+    wall = time.perf_counter() - start
+
+    shards = []
+    for path in glob.glob(os.path.join(metrics_dir, stage, "shard-*", "metrics.json")):
+        with open(path, "r") as f:
+            shards.append(json.load(f))
+    return {
+        "wall_seconds": wall,
+        "cpu_seconds": sum(m["cpu_seconds"] + m["children_cpu_seconds"] for m in shards),
+        "peak_rss_bytes": max((m["peak_rss_bytes"] for m in shards), default=0),
+        "total_rss_bytes": sum(m["peak_rss_bytes"] for m in shards),
+        "read_bytes": sum(m["read_bytes"] for m in shards),
+        "write_bytes": sum(m["write_bytes"] for m in shards),
+        "exit_codes": codes,
+    }
+
+
+def benchmark(symbols: int, days: int, workers: int, stages: list, epochs: int, work_dir: str, seed: int,
+              tensor_store: bool = False) -> list:
+    case_dir = os.path.join(work_dir, f"{symbols}x{days}")
+    source_dir = os.path.join(case_dir, "source")
+    if not os.path.isdir(source_dir):
+        t = time.perf_counter()
+        generate_symbols(source_dir, symbols, days, seed)
+        print(f"Generated {symbols} symbols x {days} days in {time.perf_counter() - t:.1f}s")
+    sources = sorted(glob.glob(os.path.join(source_dir, "*.csv")))
+
+    run_dir = os.path.join(case_dir, f"workers_{workers}")
+    shutil.rmtree(run_dir, ignore_errors=True)
+    shards = shard(sources, workers)
+    # Same layout as the pipeline: <data>/<shard>/download_*/ and <features>/<shard>/
+    data_dirs = [link_all(s, os.path.join(run_dir, "data", f"shard-{i}", "download_synthetic")) for i, s in enumerate(shards)]
+    feature_dirs = [os.path.join(run_dir, "features", f"shard-{i}") for i in range(len(shards))]
+    models_dir = os.path.join(run_dir, "models")
+    metrics_dir = os.path.join(run_dir, "metrics")
+
+    if "feature_engineering" not in stages:
+        # Later stages accept the raw CSVs, which hold the Adj Close column they train on
+        feature_dirs = [link_all(s, os.path.join(run_dir, "raw", f"shard-{i}")) for i, s in enumerate(shards)]
+
+    commands = {
+        "feature_engineering": [["--input_root", os.path.dirname(d), "--output", f] + (["--tensor_store"] if tensor_store else [])
+                                for d, f in zip(data_dirs, feature_dirs)],
+        "train_arima": [["--features_dir", f, "--out", models_dir] for f in feature_dirs],
+        "train_lstm": [["--features_dir", f, "--out", models_dir, "--epochs", str(epochs)] for f in feature_dirs],
+        "select_best": [["--metrics_dir", models_dir, "--out", os.path.join(run_dir, "best.json")]],
+    }
+
+    results = []
+    for stage in [s for s in STAGES if s in stages]:
+        r = run_stage(stage, commands[stage], metrics_dir)
+        r.update({
+            "stage": stage,
+            "symbols": symbols,
+            "days": days,
+            "workers": workers,
+            "processes": len(commands[stage]),
+            "symbols_per_second": symbols / r["wall_seconds"],
+            "rows_per_second": symbols * days / r["wall_seconds"],
+        })
+        results.append(r)
+        status = "ok" if not any(r["exit_codes"]) else f"FAILED {r['exit_codes']}"
+        print(f"{stage:<20} {symbols:>6} sym {days:>6} d {r['processes']:>3} w  {r['wall_seconds']:>8.2f}s "
+              f"{r['symbols_per_second']:>9.1f} sym/s {r['peak_rss_bytes'] / 2**20:>7.0f} MiB  {status}")
+    return results
+
+
+def compare(results: list, baseline_path: str, tolerance: float) -> list:
+    """Regressions against the baseline: lower throughput or higher peak RSS beyond the tolerance."""
+    with open(baseline_path, "r") as f:
+        baseline = {(r["stage"], r["symbols"], r["days"], r["workers"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        b = baseline.get((r["stage"], r["symbols"], r["days"], r["workers"]))
+        if b is None:
+            continue
+        key = f"{r['stage']} {r['symbols']} sym {r['days']} d {r['workers']} w"
+        if r["symbols_per_second"] < b["symbols_per_second"] * (1 - tolerance):
+            regressions.append(f"{key}: {r['symbols_per_second']:.1f} sym/s vs {b['symbols_per_second']:.1f} baseline")
+        if r["peak_rss_bytes"] > b["peak_rss_bytes"] * (1 + tolerance):
+            regressions.append(f"{key}: {r['peak_rss_bytes'] / 2**20:.0f} MiB vs {b['peak_rss_bytes'] / 2**20:.0f} MiB baseline")
+    return regressions
+
+
+def int_list(value: str) -> list:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NYSE pipeline stages on synthetic OHLCV data")
+    parser.add_argument("--symbols", type=int_list, default=[10, 100], help="Comma-separated symbol counts, e.g. 10,100,1000,5000")
+    parser.add_argument("--days", type=int_list, default=[1260], help="Comma-separated history lengths in business days")
+    parser.add_argument("--workers", type=int_list, default=[1], help="Comma-separated concurrent shard counts, e.g. 1,4")
+    parser.add_argument("--stages", default="feature_engineering,train_arima,select_best",
+                        help=f"Comma-separated stages among {','.join(STAGES)}")
+    parser.add_argument("--epochs", type=int, default=1, help="LSTM epochs per symbol")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--tensor_store", action="store_true",
+                        help="feature_engineering also writes the memory-mapped feature store, which the trainers then read")
+    parser.add_argument("--work_dir", default="", help="Folder for the synthetic data and outputs; a temp folder when empty")
+    parser.add_argument("--out", default="benchmark_stages.json", help="Output JSON with the results")
+    parser.add_argument("--baseline", default="", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression against the baseline")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        raise SystemExit(f"Unknown stages: {','.join(sorted(unknown))}")
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="nyse_benchmark_")
+    results = []
+    try:
+        for symbols in args.symbols:
+            for days in args.days:
+                for workers in args.workers:
+                    results += benchmark(symbols, days, workers, stages, args.epochs, work_dir, args.seed, args.tensor_store)
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline", "work_dir")},
+        "environment": {"python": platform.python_version(), "platform": platform.platform(), "cpu_count": os.cpu_count()},
+        "timestamp": time.time(),
+        "results": results,
+    }
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to: {args.out}")
+
+    failed = [r for r in results if any(r["exit_codes"])]
+    regressions = compare(results, args.baseline, args.tolerance) if args.baseline else []
+    for line in regressions:
+        print(f"Regression: {line}")
+    sys.exit(1 if failed or regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,12 @@
 import argparse
 import os
 import glob
+import shutil
 import pandas as pd
 import numpy as np
 
+from feature_store import STORE_SUBDIR, StoreWriter
+
 
 def compute_features(df: pd.DataFrame, windows=(5, 10, 20)) -> pd.DataFrame:
     df = df.copy()
@@ -32,19 +35,25 @@ def main():
     parser = argparse.ArgumentParser(description="Generate technical features from downloaded CSVs")
     parser.add_argument("--input_root", required=True, help="Root folder containing download_* folders")
     parser.add_argument("--output", required=True, help="Output folder under PVC, e.g. /mnt/pvc/nyse-features")
+    parser.add_argument("--tensor_store", action="store_true",
+                        help="Also write the features as a memory-mapped float32 store (feature_store.py), read zero-copy by the trainers")
     args = parser.parse_args()
 
     os.makedirs(args.output, exist_ok=True)
 
-    # Find latest download batch
+    # Find latest download batch (by mtime, so a batch reused by the step cache counts as latest)
     candidates = sorted(glob.glob(os.path.join(args.input_root, "download_*")))
     if not candidates:
         raise SystemExit("No download_* folder found under input_root")
-    latest = candidates[-1]
+    latest = max(candidates, key=os.path.getmtime)
     csvs = sorted(glob.glob(os.path.join(latest, "*.csv")))
     if not csvs:
         raise SystemExit("No CSVs found in latest download folder")
 
+    store = StoreWriter(args.output) if args.tensor_store else None
+    if not store:
+        # A store left by an earlier run would shadow the new CSVs in load_symbols()
+        shutil.rmtree(os.path.join(args.output, STORE_SUBDIR), ignore_errors=True)
     outputs = []
     for csv_path in csvs:
         sym = os.path.basename(csv_path).split("_")[0]
@@ -54,8 +63,12 @@ def main():
         feat.to_csv(out_csv, index=False)
         outputs.append(out_csv)
         print(f"Saved features: {out_csv}")
+        if store:
+            store.append(sym, feat)
 
     print(f"Generated {len(outputs)} feature files to {args.output}")
+    if store:
+        print(f"Saved feature store: {store.close()} ({store.rows} rows x {len(store.columns or [])} columns)")
 
 
 if __name__ == "__main__":
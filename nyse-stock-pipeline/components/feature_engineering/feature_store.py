@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""Memory-mapped float32 feature tensor shared by the trainers.
+
+feature_engineering.py --tensor_store writes <features_dir>/feature_store/:
+- features.f32: the feature rows of every symbol, float32, row-major, one symbol after the other
+- dates.i64: the date of every row, as days since 1970-01-01
+- index.json: the shape, the columns and the [start, stop) rows of every symbol
+
+open_store() maps the files read-only, so the series handed to the trainers are views of
+the page cache: every process and worker reading the store shares one copy of it instead
+of parsing the CSVs into its own DataFrames. load_symbols() is what the trainers use; it
+falls back to the CSVs when there is no store or when the CSVs are newer than it.
+"""
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+STORE_SUBDIR = "feature_store"
+
+
+class StoreWriter:
+    """Append the feature DataFrames of one symbol after the other, then publish the store atomically."""
+
+    def __init__(self, features_dir: str):
+        self.path = os.path.join(features_dir, STORE_SUBDIR)
+        self.partial = self.path + ".partial"
+        shutil.rmtree(self.partial, ignore_errors=True)
+        os.makedirs(self.partial)
+        self.features = open(os.path.join(self.partial, "features.f32"), "wb")
+        self.dates = open(os.path.join(self.partial, "dates.i64"), "wb")
+        self.columns = None
+        self.symbols = {}
+        self.rows = 0
+
+    def append(self, symbol: str, df: pd.DataFrame):
+        columns = [c for c in df.columns if c != "Date"]
+        if self.columns is None:
+            self.columns = columns
+        elif columns != self.columns:
+            raise ValueError(f"{symbol} has columns {columns}, expected {self.columns}")
+        np.ascontiguousarray(df[columns].to_numpy(dtype=np.float32)).tofile(self.features)
+        days = pd.to_datetime(df["Date"]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+        days.tofile(self.dates)
+        self.symbols[symbol] = [self.rows, self.rows + len(df)]
+        self.rows += len(df)
+
+    def close(self) -> str:
+        self.features.close()
+        self.dates.close()
+        with open(os.path.join(self.partial, "index.json"), "w") as f:
+            json.dump({"rows": self.rows, "columns": self.columns or [], "dtype": "float32",
+                       "symbols": self.symbols}, f, indent=2)
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.replace(self.partial, self.path)
+        return self.path
+
+
+def open_store(path: str) -> dict:
+    with open(os.path.join(path, "index.json"), "r") as f:
+        index = json.load(f)
+    shape = (index["rows"], len(index["columns"]))
+    # np.memmap cannot map empty files
+    if not index["rows"]:
+        return {**index, "features": np.empty(shape, np.float32), "dates": np.empty(0, np.int64)}
+    return {
+        **index,
+        "features": np.memmap(os.path.join(path, "features.f32"), dtype=np.float32, mode="r", shape=shape),
+        "dates": np.memmap(os.path.join(path, "dates.i64"), dtype=np.int64, mode="r", shape=(shape[0],)),
+    }
+
+
+def series(store: dict, symbol: str, column: str) -> np.ndarray:
+    """Zero-copy view of one column of one symbol."""
+    start, stop = store["symbols"][symbol]
+    return store["features"][start:stop, store["columns"].index(column)]
+
+
+def load_symbols(features_dir: str, column: str = "Adj Close") -> list:
+    """(symbol, loader) pairs of the features folder; loaders return the column as an array.
+
+    Reads the feature store when there is one and no *_features.csv is newer than it, else
+    *_features.csv, else raw CSVs.
+    """
+    store_path = os.path.join(features_dir, STORE_SUBDIR)
+    index_path = os.path.join(store_path, "index.json")
+    features_csvs = glob.glob(os.path.join(features_dir, "*_features.csv"))
+    # The store is published after the CSVs of its run, so a newer CSV means it is stale
+    if os.path.exists(index_path) and all(os.path.getmtime(csv) <= os.path.getmtime(index_path) for csv in features_csvs):
+        store = open_store(store_path)
+        if column not in store["columns"]:
+            raise SystemExit(f"Feature store has no '{column}' column")
+        print(f"Reading the feature store: {store_path}")
+        return [(sym, lambda sym=sym: series(store, sym, column)) for sym in sorted(store["symbols"])]
+
+    csvs = sorted(features_csvs)
+    if not csvs:
+        csvs = sorted(glob.glob(os.path.join(features_dir, "*.csv")))
+
+    def read(csv_path: str) -> np.ndarray:
+        df = pd.read_csv(csv_path)
+        if column not in df.columns:
+            raise ValueError(f"CSV must contain '{column}' column")
+        return df[column].astype(float).values
+
+    return [(os.path.basename(csv).split("_")[0], lambda csv=csv: read(csv)) for csv in csvs]
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Batch ARIMA forecasts from the compact snapshots of train_arima.py, without statsmodels.
+
+A snapshot (the "state" of arima_<symbol>/model.json) holds what the ARIMA(p,d,q)
+model needs to continue from the end of the series:
+- ar, ma, mean: the AR and MA coefficients and the mean (the const of d=0 models)
+- filter_state: the Kalman filter state of the ARMA part of the d-times differenced
+  series w for the first step after the series, max(p, q + 1) values
+- levels: the last value of each difference of order 0..d-1, to integrate w back
+
+The ARMA state a evolves as a' = ar * a[0] + (a[1], ..., a[r-1], 0) and w = mean + a[0],
+the state space form statsmodels uses, so the forecasts match statsmodels' up to
+rounding. load_snapshots() stacks any number of snapshots into arrays, zero-padding
+to the largest state, and forecast() advances all of them at once: one NumPy step
+per forecast step, over the whole batch. Snapshots are grouped by d, as integration
+depends on it.
+"""
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+
+
+def load_snapshots(model_files: list) -> dict:
+    """Stack the snapshots of model.json files into a batch of arrays, by differencing order d."""
+    snapshots = []
+    for path in model_files:
+        with open(path, "r") as f:
+            info = json.load(f)
+        if "state" in info:
+            snapshots.append((info["symbol"], info["state"]))
+        else:
+            print(f"Skipping {path}: no snapshot, retrain with the current train_arima.py")
+
+    batches = {}
+    for d in sorted({s["d"] for _, s in snapshots}):
+        group = [(sym, s) for sym, s in snapshots if s["d"] == d]
+        r = max(len(s["filter_state"]) for _, s in group)
+
+        def padded(key):
+            rows = np.zeros((len(group), r))
+            for i, (_, s) in enumerate(group):
+                rows[i, :len(s[key])] = s[key]
+            return rows
+
+        batches[d] = {
+            "symbols": [sym for sym, _ in group],
+            "ar": padded("ar"),
+            "mean": np.array([s["mean"] for _, s in group]),
+            "filter_state": padded("filter_state"),
+            "levels": np.array([s["levels"] for _, s in group]).reshape(len(group), d),
+        }
+    return batches
+
+
+def forecast(batch: dict, steps: int) -> np.ndarray:
+    """Forecast `steps` values for every snapshot of a batch; returns an array of (snapshots, steps)."""
+    ar, state = batch["ar"], batch["filter_state"].copy()
+    w = np.empty((len(state), steps))
+    for h in range(steps):
+        w[:, h] = state[:, 0]
+        state = ar * state[:, :1] + np.pad(state[:, 1:], ((0, 0), (0, 1)))
+    forecasts = w + batch["mean"][:, None]
+
+    # Integrate back from the highest difference to the levels
+    levels = batch["levels"]
+    for k in reversed(range(levels.shape[1])):
+        forecasts = levels[:, k:k + 1] + np.cumsum(forecasts, axis=1)
+    return forecasts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Forecast every ARIMA snapshot under a models folder in one batch")
+    parser.add_argument("--models_dir", required=True, help="Directory with the arima_<symbol>/model.json of train_arima.py")
+    parser.add_argument("--steps", type=int, default=5, help="Number of steps to forecast")
+    parser.add_argument("--out", required=True, help="Output CSV with one row per symbol and one column per step")
+    args = parser.parse_args()
+
+    model_files = sorted(glob.glob(os.path.join(args.models_dir, "arima_*", "model.json")))
+    if not model_files:
+        raise SystemExit("No arima_*/model.json found under models_dir")
+
+    rows = []
+    for d, batch in load_snapshots(model_files).items():
+        for symbol, values in zip(batch["symbols"], forecast(batch, args.steps)):
+            rows.append(",".join([symbol] + [f"{v:.6f}" for v in values]))
+    with open(args.out, "w") as f:
+        f.write(",".join(["symbol"] + [f"step_{h + 1}" for h in range(args.steps)]) + "\n")
+        f.write("\n".join(sorted(rows)) + "\n")
+    print(f"Forecast {len(rows)} symbols x {args.steps} steps: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,15 @@
 #!/usr/bin/env python3
 import argparse
-import glob
 import json
 import os
+import sys
 from datetime import datetime
 
 import numpy as np
-import pandas as pd
+
+# The feature store module is shared with feature_engineering
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "feature_engineering"))
+from feature_store import load_symbols
 
 try:
     from statsmodels.tsa.arima.model import ARIMA
@@ -14,11 +17,39 @@ except Exception:
     raise SystemExit("statsmodels not available. Install with: pip install -r requirements.txt")
 
 
-def train_arima_on_symbol(csv_path: str, out_dir: str, order=(5, 1, 0)):
-    df = pd.read_csv(csv_path)
-    if "Adj Close" not in df.columns:
-        raise ValueError("CSV must contain 'Adj Close' column")
-    y = df["Adj Close"].astype(float).values
+def named_params(fit) -> dict:
+    """Fitted parameters by name; `fit.params` is an unnamed array when the model is fit on a numpy series."""
+    return {str(k): float(v) for k, v in zip(fit.model.param_names, fit.params)}
+
+
+def snapshot(fit, y: np.ndarray, order) -> dict:
+    """Compact state to forecast from the end of `y` without statsmodels (see arima_forecast.py).
+
+    `fit` must be filtered up to the end of `y`. Only the default trend is supported: a
+    constant (the mean) without differencing, none otherwise.
+    """
+    p, d, q = order
+    params = named_params(fit)
+    # The state vector holds d differencing states, then the ARMA states; the predicted
+    # state of the last column is the filter state for the first step after the series
+    arma_state = fit.predicted_state[d:, -1]
+    return {
+        "p": p,
+        "d": d,
+        "q": q,
+        "ar": [float(v) for v in fit.arparams],
+        "ma": [float(v) for v in fit.maparams],
+        "mean": params.get("const", 0.0),
+        "sigma2": params["sigma2"],
+        "filter_state": [float(v) for v in arma_state[:max(p, q + 1)]],
+        "levels": [float(np.diff(y, n=k)[-1]) for k in range(d)],
+        "nobs": int(len(y)),
+    }
+
+
+def train_arima_on_symbol(sym: str, load_values, out_dir: str, order=(5, 1, 0)):
+    # statsmodels works in float64; this copies the float32 store series of one symbol
+    y = np.asarray(load_values(), dtype=np.float64)
 
     # Simple train/val split
     n = len(y)
@@ -30,7 +61,9 @@ def train_arima_on_symbol(csv_path: str, out_dir: str, order=(5, 1, 0)):
     forecast = fit.forecast(steps=len(val))
     rmse = float(np.sqrt(np.mean((forecast - val) ** 2)))
 
-    sym = os.path.basename(csv_path).split("_")[0]
+    # Filter the validation values with the fitted parameters, so the snapshot forecasts from the end of the series
+    full = fit.append(val)
+
     model_dir = os.path.join(out_dir, f"arima_{sym}")
     os.makedirs(model_dir, exist_ok=True)
 
@@ -38,7 +71,8 @@ def train_arima_on_symbol(csv_path: str, out_dir: str, order=(5, 1, 0)):
     model_info = {
         "symbol": sym,
         "order": order,
-        "params": {str(k): float(v) for k, v in fit.params.items()},
+        "params": named_params(fit),
+        "state": snapshot(full, y, order),
     }
     with open(os.path.join(model_dir, "model.json"), "w") as f:
         json.dump(model_info, f, indent=2)
@@ -59,7 +93,8 @@ def train_arima_on_symbol(csv_path: str, out_dir: str, order=(5, 1, 0)):
 
 def main():
     parser = argparse.ArgumentParser(description="Train ARIMA and save model+metrics to PVC")
-    parser.add_argument("--features_dir", required=True, help="Directory with *_features.csv or raw CSVs with Adj Close")
+    parser.add_argument("--features_dir", required=True,
+                        help="Directory with a feature_store, *_features.csv or raw CSVs with Adj Close")
     parser.add_argument("--out", required=True, help="Output directory on PVC for models/metrics")
     parser.add_argument("--order", default="5,1,0", help="ARIMA order p,d,q")
     args = parser.parse_args()
@@ -67,17 +102,15 @@ def main():
     os.makedirs(args.out, exist_ok=True)
     order = tuple(int(x) for x in args.order.split(","))
 
-    csvs = sorted(glob.glob(os.path.join(args.features_dir, "*_features.csv")))
-    if not csvs:
-        csvs = sorted(glob.glob(os.path.join(args.features_dir, "*.csv")))
-    if not csvs:
-        raise SystemExit("No CSVs found under features_dir")
+    symbols = load_symbols(args.features_dir)
+    if not symbols:
+        raise SystemExit("No feature store or CSVs found under features_dir")
 
-    for csv in csvs:
+    for sym, values in symbols:
         try:
-            train_arima_on_symbol(csv, args.out, order)
+            train_arima_on_symbol(sym, values, args.out, order)
         except Exception as e:
-            print(f"Skipping {csv}: {e}")
+            print(f"Skipping {sym}: {e}")
 
 
 if __name__ == "__main__":
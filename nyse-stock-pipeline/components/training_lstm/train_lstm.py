@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 import argparse
-import glob
+import hashlib
 import json
+import math
 import os
+import shutil
+import sys
+import time
 from datetime import datetime
 
 import numpy as np
-import pandas as pd
+
+# oneDNN is read when TensorFlow is imported; it is on by default on x86 but not on every build
+os.environ.setdefault("TF_ENABLE_ONEDNN_OPTS", "1")
+
+# The feature store module is shared with feature_engineering
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "feature_engineering"))
+from feature_store import load_symbols
 
 try:
     import tensorflow as tf
@@ -15,30 +25,176 @@ except Exception as e:
     raise SystemExit("TensorFlow not available. Install with: pip install -r requirements.txt")
 
 
+PERFORMANCE_PROFILES = ("default", "cpu")
+
+
+def cpu_quota() -> int:
+    """CPUs available to the process: its affinity, capped by the cgroup CPU quota of the container."""
+    cpus = len(os.sched_getaffinity(0))
+    try:
+        with open("/sys/fs/cgroup/cpu.max", "r") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            cpus = min(cpus, max(1, math.ceil(int(quota) / int(period))))
+    except (OSError, ValueError):
+        pass
+    return cpus
+
+
+def supports_bfloat16() -> bool:
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+def configure_profile(name: str) -> dict:
+    """Apply a TensorFlow performance profile; must run before the first TensorFlow op.
+
+    'cpu' sizes the intra-op thread pool to the CPU quota and trains in bfloat16 mixed precision
+    when the CPU supports it. 'default' leaves TensorFlow as is. XLA is not used: it compiles the
+    LSTM loop into a much slower CPU program.
+    """
+    profile = {"name": name, "mixed_precision": False}
+    if name == "cpu":
+        profile.update({"intra_op_threads": cpu_quota(), "inter_op_threads": 2, "mixed_precision": supports_bfloat16()})
+        tf.config.threading.set_intra_op_parallelism_threads(profile["intra_op_threads"])
+        tf.config.threading.set_inter_op_parallelism_threads(profile["inter_op_threads"])
+    print(f"Performance profile: {profile}")
+    return profile
+
+
+class TrainingControl(keras.callbacks.Callback):
+    """Early stopping on val_loss with checkpoints on the PVC that survive a pod restart.
+
+    The weights and optimizer state are saved under <checkpoint_dir>/latest every
+    `checkpoint_every` epochs and whenever val_loss improves, the improving weights also under
+    <checkpoint_dir>/best, followed by state.json (epoch, best val_loss, patience counter,
+    history). resume() restores the latest checkpoint; finish() restores the best weights.
+    state.json also records the fingerprint of the hyperparameters and input data; load_state()
+    discards a checkpoint of another fingerprint, left by a run with other settings or features.
+    """
+
+    def __init__(self, checkpoint_dir: str, patience: int = 3, checkpoint_every: int = 1, min_delta: float = 0.0,
+                 fingerprint: str = ""):
+        super().__init__()
+        self.checkpoint_dir = checkpoint_dir
+        self.fingerprint = fingerprint
+        self.patience = patience
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.min_delta = min_delta
+        self.state_path = os.path.join(checkpoint_dir, "state.json")
+        self.state = {"fingerprint": fingerprint, "epoch": 0, "best_epoch": 0, "best_val_loss": None, "wait": 0,
+                      "stopped_early": False, "completed": False, "resumed_from_epoch": 0, "history": {},
+                      "epoch_stats": []}
+
+    def load_state(self) -> bool:
+        if not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path, "r") as f:
+            state = json.load(f)
+        if state.get("fingerprint") != self.fingerprint:
+            print(f"Discarding the checkpoint of other hyperparameters or data: {self.checkpoint_dir}")
+            shutil.rmtree(self.checkpoint_dir, ignore_errors=True)
+            return False
+        self.state = state
+        return True
+
+    def resume(self, model: keras.Model) -> int:
+        """Restore the latest checkpoint into the model and return the epoch to continue from."""
+        if self.state["epoch"]:
+            model.load_weights(os.path.join(self.checkpoint_dir, "latest", "weights")).expect_partial()
+            self.state["resumed_from_epoch"] = self.state["epoch"]
+            print(f"Resumed from epoch {self.state['epoch']} of {self.checkpoint_dir}")
+        return self.state["epoch"]
+
+    def save(self, *names: str):
+        for name in names:
+            self.model.save_weights(os.path.join(self.checkpoint_dir, name, "weights"))
+        # state.json is written last, so it never points to a checkpoint that was not fully written
+        with open(self.state_path + ".partial", "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(self.state_path + ".partial", self.state_path)
+
+    def on_epoch_end(self, epoch, logs=None):
+        logs = logs or {}
+        for k, v in logs.items():
+            self.state["history"].setdefault(k, []).append(float(v))
+        self.state["epoch"] = epoch + 1
+
+        val_loss = logs.get("val_loss")
+        best = self.state["best_val_loss"]
+        improved = val_loss is not None and (best is None or val_loss < best - self.min_delta)
+        if improved:
+            self.state.update(best_epoch=epoch + 1, best_val_loss=float(val_loss), wait=0)
+        else:
+            self.state["wait"] += 1
+        if self.patience and self.state["wait"] >= self.patience:
+            self.state["stopped_early"] = True
+            self.model.stop_training = True
+            print(f"Early stopping at epoch {epoch + 1}: val_loss did not improve since epoch {self.state['best_epoch']}")
+
+        if improved:
+            self.save("latest", "best")
+        elif (epoch + 1) % self.checkpoint_every == 0 or self.state["stopped_early"]:
+            self.save("latest")
+
+    def finish(self, model: keras.Model):
+        """Restore the best weights and mark the training completed."""
+        if self.state["best_epoch"]:
+            model.load_weights(os.path.join(self.checkpoint_dir, "best", "weights")).expect_partial()
+        self.state["completed"] = True
+        self.save()
+
+
 def make_supervised(series: np.ndarray, window: int = 20, horizon: int = 1):
-    X, y = [], []
-    for i in range(len(series) - window - horizon + 1):
-        X.append(series[i:i + window])
-        y.append(series[i + window + horizon - 1])
-    return np.array(X)[..., np.newaxis], np.array(y)
+    # Windows are strided views of the series, e.g. of the memory-mapped feature store, not copies
+    n = max(len(series) - window - horizon + 1, 0)
+    X = np.lib.stride_tricks.sliding_window_view(series, window)[:n]
+    y = series[window + horizon - 1:][:n]
+    return X[..., np.newaxis], y
 
 
-def build_model(window: int) -> keras.Model:
+def build_model(window: int, units: tuple = (64, 32), learning_rate: float = 1e-3) -> keras.Model:
     inputs = keras.Input(shape=(window, 1))
-    x = keras.layers.LSTM(64, return_sequences=True)(inputs)
-    x = keras.layers.LSTM(32)(x)
-    x = keras.layers.Dense(32, activation="relu")(x)
-    outputs = keras.layers.Dense(1)(x)
+    x = keras.layers.LSTM(units[0], return_sequences=True)(inputs)
+    x = keras.layers.LSTM(units[1])(x)
+    x = keras.layers.Dense(units[1], activation="relu")(x)
+    # float32 output under mixed precision, for a numerically stable loss
+    outputs = keras.layers.Dense(1, dtype="float32")(x)
     model = keras.Model(inputs, outputs)
-    model.compile(optimizer=keras.optimizers.Adam(1e-3), loss="mse")
+    model.compile(optimizer=keras.optimizers.Adam(learning_rate), loss="mse")
     return model
 
 
-def train_on_symbol(csv_path: str, out_dir: str, window: int = 20, horizon: int = 1, epochs: int = 10, val_split: float = 0.2):
-    df = pd.read_csv(csv_path)
-    if "Adj Close" not in df.columns:
-        raise ValueError("CSV must contain 'Adj Close' column")
-    values = df["Adj Close"].astype(float).values
+def training_fingerprint(values: np.ndarray, **hyperparameters) -> str:
+    """Hash of the hyperparameters and the training series, the series as float64 whatever its source."""
+    digest = hashlib.sha256(json.dumps(hyperparameters, sort_keys=True).encode())
+    digest.update(np.ascontiguousarray(values, dtype=np.float64).tobytes())
+    return digest.hexdigest()
+
+
+def train_on_symbol(sym: str, load_values, out_dir: str, window: int = 20, horizon: int = 1, epochs: int = 10, val_split: float = 0.2,
+                    profile: dict = None, patience: int = 3, checkpoint_every: int = 1, checkpoint_dir: str = "",
+                    units: tuple = (64, 32), learning_rate: float = 1e-3, batch_size: int = 32):
+    profile = profile or {"name": "default", "mixed_precision": False}
+    metrics_path = os.path.join(out_dir, f"metrics_lstm_{sym}.json")
+
+    values = load_values()
+    fingerprint = training_fingerprint(
+        values, window=window, horizon=horizon, epochs=epochs, val_split=val_split, units=list(units),
+        learning_rate=learning_rate, batch_size=batch_size, patience=patience,
+        mixed_precision=profile["mixed_precision"],
+    )
+
+    control = TrainingControl(os.path.join(checkpoint_dir or os.path.join(out_dir, "checkpoints"), f"lstm_{sym}"),
+                              patience, checkpoint_every, fingerprint=fingerprint)
+    if control.load_state() and control.state["completed"] and os.path.exists(metrics_path):
+        # Trained with the same hyperparameters and data before the pod restarted
+        print(f"Already trained: {sym}")
+        return
 
     X, y = make_supervised(values, window, horizon)
     n = len(X)
@@ -48,24 +204,56 @@ def train_on_symbol(csv_path: str, out_dir: str, window: int = 20, horizon: int
     X_train, y_train = X[:split], y[:split]
     X_val, y_val = X[split:], y[split:]
 
-    model = build_model(window)
-    history = model.fit(
-        X_train,
-        y_train,
-        validation_data=(X_val, y_val),
-        epochs=epochs,
-        batch_size=32,
-        verbose=2,
+    if profile["mixed_precision"]:
+        keras.mixed_precision.set_global_policy("mixed_bfloat16")
+    try:
+        model = build_model(window, units, learning_rate)
+    finally:
+        keras.mixed_precision.set_global_policy("float32")
+
+    initial_epoch = control.resume(model)
+
+    # Per-epoch time and throughput, validation included, to compare the profiles per node type
+    epoch_stats = control.state["epoch_stats"]
+    epoch_start = {}
+
+    def log_epoch(epoch, logs):
+        seconds = time.perf_counter() - epoch_start["time"]
+        epoch_stats.append({"epoch": epoch + 1, "seconds": seconds, "samples_per_second": len(X_train) / seconds})
+        print(f"Epoch {epoch + 1}: {seconds:.2f}s, {len(X_train) / seconds:.0f} samples/s")
+
+    throughput = keras.callbacks.LambdaCallback(
+        on_epoch_begin=lambda epoch, logs: epoch_start.update(time=time.perf_counter()),
+        on_epoch_end=log_epoch,
     )
 
+    if initial_epoch < epochs and not control.state["stopped_early"]:
+        # The throughput callback runs first, so its epoch stats are part of the checkpointed state
+        model.fit(
+            X_train,
+            y_train,
+            validation_data=(X_val, y_val),
+            epochs=epochs,
+            initial_epoch=initial_epoch,
+            batch_size=batch_size,
+            verbose=2,
+            callbacks=[throughput, control],
+        )
+    control.finish(model)
+    state = control.state
+
     # Evaluate RMSE on validation
     val_pred = model.predict(X_val, verbose=0).squeeze()
     rmse = float(np.sqrt(np.mean((val_pred - y_val) ** 2)))
 
     # Save model (TF SavedModel)
-    sym = os.path.basename(csv_path).split("_")[0]
     model_dir = os.path.join(out_dir, f"lstm_{sym}_savedmodel")
     os.makedirs(model_dir, exist_ok=True)
+    if profile["mixed_precision"]:
+        # The saved model stays float32 for serving and the OpenVINO conversion
+        trained = model
+        model = build_model(window, units, learning_rate)
+        model.set_weights(trained.get_weights())
     model.save(model_dir)
 
     # Save metrics
@@ -73,15 +261,25 @@ def train_on_symbol(csv_path: str, out_dir: str, window: int = 20, horizon: int
         "symbol": sym,
         "window": window,
         "horizon": horizon,
+        "units": list(units),
+        "learning_rate": learning_rate,
+        "batch_size": batch_size,
         "epochs": epochs,
+        # Epochs actually trained, and the epochs early stopping saved out of the requested ones
+        "epochs_run": state["epoch"],
+        "epochs_saved": epochs - state["epoch"],
+        "best_epoch": state["best_epoch"],
+        "stopped_early": state["stopped_early"],
+        "resumed_from_epoch": state["resumed_from_epoch"],
         "val_rmse": rmse,
-        "history": {k: [float(x) for x in v] for k, v in history.history.items()},
+        "history": state["history"],
+        "performance_profile": profile,
+        "epoch_stats": epoch_stats,
         "timestamp": datetime.utcnow().isoformat(),
         "model_dir": model_dir,
         "framework": "tensorflow",
         "model_type": "lstm",
     }
-    metrics_path = os.path.join(out_dir, f"metrics_lstm_{sym}.json")
     with open(metrics_path, "w") as f:
         json.dump(metrics, f, indent=2)
     print(f"Saved: {model_dir}\nMetrics: {metrics_path}\nRMSE: {rmse:.4f}")
@@ -89,25 +287,52 @@ def train_on_symbol(csv_path: str, out_dir: str, window: int = 20, horizon: int
 
 def main():
     parser = argparse.ArgumentParser(description="Train LSTM on features CSV and save model+metrics to PVC")
-    parser.add_argument("--features_dir", required=True, help="Directory with *_features.csv or raw CSVs with Adj Close")
+    parser.add_argument("--features_dir", required=True,
+                        help="Directory with a feature_store, *_features.csv or raw CSVs with Adj Close")
     parser.add_argument("--out", required=True, help="Output directory on PVC for models/metrics")
     parser.add_argument("--window", type=int, default=20)
     parser.add_argument("--horizon", type=int, default=1)
     parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--units", default="64,32", help="Units of the two LSTM layers, e.g. 64,32")
+    parser.add_argument("--learning_rate", type=float, default=1e-3)
+    parser.add_argument("--batch_size", type=int, default=32)
+    parser.add_argument("--tuned_config", default="",
+                        help="tuning_lstm_best.json of tune_lstm.py; its window, units, learning rate and batch size override the arguments")
+    parser.add_argument("--performance_profile", choices=PERFORMANCE_PROFILES,
+                        default=os.getenv("PERFORMANCE_PROFILE", "default"),
+                        help="TensorFlow tuning: 'cpu' for CPU-only nodes (threads, bfloat16), 'default' leaves TensorFlow as is")
+    parser.add_argument("--patience", type=int, default=3,
+                        help="Stop after this many epochs without val_loss improvement and keep the best weights; 0 disables")
+    parser.add_argument("--checkpoint_every", type=int, default=1, help="Checkpoint every N epochs, and on every improvement")
+    parser.add_argument("--checkpoint_dir", default="",
+                        help="Checkpoints to resume from after a restart; defaults to <out>/checkpoints, removed once all symbols are trained")
     args = parser.parse_args()
+    profile = configure_profile(args.performance_profile)
+    units = tuple(int(u) for u in args.units.split(","))
+    window, learning_rate, batch_size = args.window, args.learning_rate, args.batch_size
+    if args.tuned_config:
+        with open(args.tuned_config, "r") as f:
+            config = json.load(f)["config"]
+        window, units, learning_rate, batch_size = config["window"], tuple(config["units"]), config["learning_rate"], config["batch_size"]
+        print(f"Tuned config: {config}")
 
     os.makedirs(args.out, exist_ok=True)
-    csvs = sorted(glob.glob(os.path.join(args.features_dir, "*_features.csv")))
-    if not csvs:
-        csvs = sorted(glob.glob(os.path.join(args.features_dir, "*.csv")))
-    if not csvs:
-        raise SystemExit("No CSVs found under features_dir")
+    symbols = load_symbols(args.features_dir)
+    if not symbols:
+        raise SystemExit("No feature store or CSVs found under features_dir")
 
-    for csv in csvs:
+    checkpoint_dir = args.checkpoint_dir or os.path.join(args.out, "checkpoints")
+    for sym, values in symbols:
         try:
-            train_on_symbol(csv, args.out, args.window, args.horizon, args.epochs)
+            train_on_symbol(sym, values, args.out, window, args.horizon, args.epochs, profile=profile, patience=args.patience,
+                            checkpoint_every=args.checkpoint_every, checkpoint_dir=checkpoint_dir, units=units,
+                            learning_rate=learning_rate, batch_size=batch_size)
         except Exception as e:
-            print(f"Skipping {csv}: {e}")
+            print(f"Skipping {sym}: {e}")
+
+    # Checkpoints are only needed to resume this run; the next run trains from scratch
+    for sym, _ in symbols:
+        shutil.rmtree(os.path.join(checkpoint_dir, f"lstm_{sym}"), ignore_errors=True)
 
 
 if __name__ == "__main__":
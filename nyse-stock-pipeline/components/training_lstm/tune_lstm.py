@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""Hyperparameter search for the LSTM with asynchronous successive halving (ASHA).
+
+`search` samples configs of window, LSTM units, learning rate and batch size and
+trains them on a few symbols in rungs of min_epochs, min_epochs * eta, ... up to
+max_epochs. A trial is promoted to the next rung once it is in the top 1/eta of
+the trials that finished its rung; the others stop there. Trials run as `trial`
+subprocesses, `workers` at a time with `threads` TensorFlow threads each, and a
+promoted trial resumes from its checkpoint instead of starting over.
+
+The score is the validation RMSE relative to the mean validation price, averaged
+over the symbols, so symbols of different price levels weigh the same. The best
+config (tuning_lstm_best.json, see train_lstm.py --tuned_config) and the trial
+table (tuning_lstm_trials.csv) are written next to the metrics; the names stay out
+of the metrics_* and lstm_* globs of select_best and the train_lstm step cache.
+Use at least eta ** (rungs - 1) trials for a trial to reach max_epochs.
+"""
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+SEARCH_SPACE = {
+    "window": [10, 20, 40, 60],
+    "units": [[32, 16], [64, 32], [128, 64]],
+    "learning_rate": (1e-4, 1e-2),
+    "batch_size": [16, 32, 64, 128],
+}
+
+
+def sample_config(rng: np.random.Generator) -> dict:
+    low, high = SEARCH_SPACE["learning_rate"]
+    return {
+        "window": int(rng.choice(SEARCH_SPACE["window"])),
+        "units": SEARCH_SPACE["units"][rng.integers(len(SEARCH_SPACE["units"]))],
+        # Log-uniform, as learning rates matter by order of magnitude
+        "learning_rate": float(math.exp(rng.uniform(math.log(low), math.log(high)))),
+        "batch_size": int(rng.choice(SEARCH_SPACE["batch_size"])),
+    }
+
+
+def rungs(min_epochs: int, max_epochs: int, eta: int) -> list:
+    epochs = [min_epochs]
+    while epochs[-1] * eta < max_epochs:
+        epochs.append(epochs[-1] * eta)
+    if epochs[-1] < max_epochs:
+        epochs.append(max_epochs)
+    return epochs
+
+
+def run_trial(args) -> int:
+    """Train one config from `initial_epoch` to `epochs` on every symbol and write its score."""
+    os.environ["OMP_NUM_THREADS"] = str(args.threads)
+    from train_lstm import build_model, load_symbols, make_supervised, tf
+
+    # Several trials share the node; each keeps to its thread budget
+    tf.config.threading.set_intra_op_parallelism_threads(args.threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+    start = time.perf_counter()
+    scores = []
+    # Trials of the same search map the same feature store pages
+    loaders = dict(load_symbols(args.features_dir))
+    for sym in args.symbols:
+        X, y = make_supervised(loaders[sym](), config["window"], args.horizon)
+        split = int(len(X) * (1 - args.val_split))
+        X_train, y_train, X_val, y_val = X[:split], y[:split], X[split:], y[split:]
+
+        model = build_model(config["window"], tuple(config["units"]), config["learning_rate"])
+        checkpoint = os.path.join(os.path.dirname(args.config), sym, "weights")
+        if args.initial_epoch:
+            model.load_weights(checkpoint).expect_partial()
+        model.fit(X_train, y_train, epochs=args.epochs, initial_epoch=args.initial_epoch,
+                  batch_size=config["batch_size"], verbose=0)
+        model.save_weights(checkpoint)
+
+        val_pred = model.predict(X_val, verbose=0).squeeze()
+        rmse = float(np.sqrt(np.mean((val_pred - y_val) ** 2)))
+        scores.append(rmse / float(np.mean(np.abs(y_val))))
+
+    result = {"score": float(np.mean(scores)) if np.all(np.isfinite(scores)) else float("inf"),
+              "seconds": time.perf_counter() - start}
+    with open(args.result, "w") as f:
+        json.dump(result, f)
+    return 0
+
+
+def search(args) -> int:
+    from train_lstm import cpu_quota, load_symbols
+
+    symbols = [sym for sym, _ in load_symbols(args.features_dir)][:args.symbols]
+    if not symbols:
+        raise SystemExit("No feature store or CSVs found under features_dir")
+
+    threads = args.threads or max(1, cpu_quota() // args.workers)
+    epochs = rungs(args.min_epochs, args.max_epochs, args.eta)
+    rng = np.random.default_rng(args.seed)
+    tuning_dir = os.path.join(args.out, "tuning")
+    shutil.rmtree(tuning_dir, ignore_errors=True)
+    os.makedirs(tuning_dir)
+    print(f"Tuning on {len(symbols)} symbols: {args.trials} trials, rungs {epochs} epochs, "
+          f"{args.workers} workers x {threads} threads")
+
+    trials = []
+    # Trials that finished each rung, and those already promoted from it
+    finished = [[] for _ in epochs]
+    promoted = [set() for _ in epochs]
+
+    def next_job():
+        # Promote first, from the highest rung down, so good trials finish early
+        for rung in reversed(range(len(epochs) - 1)):
+            ranked = sorted(finished[rung], key=lambda t: trials[t]["scores"][rung])
+            for t in ranked[:len(ranked) // args.eta]:
+                if t not in promoted[rung]:
+                    promoted[rung].add(t)
+                    trials[t]["status"] = "running"
+                    return t, rung + 1
+        if len(trials) < args.trials:
+            trial_dir = os.path.join(tuning_dir, f"trial_{len(trials):03d}")
+            os.makedirs(trial_dir)
+            trials.append({"trial": len(trials), "config": sample_config(rng), "dir": trial_dir,
+                           "scores": [], "seconds": 0.0, "status": "running"})
+            with open(os.path.join(trial_dir, "config.json"), "w") as f:
+                json.dump(trials[-1]["config"], f)
+            return len(trials) - 1, 0
+        return None
+
+    def run(t: int, rung: int) -> tuple:
+        trial = trials[t]
+        result = os.path.join(trial["dir"], f"rung_{rung}.json")
+        command = [sys.executable, os.path.abspath(__file__), "trial",
+                   "--config", os.path.join(trial["dir"], "config.json"), "--result", result,
+                   "--epochs", str(epochs[rung]), "--initial_epoch", str(epochs[rung - 1] if rung else 0),
+                   "--horizon", str(args.horizon), "--threads", str(threads),
+                   "--features_dir", args.features_dir] + symbols
+        code = subprocess.run(command, stdout=subprocess.DEVNULL).returncode
+        if code != 0 or not os.path.exists(result):
+            return t, rung, None
+        with open(result, "r") as f:
+            return t, rung, json.load(f)
+
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        running = set()
+        while True:
+            while len(running) < args.workers:
+                job = next_job()
+                if job is None:
+                    break
+                running.add(pool.submit(run, *job))
+            if not running:
+                break
+            done, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                t, rung, result = future.result()
+                trial = trials[t]
+                if result is None:
+                    trial["status"] = "failed"
+                    print(f"Trial {t} failed at {epochs[rung]} epochs")
+                    continue
+                trial["scores"].append(result["score"])
+                trial["seconds"] += result["seconds"]
+                # Stays "stopped" unless a later ranking of its rung promotes it
+                trial["status"] = "completed" if rung == len(epochs) - 1 else "stopped"
+                finished[rung].append(t)
+                print(f"Trial {t} {trial['config']}: {epochs[rung]} epochs, score {result['score']:.4f}")
+
+    table = pd.DataFrame([
+        {"trial": t["trial"], **{k: json.dumps(v) if isinstance(v, list) else v for k, v in t["config"].items()},
+         "epochs": epochs[len(t["scores"]) - 1] if t["scores"] else 0,
+         "score": t["scores"][-1] if t["scores"] else float("nan"),
+         "seconds": t["seconds"], "status": t["status"]}
+        for t in trials
+    ]).sort_values(["epochs", "score"], ascending=[False, True])
+    table_path = os.path.join(args.out, "tuning_lstm_trials.csv")
+    table.to_csv(table_path, index=False)
+    print(table.to_string(index=False))
+
+    # Best of the trials that reached the highest rung any trial reached
+    scored = [t for t in trials if t["scores"]]
+    if not scored:
+        raise SystemExit("Every trial failed")
+    top = max(len(t["scores"]) for t in scored)
+    best = min((t for t in scored if len(t["scores"]) == top), key=lambda t: t["scores"][-1])
+    best_path = os.path.join(args.out, "tuning_lstm_best.json")
+    with open(best_path, "w") as f:
+        json.dump({
+            "config": best["config"],
+            "score": best["scores"][-1],
+            "epochs": epochs[top - 1],
+            "trial": best["trial"],
+            "symbols": symbols,
+            "rungs": epochs,
+            "trials": len(trials),
+            "trial_epochs": sum(epochs[len(t["scores"]) - 1] for t in scored),
+            "grid_epochs": len(trials) * args.max_epochs,
+        }, f, indent=2)
+    shutil.rmtree(tuning_dir, ignore_errors=True)
+    print(f"Best config: {best['config']} score {best['scores'][-1]:.4f}\nSaved: {best_path}\nTrials: {table_path}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune the LSTM hyperparameters with asynchronous successive halving")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    search_parser = sub.add_parser("search", help="Run the search and write the best config and trial table")
+    search_parser.add_argument("--features_dir", required=True,
+                               help="Directory with a feature_store, *_features.csv or raw CSVs with Adj Close")
+    search_parser.add_argument("--out", required=True, help="Output directory on PVC, next to the metrics")
+    search_parser.add_argument("--symbols", type=int, default=3, help="Number of symbols every trial trains on")
+    search_parser.add_argument("--horizon", type=int, default=1)
+    search_parser.add_argument("--trials", type=int, default=12, help="Number of sampled configs")
+    search_parser.add_argument("--min_epochs", type=int, default=2, help="Epochs of the first rung")
+    search_parser.add_argument("--max_epochs", type=int, default=18, help="Epochs of the last rung")
+    search_parser.add_argument("--eta", type=int, default=3, help="Reduction factor: the top 1/eta of a rung is promoted")
+    search_parser.add_argument("--workers", type=int, default=2, help="Trials trained in parallel")
+    search_parser.add_argument("--threads", type=int, default=0, help="TensorFlow threads per trial; defaults to CPUs / workers")
+    search_parser.add_argument("--seed", type=int, default=0)
+
+    trial_parser = sub.add_parser("trial", help="Train one config for one rung (run by search)")
+    trial_parser.add_argument("--config", required=True, help="config.json of the trial; checkpoints are kept next to it")
+    trial_parser.add_argument("--result", required=True, help="Output JSON with the score")
+    trial_parser.add_argument("--epochs", type=int, required=True)
+    trial_parser.add_argument("--initial_epoch", type=int, default=0)
+    trial_parser.add_argument("--horizon", type=int, default=1)
+    trial_parser.add_argument("--val_split", type=float, default=0.2)
+    trial_parser.add_argument("--threads", type=int, default=1)
+    trial_parser.add_argument("--features_dir", required=True)
+    trial_parser.add_argument("symbols", nargs="+", help="Symbols to train on")
+
+    args = parser.parse_args()
+    sys.exit(search(args) if args.action == "search" else run_trial(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Install step requirements, skipping pip when they are already satisfied.
+
+Missing requirements are installed offline from a wheelhouse on the PVC; the
+first run of a step downloads them into it. The startup time of each step is
+appended to a JSON-lines metrics file.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from importlib import metadata
+
+try:
+    from packaging.requirements import Requirement
+except ImportError:
+    from pip._vendor.packaging.requirements import Requirement
+
+
+def read_requirements(path: str) -> list:
+    with open(path, "r") as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    return [line for line in lines if line]
+
+
+def is_satisfied(requirement: str, extra: str = "") -> bool:
+    req = Requirement(requirement)
+    if req.marker and not req.marker.evaluate({"extra": extra}):
+        return True
+    try:
+        version = metadata.version(req.name)
+    except metadata.PackageNotFoundError:
+        return False
+    if not req.specifier.contains(version, prereleases=True):
+        return False
+    # Extras are satisfied when the requirements they add are
+    for req_extra in req.extras:
+        for dep in metadata.requires(req.name) or []:
+            if "extra" in dep and not is_satisfied(dep, req_extra):
+                return False
+    return True
+
+
+def install(missing: list, wheelhouse: str) -> str:
+    if not missing:
+        return "satisfied"
+    pip = [sys.executable, "-m", "pip", "--disable-pip-version-check", "-q"]
+    if not wheelhouse:
+        subprocess.check_call(pip + ["install"] + missing)
+        return "index"
+    os.makedirs(wheelhouse, exist_ok=True)
+    offline = pip + ["install", "--no-index", "--find-links", wheelhouse] + missing
+    if subprocess.call(offline) == 0:
+        return "wheelhouse"
+    subprocess.check_call(pip + ["download", "--dest", wheelhouse] + missing)
+    subprocess.check_call(offline)
+    return "index"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Install step requirements, skipping pip when already satisfied")
+    parser.add_argument("requirements", nargs="*", help="Requirement specifiers, e.g. pandas>=2.1.0")
+    parser.add_argument("-r", "--requirement", action="append", default=[], help="Requirements file (repeatable)")
+    parser.add_argument("--step", required=True, help="Step name recorded in the startup metrics")
+    parser.add_argument("--wheelhouse", default="", help="Wheel cache directory on the PVC; empty installs from the index")
+    parser.add_argument("--metrics", default="", help="JSON-lines file the startup time is appended to")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    requirements = list(args.requirements)
+    for path in args.requirement:
+        requirements.extend(read_requirements(path))
+
+    missing = [r for r in requirements if not is_satisfied(r)]
+    source = install(missing, args.wheelhouse)
+    seconds = time.perf_counter() - start
+    print(f"{args.step} startup: {len(requirements) - len(missing)}/{len(requirements)} satisfied, {source} ({seconds:.1f}s)")
+
+    if args.metrics:
+        os.makedirs(os.path.dirname(os.path.abspath(args.metrics)), exist_ok=True)
+        with open(args.metrics, "a") as f:
+            f.write(json.dumps({
+                "step": args.step,
+                "requirements": requirements,
+                "missing": missing,
+                "source": source,
+                "startup_seconds": seconds,
+            }) + "\n")
+
+
+if __name__ == "__main__":
+    main()
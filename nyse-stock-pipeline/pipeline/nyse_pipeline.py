@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from kfp import dsl
 
 # Optional PVC helper for KFP v2: provided by kfp-kubernetes add-on
@@ -11,6 +13,64 @@ except Exception:
 
 PVC_MOUNT_PATH = "/mnt/pvc"
 REPO_SUBDIR = "src/nyse-stock-pipeline"  # repo will be cloned under /mnt/pvc/src
+WHEELHOUSE_SUBDIR = "cache/wheelhouse"
+STEP_CACHE_SUBDIR = "cache/steps"
+STEP_CACHE_REPORT = f"{PVC_MOUNT_PATH}/step_cache_report.jsonl"
+METRICS_SUBDIR = "metrics"
+
+
+def measured(step: str, script: str, phase: str = "run", shard: str = "") -> str:
+    """Shell command that runs a python script and records its metrics as one phase of the step.
+
+    Wall/CPU time, peak RSS and I/O bytes land in metrics/<step>/<shard>/metrics.json on the PVC
+    (see step_metrics.py); set STEP_PROFILER on a task to also dump a profile.
+    """
+    repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
+    return (
+        f"python {repo}/pipeline/step_metrics.py run --step {step} --shard \"{shard}\" --phase {phase} "
+        f"--metrics_dir {PVC_MOUNT_PATH}/{METRICS_SUBDIR} {script}"
+    )
+
+
+def install_requirements(step: str, *requirements: str, shard: str = "") -> str:
+    """Shell prefix that installs step requirements, skipping pip when they are already satisfied.
+
+    Missing requirements come from the wheelhouse on the PVC, which the first run fills.
+    Startup times are appended to startup_metrics.jsonl on the PVC and recorded as the install phase of the step.
+    """
+    repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
+    return measured(
+        step,
+        f"{repo}/pipeline/install_requirements.py --step {step} "
+        f"--wheelhouse {PVC_MOUNT_PATH}/{WHEELHOUSE_SUBDIR} --metrics {PVC_MOUNT_PATH}/startup_metrics.jsonl "
+        f"{' '.join(requirements)}",
+        phase="install",
+        shard=shard,
+    ) + " && "
+
+
+def cached(step: str, run: str, params: str = "", sources=(), inputs=(), outputs=(), latest: bool = False, symbols: str = "") -> str:
+    """Shell command that runs a step only when no completed run on the PVC matches its fingerprint.
+
+    The fingerprint covers the step parameters, source files and input files (see step_cache.py);
+    hits and misses are appended to step_cache_report.jsonl on the PVC. {symbol} in the outputs
+    expands to each of `symbols`, for steps whose shards share an output folder.
+    """
+    repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
+
+    def quoted(paths) -> str:
+        return " ".join(f'"{path}"' for path in paths)
+
+    def step_cache(action: str) -> str:
+        return (
+            f"python {repo}/pipeline/step_cache.py {action} --step {step} --params \"{params}\" "
+            f"--sources {quoted(f'{repo}/{source}' for source in sources)} "
+            f"--inputs {quoted(inputs)} {'--latest ' if latest else ''}--outputs {quoted(outputs)} --symbols \"{symbols}\" "
+            f"--cache_dir {PVC_MOUNT_PATH}/{STEP_CACHE_SUBDIR} --report {STEP_CACHE_REPORT} --pending \"$pending\""
+        )
+
+    # check hands the key and output states over to commit through a file of the container
+    return f"pending=$(mktemp) && if {step_cache('check')}; then :; else {run} && {step_cache('commit')}; fi"
 
 
 @dsl.container_component
@@ -20,60 +80,100 @@ def sync_repo_component(git_url: str, branch: str = "main"):
         image="alpine/git:latest",
         command=["sh", "-lc"],
         args=[
-            f"rm -rf {target} && mkdir -p {target} && git clone --depth 1 -b {branch} {git_url} {target}"
+            # Re-clone only when the branch moved since the last sync
+            f"rev=$(git ls-remote {git_url} {branch} | cut -f1); "
+            f"if [ -n \"$rev\" ] && [ \"$(cat {target}/.synced_rev 2>/dev/null)\" = \"$rev\" ]; then status=hit; "
+            f"else rm -rf {target} && mkdir -p {target} && git clone --depth 1 -b {branch} {git_url} {target} "
+            f"&& git -C {target} rev-parse HEAD > {target}/.synced_rev && status=miss; fi && "
+            f"echo \"Step cache $status: sync_repo ($rev)\" && "
+            f"printf '{{\"step\": \"sync_repo\", \"key\": \"%s\", \"status\": \"%s\"}}\\n' \"$rev\" \"$status\" >> {STEP_CACHE_REPORT} && "
+            # Start of the run for the metrics timeline; steps skipped by the step cache keep older metrics
+            f"mkdir -p {PVC_MOUNT_PATH}/{METRICS_SUBDIR} && date +%s > {PVC_MOUNT_PATH}/{METRICS_SUBDIR}/run_started"
         ],
     )
 
 
 @dsl.container_component
-def download_component(symbols: str, start: str, end: str, out_subdir: str):
+def download_component(symbols: str, start: str, end: str, out_subdir: str, shard: str = ""):
     repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
     return dsl.ContainerSpec(
         image="python:3.10",
         command=["bash", "-lc"],
         args=[
-            f"pip install -q -r {repo}/components/data_download/requirements.txt && "
-            f"python {repo}/components/data_download/download_nyse.py --symbols {symbols} --start {start} --end {end} --out {PVC_MOUNT_PATH}/{out_subdir}"
+            cached(
+                "download",
+                install_requirements("download", f"-r {repo}/components/data_download/requirements.txt", shard=shard)
+                + measured("download", f"{repo}/components/data_download/download_nyse.py --symbols {symbols} --start {start} --end {end} --out {PVC_MOUNT_PATH}/{out_subdir}/{shard}", shard=shard),
+                params=f"{symbols} {start} {end} {shard}",
+                sources=["components/data_download"],
+                outputs=[f"{PVC_MOUNT_PATH}/{out_subdir}/{shard}/download_*"],
+            )
         ],
     )
 
 
 @dsl.container_component
-def feature_engineering_component(input_subdir: str, output_subdir: str):
+def feature_engineering_component(input_subdir: str, output_subdir: str, shard: str = ""):
     repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
     return dsl.ContainerSpec(
         image="python:3.10",
         command=["bash", "-lc"],
         args=[
-            f"pip install -q -r {repo}/components/feature_engineering/requirements.txt && "
-            f"python {repo}/components/feature_engineering/feature_engineering.py --input_root {PVC_MOUNT_PATH}/{input_subdir} --output {PVC_MOUNT_PATH}/{output_subdir}"
+            cached(
+                "feature_engineering",
+                install_requirements("feature_engineering", f"-r {repo}/components/feature_engineering/requirements.txt", shard=shard)
+                + measured("feature_engineering", f"{repo}/components/feature_engineering/feature_engineering.py --input_root {PVC_MOUNT_PATH}/{input_subdir}/{shard} --output {PVC_MOUNT_PATH}/{output_subdir}/{shard} --tensor_store", shard=shard),
+                params=f"{output_subdir} {shard}",
+                sources=["components/feature_engineering"],
+                inputs=[f"{PVC_MOUNT_PATH}/{input_subdir}/{shard}/download_*"],
+                latest=True,
+                # The trainers read the memory-mapped feature store, the CSVs stay for inspection
+                outputs=[f"{PVC_MOUNT_PATH}/{output_subdir}/{shard}/*_features.csv", f"{PVC_MOUNT_PATH}/{output_subdir}/{shard}/feature_store"],
+            )
         ],
     )
 
 
 @dsl.container_component
-def train_lstm_component(features_subdir: str, out_subdir: str, window: int = 20, horizon: int = 1, epochs: int = 5):
+def train_lstm_component(features_subdir: str, out_subdir: str, window: int = 20, horizon: int = 1, epochs: int = 5, shard: str = "",
+                         performance_profile: str = "default", patience: int = 3, symbols: str = ""):
     repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
     return dsl.ContainerSpec(
         image="tensorflow/tensorflow:2.14.0",
         command=["bash", "-lc"],
         args=[
-            "pip install -q pandas numpy && "
-            f"pip install -q -r {repo}/components/training_lstm/requirements.txt && "
-            f"python {repo}/components/training_lstm/train_lstm.py --features_dir {PVC_MOUNT_PATH}/{features_subdir} --out {PVC_MOUNT_PATH}/{out_subdir} --window {window} --horizon {horizon} --epochs {epochs}"
+            cached(
+                "train_lstm",
+                install_requirements("train_lstm", "pandas", "numpy", f"-r {repo}/components/training_lstm/requirements.txt", shard=shard)
+                + measured("train_lstm", f"{repo}/components/training_lstm/train_lstm.py --features_dir {PVC_MOUNT_PATH}/{features_subdir}/{shard} --out {PVC_MOUNT_PATH}/{out_subdir} --window {window} --horizon {horizon} --epochs {epochs} --performance_profile {performance_profile} --patience {patience}", shard=shard),
+                params=f"{out_subdir} {window} {horizon} {epochs} {shard} {performance_profile} {patience}",
+                sources=["components/training_lstm", "components/feature_engineering/feature_store.py"],
+                inputs=[f"{PVC_MOUNT_PATH}/{features_subdir}/{shard}"],
+                # Shards share the models folder, each one claims the models of its own symbols
+                outputs=[f"{PVC_MOUNT_PATH}/{out_subdir}/lstm_{{symbol}}_savedmodel", f"{PVC_MOUNT_PATH}/{out_subdir}/metrics_lstm_{{symbol}}.json"],
+                symbols=symbols,
+            )
         ],
     )
 
 
 @dsl.container_component
-def train_arima_component(features_subdir: str, out_subdir: str, order: str = "5,1,0"):
+def train_arima_component(features_subdir: str, out_subdir: str, order: str = "5,1,0", shard: str = "", symbols: str = ""):
     repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
     return dsl.ContainerSpec(
         image="python:3.10",
         command=["bash", "-lc"],
         args=[
-            f"pip install -q -r {repo}/components/training_arima/requirements.txt && "
-            f"python {repo}/components/training_arima/train_arima.py --features_dir {PVC_MOUNT_PATH}/{features_subdir} --out {PVC_MOUNT_PATH}/{out_subdir} --order {order}"
+            cached(
+                "train_arima",
+                install_requirements("train_arima", f"-r {repo}/components/training_arima/requirements.txt", shard=shard)
+                + measured("train_arima", f"{repo}/components/training_arima/train_arima.py --features_dir {PVC_MOUNT_PATH}/{features_subdir}/{shard} --out {PVC_MOUNT_PATH}/{out_subdir} --order {order}", shard=shard),
+                params=f"{out_subdir} {order} {shard}",
+                sources=["components/training_arima", "components/feature_engineering/feature_store.py"],
+                inputs=[f"{PVC_MOUNT_PATH}/{features_subdir}/{shard}"],
+                outputs=[f"{PVC_MOUNT_PATH}/{out_subdir}/arima_{{symbol}}", f"{PVC_MOUNT_PATH}/{out_subdir}/metrics_arima_{{symbol}}.json"],
+                symbols=symbols,
+            )
         ],
     )
 
@@ -85,8 +185,15 @@ def select_best_component(metrics_subdir: str, out_file: str):
         image="python:3.10",
         command=["bash", "-lc"],
         args=[
-            f"pip install -q -r {repo}/components/model_selection/requirements.txt && "
-            f"python {repo}/components/model_selection/select_best.py --metrics_dir {PVC_MOUNT_PATH}/{metrics_subdir} --out {PVC_MOUNT_PATH}/{out_file}"
+            cached(
+                "select_best",
+                install_requirements("select_best", f"-r {repo}/components/model_selection/requirements.txt")
+                + measured("select_best", f"{repo}/components/model_selection/select_best.py --metrics_dir {PVC_MOUNT_PATH}/{metrics_subdir} --out {PVC_MOUNT_PATH}/{out_file}"),
+                params=f"{out_file}",
+                sources=["components/model_selection"],
+                inputs=[f"{PVC_MOUNT_PATH}/{metrics_subdir}/metrics_*.json"],
+                outputs=[f"{PVC_MOUNT_PATH}/{out_file}"],
+            )
         ],
     )
 
@@ -99,11 +206,50 @@ def openvino_convert_component(saved_model_subdir: str, ir_out_subdir: str, mode
         command=["bash", "-lc"],
         args=[
             # openvino-dev is preinstalled in dev image, ensure mo is available
-            f"python {repo}/components/openvino_convert/convert_to_ir.py --saved_model {PVC_MOUNT_PATH}/{saved_model_subdir} --out {PVC_MOUNT_PATH}/{ir_out_subdir} --model_name {model_name}"
+            measured("openvino_convert", f"{repo}/components/openvino_convert/convert_to_ir.py --saved_model {PVC_MOUNT_PATH}/{saved_model_subdir} --out {PVC_MOUNT_PATH}/{ir_out_subdir} --model_name {model_name}")
         ],
     )
 
 
+@dsl.container_component
+def metrics_timeline_component():
+    repo = f"{PVC_MOUNT_PATH}/{REPO_SUBDIR}"
+    metrics_dir = f"{PVC_MOUNT_PATH}/{METRICS_SUBDIR}"
+    return dsl.ContainerSpec(
+        image="python:3.10",
+        command=["bash", "-lc"],
+        args=[
+            f"python {repo}/pipeline/step_metrics.py timeline --metrics_dir {metrics_dir} --cache_report {STEP_CACHE_REPORT} "
+            f"--since \"$(cat {metrics_dir}/run_started 2>/dev/null || echo 0)\""
+        ],
+    )
+
+
+@dsl.component(base_image="python:3.10")
+def split_symbols_component(symbols: str, shard_size: int) -> List[Dict[str, str]]:
+    """Split the symbol list into shards of shard_size symbols; 0 keeps one unnamed shard."""
+    names = [s.strip().upper() for s in symbols.split(",") if s.strip()]
+    if shard_size <= 0:
+        return [{"subdir": "", "symbols": ",".join(names)}]
+    return [
+        {"subdir": f"shard-{i // shard_size}", "symbols": ",".join(names[i:i + shard_size])}
+        for i in range(0, len(names), shard_size)
+    ]
+
+
+@dsl.component(base_image="python:3.10")
+def shard_done_component(symbols: str) -> str:
+    return symbols
+
+
+@dsl.component(base_image="python:3.10")
+def gather_shards_component(shards: List[str]) -> str:
+    """Fan-in of the per-shard branches; returns every trained symbol."""
+    symbols = ",".join(shards)
+    print(f"Gathered {len(shards)} shard(s): {symbols}")
+    return symbols
+
+
 @dsl.pipeline(
     name="nyse-stock-pipeline",
     description="End-to-end NYSE pipeline (PVC-only) with LSTM/ARIMA and optional OpenVINO conversion",
@@ -121,24 +267,49 @@ def nyse_pipeline(
     selection_file: str = "nyse-models/best.json",
     enable_openvino_convert: bool = False,
     openvino_out_subdir: str = "nyse-openvino",
+    shard_size: int = 0,
+    lstm_performance_profile: str = "default",
+    lstm_patience: int = 3,
 ):
     # Steps
     git = sync_repo_component(git_url=repo_url, branch=repo_branch)
 
-    dl = download_component(symbols=symbols, start=start, end=end, out_subdir=data_subdir)
-    dl.after(git)
+    # Download, features and training run per shard of shard_size symbols, each shard in its own
+    # subfolder; 0 runs all symbols as a single unnamed shard with the unsharded folder layout
+    split = split_symbols_component(symbols=symbols, shard_size=shard_size)
+
+    with dsl.ParallelFor(split.output) as shard:
+        dl = download_component(symbols=shard.symbols, start=start, end=end, out_subdir=data_subdir, shard=shard.subdir)
+        dl.after(git)
+
+        fe = feature_engineering_component(input_subdir=data_subdir, output_subdir=features_subdir, shard=shard.subdir)
+        fe.after(dl)
 
-    fe = feature_engineering_component(input_subdir=data_subdir, output_subdir=features_subdir)
-    fe.after(dl)
+        # "cpu" tunes TensorFlow for CPU-only nodes; compare epoch_stats in the metrics_lstm_*.json files
+        lstm = train_lstm_component(features_subdir=features_subdir, out_subdir=models_subdir, shard=shard.subdir,
+                                    performance_profile=lstm_performance_profile, patience=lstm_patience, symbols=shard.symbols)
+        lstm.after(fe)
 
-    lstm = train_lstm_component(features_subdir=features_subdir, out_subdir=models_subdir)
-    lstm.after(fe)
+        arima = train_arima_component(features_subdir=features_subdir, out_subdir=models_subdir, shard=shard.subdir, symbols=shard.symbols)
+        arima.after(fe)
 
-    arima = train_arima_component(features_subdir=features_subdir, out_subdir=models_subdir)
-    arima.after(fe)
+        done = shard_done_component(symbols=shard.symbols)
+        done.after(lstm, arima)
+
+        # Same PVC mount and caching options as the tasks outside the loop
+        for t in [dl, fe, lstm, arima]:
+            k8s_use_pvc(task=t, pvc_name=pvc_name, mount_path=PVC_MOUNT_PATH)
+            t.set_caching_options(False)
+
+    # Models of every shard land in models_subdir, so selection runs once all shards are gathered
+    gather = gather_shards_component(shards=dsl.Collected(done.output))
 
     select = select_best_component(metrics_subdir=models_subdir, out_file=selection_file)
-    select.after(lstm, arima)
+    select.after(gather)
+
+    # Single timeline report of the per-step metrics of this run
+    timeline = metrics_timeline_component()
+    timeline.after(select)
 
     # Optional OpenVINO conversion (assumes one SavedModel path exists, e.g., lstm_AAPL_savedmodel)
     with dsl.If(enable_openvino_convert == True):
@@ -149,7 +320,7 @@ def nyse_pipeline(
         )
 
     # Mount PVC on each task using kfp-kubernetes helper if available
-    for t in [dl, fe, lstm, arima, select]:
+    for t in [git, select, timeline]:
         k8s_use_pvc(task=t, pvc_name=pvc_name, mount_path=PVC_MOUNT_PATH)
-
-
+        # KFP caching only sees parameters, not the PVC contents; steps fingerprint their inputs instead
+        t.set_caching_options(False)
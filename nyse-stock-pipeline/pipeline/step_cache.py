@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""Fingerprint cache for pipeline steps on the PVC.
+
+A step's key is a hash of its name, parameters, source files and input files.
+`check` exits 0 when a completed run with the same key left outputs that are
+still unchanged, so the step can be skipped; `commit` records the outputs a
+run wrote, with their content hashes, after a miss. Every decision is appended to a JSON-lines cache report.
+
+On a miss `check` writes the key and the state of the existing outputs to the
+--pending file, and `commit` reads them back: the run is stored under the key
+it started with even if an input changed meanwhile, and its outputs are the
+matches that are new or changed since the check. Output patterns may contain
+{symbol}, expanded once per symbol of --symbols, so steps sharing an output
+folder only claim the files of their own symbols.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+import time
+
+
+def stat_state(path: str) -> list:
+    """Size and modification time of a file, or of every file of a folder."""
+    if os.path.isfile(path):
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    files = sorted(os.path.join(d, f) for d, _, fs in os.walk(path) for f in fs)
+    return [[os.path.relpath(f, path)] + stat_state(f) for f in files]
+
+
+def output_patterns(args) -> list:
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    return [pattern.replace("{symbol}", sym) for pattern in args.outputs
+            for sym in (symbols if "{symbol}" in pattern else [""])]
+
+
+def output_states(patterns) -> dict:
+    return {p: stat_state(p) for pattern in patterns for p in sorted(glob.glob(pattern))}
+
+
+def expand(pattern: str, latest: bool = False) -> list:
+    matches = sorted(glob.glob(pattern)) or [pattern]
+    return [max(matches, key=os.path.getmtime)] if latest and os.path.exists(matches[0]) else matches
+
+
+def hash_paths(patterns, digest, latest: bool = False) -> None:
+    roots = [p for pattern in sorted(patterns) for p in expand(pattern, latest)]
+    for root in roots:
+        if not os.path.exists(root):
+            digest.update(f"missing:{root}\0".encode())
+            continue
+        files = [root] if os.path.isfile(root) else sorted(
+            os.path.join(d, f) for d, dirs, fs in os.walk(root) for f in fs
+            if "__pycache__" not in d
+        )
+        for path in files:
+            digest.update(f"{os.path.relpath(path, os.path.dirname(root))}\0".encode())
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+
+
+def fingerprint(args) -> str:
+    digest = hashlib.sha256(f"{args.step}\0{args.params}\0".encode())
+    hash_paths(args.sources, digest)
+    digest.update(b"\0inputs\0")
+    hash_paths(args.inputs, digest, args.latest)
+    return digest.hexdigest()
+
+
+def content_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    hash_paths([path], digest)
+    return digest.hexdigest()
+
+
+def report(args, key: str, status: str, **extra) -> None:
+    entry = {"step": args.step, "key": key, "status": status, "params": args.params, "timestamp": time.time(), **extra}
+    print(f"Step cache {status}: {args.step} ({key[:12]})")
+    if args.report:
+        os.makedirs(os.path.dirname(os.path.abspath(args.report)), exist_ok=True)
+        with open(args.report, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+def check(args, key: str, marker: str) -> int:
+    if not args.pending:
+        raise SystemExit("check needs --pending, the file commit reads the key back from")
+    if os.path.exists(marker):
+        with open(marker, "r") as f:
+            outputs = json.load(f)["outputs"]
+        if all(os.path.exists(p) and content_hash(p) == h for p, h in outputs.items()):
+            # Reused outputs become the newest again for steps that pick the latest batch
+            now = time.time()
+            for p in outputs:
+                os.utime(p, (now, now))
+            report(args, key, "hit", outputs=list(outputs))
+            return 0
+    os.makedirs(os.path.dirname(marker), exist_ok=True)
+    with open(args.pending, "w") as f:
+        json.dump({"key": key, "marker": marker, "started": time.time(), "outputs": output_states(output_patterns(args))}, f)
+    report(args, key, "miss")
+    return 1
+
+
+def commit(args) -> int:
+    with open(args.pending, "r") as f:
+        pending = json.load(f)
+    key, marker = pending["key"], pending["marker"]
+    # Outputs matching the step's patterns that are new or changed since the check
+    outputs = {
+        p: content_hash(p) for p, state in output_states(output_patterns(args)).items()
+        if pending["outputs"].get(p) != state
+    }
+    with open(marker + ".partial", "w") as f:
+        json.dump({"step": args.step, "params": args.params, "outputs": outputs, "completed": time.time()}, f, indent=2)
+    os.replace(marker + ".partial", marker)
+    os.remove(args.pending)
+    report(args, key, "stored", outputs=list(outputs), seconds=time.time() - pending["started"])
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Skip pipeline steps whose fingerprint matches a completed run")
+    parser.add_argument("action", choices=["check", "commit"])
+    parser.add_argument("--step", required=True, help="Step name")
+    parser.add_argument("--params", default="", help="Step parameters, as one string")
+    parser.add_argument("--sources", nargs="*", default=[], help="Source files or folders of the step (globs allowed)")
+    parser.add_argument("--inputs", nargs="*", default=[], help="Input files or folders of the step (globs allowed)")
+    parser.add_argument("--latest", action="store_true", help="Hash only the newest match of each input pattern")
+    parser.add_argument("--outputs", nargs="*", default=[], help="Glob patterns of the step outputs, e.g. /mnt/pvc/nyse-models/lstm_{symbol}_*")
+    parser.add_argument("--symbols", default="", help="Comma separated symbols {symbol} in --outputs expands to")
+    parser.add_argument("--cache_dir", required=True, help="Folder holding the completed-run markers, e.g. /mnt/pvc/cache/steps")
+    parser.add_argument("--report", default="", help="JSON-lines cache report, e.g. /mnt/pvc/step_cache_report.jsonl")
+    parser.add_argument("--pending", default="", help="File passing the key and output states from check to commit, e.g. from mktemp")
+    args = parser.parse_args()
+
+    if args.action == "commit":
+        sys.exit(commit(args))
+    key = fingerprint(args)
+    sys.exit(check(args, key, os.path.join(args.cache_dir, args.step, f"{key}.json")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""Per-step performance metrics for the pipeline scripts.
+
+`run` runs a script in-process, as `python script.py ...` would, and records
+the phase into <metrics_dir>/<step>/<shard>/metrics.json: wall and CPU time,
+peak RSS, and bytes read and written from /proc/self/io (storage bytes, and
+all read/write calls including sockets and reaped subprocesses such as pip).
+Set STEP_PROFILER=cprofile or pyinstrument to also dump a profile of the phase.
+`timeline` aggregates the metrics of a run into a single timeline report, listing the
+steps skipped by the step cache, which record no metrics in the run.
+"""
+import argparse
+import glob
+import json
+import os
+import resource
+import runpy
+import socket
+import sys
+import time
+
+
+def io_counters() -> dict:
+    counters = {"rchar": 0, "wchar": 0, "read_bytes": 0, "write_bytes": 0}
+    # Only available on Linux; bytes are reported as zero elsewhere
+    if os.path.exists("/proc/self/io"):
+        with open("/proc/self/io", "r") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                if name in counters:
+                    counters[name] = int(value)
+    return counters
+
+
+def sample() -> dict:
+    times = os.times()
+    return {
+        "wall": time.perf_counter(),
+        "cpu": times.user + times.system,
+        "children": times.children_user + times.children_system,
+        "io": io_counters(),
+    }
+
+
+def difference(start: dict, end: dict) -> dict:
+    return {
+        "wall_seconds": end["wall"] - start["wall"],
+        "cpu_seconds": end["cpu"] - start["cpu"],
+        "children_cpu_seconds": end["children"] - start["children"],
+        "read_bytes": end["io"]["rchar"] - start["io"]["rchar"],
+        "write_bytes": end["io"]["wchar"] - start["io"]["wchar"],
+        "storage_read_bytes": end["io"]["read_bytes"] - start["io"]["read_bytes"],
+        "storage_write_bytes": end["io"]["write_bytes"] - start["io"]["write_bytes"],
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_bytes": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "children_peak_rss_bytes": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024,
+    }
+
+
+def run_script(script: str, script_args: list, profiler: str, profile_path: str) -> int:
+    sys.argv = [script] + script_args
+    sys.path.insert(0, os.path.dirname(os.path.abspath(script)))
+    profile = None
+    if profiler == "pyinstrument":
+        try:
+            import pyinstrument
+            profile = pyinstrument.Profiler()
+            profile.start()
+        except ImportError:
+            print("pyinstrument is not installed, profiling with cprofile")
+    if profiler and profile is None:
+        import cProfile
+        profile = cProfile.Profile()
+        profile.enable()
+    try:
+        runpy.run_path(script, run_name="__main__")
+        return 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+    finally:
+        if profile is not None and hasattr(profile, "disable"):
+            profile.disable()
+            profile.dump_stats(profile_path + ".prof")
+        elif profile is not None:
+            profile.stop()
+            with open(profile_path + ".html", "w") as f:
+                f.write(profile.output_html())
+
+
+def run(args) -> int:
+    step_dir = os.path.join(args.metrics_dir, args.step, args.shard)
+    metrics_path = os.path.join(step_dir, "metrics.json")
+    os.makedirs(step_dir, exist_ok=True)
+
+    # Phases of the same step (install, run) are started by one shell of one pod and share its metrics file
+    container = f"{socket.gethostname()}:{os.getppid()}"
+    started = time.time()
+    metrics = {"step": args.step, "shard": args.shard, "container": container, "started": started,
+               "status": "succeeded", "phases": []}
+    if os.path.exists(metrics_path):
+        with open(metrics_path, "r") as f:
+            previous = json.load(f)
+        if previous.get("container") == container:
+            metrics = previous
+
+    start = sample()
+    code = run_script(
+        args.script, args.script_args, os.getenv("STEP_PROFILER", ""), os.path.join(step_dir, f"profile_{args.phase}")
+    )
+    phase = {"phase": args.phase, "started_seconds": started - metrics["started"], "exit_code": code,
+             **difference(start, sample())}
+    metrics["phases"].append(phase)
+    if code != 0:
+        metrics["status"] = "failed"
+
+    for key in ["wall_seconds", "cpu_seconds", "children_cpu_seconds", "read_bytes", "write_bytes",
+                "storage_read_bytes", "storage_write_bytes"]:
+        metrics[key] = sum(p[key] for p in metrics["phases"])
+    for key in ["peak_rss_bytes", "children_peak_rss_bytes"]:
+        metrics[key] = max(p[key] for p in metrics["phases"])
+
+    with open(metrics_path + ".partial", "w") as f:
+        json.dump(metrics, f, indent=2)
+    os.replace(metrics_path + ".partial", metrics_path)
+
+    print(f"{args.step} {args.phase}: {phase['wall_seconds']:.1f}s wall, {phase['cpu_seconds']:.1f}s cpu, "
+          f"{phase['peak_rss_bytes'] / 2**20:.0f} MiB peak rss, {phase['read_bytes'] / 2**20:.1f} MiB read, "
+          f"{phase['write_bytes'] / 2**20:.1f} MiB written")
+    return code
+
+
+def cache_hits(report_path: str, since: float) -> list:
+    hits = []
+    if report_path and os.path.exists(report_path):
+        with open(report_path, "r") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["status"] == "hit" and entry.get("timestamp", 0) >= since and entry["step"] not in hits:
+                    hits.append(entry["step"])
+    return hits
+
+
+def timeline(args) -> int:
+    cached_steps = cache_hits(args.cache_report, args.since)
+    out = args.out or os.path.join(args.metrics_dir, "timeline.json")
+    steps = []
+    for path in glob.glob(os.path.join(args.metrics_dir, "**", "metrics.json"), recursive=True):
+        with open(path, "r") as f:
+            metrics = json.load(f)
+        if metrics["started"] >= args.since:
+            steps.append(metrics)
+    steps.sort(key=lambda m: m["started"])
+    if not steps:
+        # Every step was a step cache hit: nothing ran, so the timeline is empty
+        report = {"wall_seconds": 0.0, "cpu_seconds": 0.0, "peak_rss_bytes": 0, "read_bytes": 0, "write_bytes": 0,
+                  "failed_steps": [], "cached_steps": cached_steps, "steps": [], "phases": []}
+        with open(out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"No metrics.json under {args.metrics_dir} since the run started, "
+              f"{len(cached_steps)} cached steps: {', '.join(cached_steps)}")
+        print(f"Saved timeline: {out}")
+        return 0
+
+    run_start = steps[0]["started"]
+    phases = []
+    for m in steps:
+        name = f"{m['step']}/{m['shard']}" if m.get("shard") else m["step"]
+        for p in m["phases"]:
+            phases.append({"step": name, **p, "started_seconds": m["started"] - run_start + p["started_seconds"]})
+    phases.sort(key=lambda p: p["started_seconds"])
+
+    report = {
+        "wall_seconds": max(p["started_seconds"] + p["wall_seconds"] for p in phases),
+        "cpu_seconds": sum(m["cpu_seconds"] + m["children_cpu_seconds"] for m in steps),
+        "peak_rss_bytes": max(max(m["peak_rss_bytes"], m["children_peak_rss_bytes"]) for m in steps),
+        "read_bytes": sum(m["read_bytes"] for m in steps),
+        "write_bytes": sum(m["write_bytes"] for m in steps),
+        "failed_steps": [m["step"] for m in steps if m["status"] != "succeeded"],
+        "cached_steps": cached_steps,
+        "steps": steps,
+        "phases": phases,
+    }
+
+    print(f"{'step':<28} {'phase':<10} {'start':>9} {'wall':>9} {'cpu':>9} {'rss MiB':>9} {'read MiB':>9} {'write MiB':>9}")
+    for p in phases:
+        print(f"{p['step']:<28} {p['phase']:<10} {p['started_seconds']:>8.1f}s {p['wall_seconds']:>8.1f}s "
+              f"{p['cpu_seconds'] + p['children_cpu_seconds']:>8.1f}s {p['peak_rss_bytes'] / 2**20:>9.0f} "
+              f"{p['read_bytes'] / 2**20:>9.1f} {p['write_bytes'] / 2**20:>9.1f}")
+    print(f"{len(steps)} steps in {report['wall_seconds']:.1f}s, {report['cpu_seconds']:.1f}s cpu, "
+          f"{report['peak_rss_bytes'] / 2**20:.0f} MiB peak rss, {len(cached_steps)} cached steps")
+
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved timeline: {out}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record per-step performance metrics and aggregate them into a timeline")
+    sub = parser.add_subparsers(dest="action", required=True)
+
+    run_parser = sub.add_parser("run", help="Run a python script and record its metrics as one phase of a step")
+    run_parser.add_argument("--step", required=True, help="Step name")
+    run_parser.add_argument("--shard", default="", help="Shard of the step, if any")
+    run_parser.add_argument("--phase", default="run", help="Phase name, e.g. install or run")
+    run_parser.add_argument("--metrics_dir", required=True, help="Metrics folder, e.g. /mnt/pvc/metrics")
+    run_parser.add_argument("script", help="Python script to run")
+    run_parser.add_argument("script_args", nargs=argparse.REMAINDER, help="Arguments of the script")
+
+    timeline_parser = sub.add_parser("timeline", help="Aggregate the step metrics into a timeline report")
+    timeline_parser.add_argument("--metrics_dir", required=True, help="Metrics folder, e.g. /mnt/pvc/metrics")
+    timeline_parser.add_argument("--since", type=float, default=0.0, help="Ignore steps started before this Unix time")
+    timeline_parser.add_argument("--cache_report", default="", help="step_cache.py report, to list the steps it skipped")
+    timeline_parser.add_argument("--out", default="", help="Output JSON file; defaults to <metrics_dir>/timeline.json")
+
+    args = parser.parse_args()
+    sys.exit(run(args) if args.action == "run" else timeline(args))
+
+
+if __name__ == "__main__":
+    main()